@@ -1,13 +1,28 @@
 import sys
 import os
 from pathlib import Path
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI
 from contextlib import asynccontextmanager
-from fastapi.responses import RedirectResponse
-from app.routes import assistants, threads, messages, runs
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
+from app.routes import assistants, threads, messages, runs, fanout, transfer
 from app.services.database import connect_db, disconnect_db
-from app.services.plugin_loader import load_plugins
-from app.services.default_connector import OpenAIAssistantConnector
+from app.services.plugin_loader import LazyConnector, discover_plugins
+from app.services.connector import LLMServiceConnector
+from app.services.default_connector import OpenAIAssistantConnector, named_connectors
+from app.services.cache import assistant_cache, thread_cache
+from app.services.idempotency import idempotency
+from app.services.interfaces import BaseConnector
+from app.services.open_interpreter_service import serverless_service
+from app.services.metrics import MetricsMiddleware, metrics, stats_families
+from app.services.rate_limit import RateLimitedConnector, RateLimitExceeded
+from app.services.registry import registry, require_connector
+from app.services.responses import response_settings
+from app.services.response_cache import CachingConnector
+from app.services.router import RoutingConnector, create_router
+from app.services.run_events import run_events
+from app.services.run_scheduler import scheduler
+from app.services.search import semantic_search
+from app.services.streaming import sse_response
 from app import config
 from colorama import Fore, Style, init
 
@@ -24,13 +39,28 @@ plugin_dir = os.getenv('PYGENTIC_PLUGIN_DIR', 'custom_connectors')
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_db()
+    for instance in registry.values():
+        await instance.connect()
+        await instance.start_executor()
+    runs_config = config.get("runs", {})
+    scheduler.configure(runs_config)
+    await scheduler.start(registry.get(runs_config.get("connector", "openaiassistantconnector")))
+    await semantic_search.start()
     yield
+    await scheduler.stop()
+    await run_events.stop()
+    await semantic_search.stop()
+    for instance in registry.values():
+        await instance.disconnect()
+        instance.stop_executor()
+    await serverless_service.close()
     await disconnect_db()
 
 app = FastAPI(
     title="Pygentic",
     description="Pygentic API documentation",
     version="0.1.0",
+    default_response_class=response_settings.response_class,
     lifespan=lifespan
 )
 
@@ -43,39 +73,193 @@ app.include_router(assistants.router, prefix="/v1")
 app.include_router(threads.router, prefix="/v1")
 app.include_router(messages.router, prefix="/v1")
 app.include_router(runs.router, prefix="/v1")
+app.include_router(fanout.router, prefix="/v1")
+app.include_router(transfer.router, prefix="/v1")
 
-# Load plugins if the directory exists
-connector_instances = {}
-if os.path.isdir(plugin_dir):
-    connectors = load_plugins(plugin_dir)
-    for connector_class in connectors:
-        connector_name = connector_class.__name__
-        connector_instance = connector_class()
-        connector_instance.initialize(config["connectors"].get(connector_name.lower(), {}))
-        connector_instances[connector_name] = connector_instance
+# Plugins are found without importing them; each one is imported and created
+# on first use, then handed to routes through the registry dependencies.
+plugins = discover_plugins(plugin_dir)
+if plugins:
+    for plugin in plugins:
+        registry.register(plugin.name, LazyConnector(plugin, config["connectors"].get(plugin.name.lower(), {})))
 else:
     # Use the default OpenAIAssistantConnector if no custom plugins are available
     default_connector = OpenAIAssistantConnector()
     default_connector.initialize(config["connectors"].get("openai_assistant", {}))
-    connector_instances['openaiassistantconnector'] = default_connector
+    registry.register('openaiassistantconnector', default_connector)
 
-@app.middleware("http")
-async def add_connector_to_request(request: Request, call_next):
-    for name, instance in connector_instances.items():
-        setattr(request.state, name.lower(), instance)
-    response = await call_next(request)
-    return response
+# Named OpenAI-compatible endpoints, registered under their own names
+for connector_name, named_connector in named_connectors(config["connectors"].get("openai_assistant", {})).items():
+    if connector_name in registry:
+        raise ValueError(f"Connector name {connector_name!r} is already registered")
+    registry.register(connector_name, named_connector)
+
+# Opt-in local text generation, micro-batched on a thread of its own
+llm_service_config = config["connectors"].get("llm_service", {})
+if llm_service_config.get("enabled", False):
+    llm_service = LLMServiceConnector()
+    llm_service.initialize(llm_service_config)
+    llm_service.configure_executor(llm_service_config)
+    registry.register("llmserviceconnector", llm_service)
+
+# Per-connector request/token quotas and upstream retry, before the response
+# cache so cache hits do not use quota
+rate_limiters = {}
+for connector_name, rate_limit_config in config.get("rate_limits", {}).items():
+    connector_instance = registry.get(connector_name)
+    if connector_instance is None:
+        continue
+    rate_limited_connector = RateLimitedConnector(connector_instance, connector_name.lower())
+    rate_limited_connector.initialize(rate_limit_config)
+    registry.register(connector_name, rate_limited_connector)
+    rate_limiters[connector_name.lower()] = rate_limited_connector
+
+# Opt-in response cache in front of every connector's generate_text
+response_cache_config = config.get("response_cache", {})
+if response_cache_config.get("enabled", False):
+    for connector_name, connector_instance in list(registry.items()):
+        caching_connector = CachingConnector(connector_instance, connector_name.lower())
+        caching_connector.initialize(response_cache_config)
+        registry.register(connector_name, caching_connector)
+
+# Routing connectors spread calls over several of the connectors above
+for router_name, router_config in config.get("routers", {}).items():
+    registry.register(router_name, create_router(router_config, registry.connectors))
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded(request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
 
 @app.get("/generate_text")
-async def generate_text(prompt: str, request: Request):
-    if 'openaiassistantconnector' in request.state:
-        text = await request.state.openaiassistantconnector.generate_text(prompt)
-        return {"generated_text": text}
-    else:
-        return {"error": "LLM Service Connector not available"}
-
-def run():
+async def generate_text(prompt: str, connector: BaseConnector = Depends(require_connector("openaiassistantconnector"))):
+    text = await connector.generate_text(prompt)
+    return {"generated_text": text}
+
+@app.get("/generate_text/stream")
+async def stream_text(prompt: str, connector: BaseConnector = Depends(require_connector("openaiassistantconnector"))):
+    return sse_response(connector.stream_text(prompt))
+
+@app.get("/cache/stats", include_in_schema=False)
+async def cache_stats():
+    return {
+        "assistants": assistant_cache.stats(),
+        "threads": thread_cache.stats(),
+        "responses": {
+            name: instance.stats()
+            for name, instance in registry.items()
+            if isinstance(instance, CachingConnector)
+        },
+    }
+
+@app.get("/rate_limits/stats", include_in_schema=False)
+async def rate_limit_stats():
+    return {name: instance.stats() for name, instance in rate_limiters.items()}
+
+if metrics.enabled:
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@metrics.collector
+def collect_runs():
+    return [
+        ("pygentic_run_queue_depth", "gauge", "Queued runs, as of the last run submitted to this process.",
+         [({}, scheduler.queued)]),
+        ("pygentic_runs_active", "gauge", "Runs executing in this process.", [({}, len(scheduler.running))]),
+    ]
+
+@metrics.collector
+def collect_run_events():
+    return stats_families("pygentic_run_events", "feed", {"runs": run_events.stats()}, "Run status change feed",
+                          counters=("published", "delivered"))
+
+@metrics.collector
+def collect_caches():
+    caches = {"assistants": assistant_cache.stats(), "threads": thread_cache.stats()}
+    for name, instance in registry.items():
+        if isinstance(instance, CachingConnector):
+            caches[f"responses:{name}"] = instance.stats()
+    return stats_families("pygentic_cache", "cache", caches, "Cache statistics",
+                          counters=("hits", "misses", "evictions", "expirations", "disk_hits", "coalesced"))
+
+@metrics.collector
+def collect_search():
+    if not semantic_search.enabled:
+        return []
+    return stats_families("pygentic_search", "index", {"messages": semantic_search.stats()}, "Semantic search statistics",
+                          counters=("indexed", "failed"))
+
+@metrics.collector
+def collect_idempotency():
+    return stats_families("pygentic_idempotency", "store", {"requests": idempotency.stats()}, "Idempotency-Key statistics",
+                          counters=("executed", "replayed", "coalesced"))
+
+@metrics.collector
+def collect_rate_limits():
+    stats = {name: instance.stats() for name, instance in rate_limiters.items()}
+    return stats_families("pygentic_rate_limit", "connector", stats, "Rate limiter statistics", counters=(
+        "throttled_requests", "throttled_seconds", "rejected", "retries", "backoff_seconds", "upstream_throttled",
+    ))
+
+@metrics.collector
+def collect_routers():
+    families = {}
+    for router_name, instance in registry.items():
+        if not isinstance(instance, RoutingConnector):
+            continue
+        for backend_name, stats in instance.stats().items():
+            labels = {"router": router_name, "backend": backend_name}
+            stats = {**stats, "circuit_open": int(stats["state"] != "closed")}
+            for key in ("outstanding", "ewma_ms", "requests", "errors", "circuit_open"):
+                if stats[key] is not None:
+                    families.setdefault(key, []).append((labels, stats[key]))
+    return [
+        (f"pygentic_router_backend_{key}_total", "counter", f"Router backend {key}.", samples)
+        if key in ("requests", "errors")
+        else (f"pygentic_router_backend_{key}", "gauge", f"Router backend {key}.", samples)
+        for key, samples in families.items()
+    ]
+
+def run(argv=None):
+    """The ``pygentic`` command. Without ``--workers`` it serves one
+    auto-reloading process for development; ``--workers N`` serves N worker
+    processes that share the run queue (the database), cache versions and
+    rate limits (a shared memory block created here). ``pygentic export``
+    and ``pygentic import`` copy the database to and from a gzipped JSON
+    lines file without serving."""
+    import argparse
+    import asyncio
     import uvicorn
+    from app.services.shared_state import SharedState
+
+    parser = argparse.ArgumentParser(prog="pygentic")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, help="serve with this many worker processes, without reload")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0,
+                        help="seconds to wait for open requests on shutdown, before runs are drained")
+    commands = parser.add_subparsers(dest="command")
+    export_parser = commands.add_parser("export", help="write the database as gzipped JSON lines")
+    export_parser.add_argument("file", nargs="?", default="-", help="output file, - for stdout")
+    export_parser.add_argument("--tables", nargs="+", help="only these tables, e.g. ThreadDB MessageDB")
+    export_parser.add_argument("--thread-id", help="only this thread, its messages, runs and assistant")
+    export_parser.add_argument("--resume", action="store_true", help="continue an interrupted export to the file")
+    export_parser.add_argument("--chunk-size", type=int, default=1000)
+    import_parser = commands.add_parser("import", help="store the rows of an export, skipping existing keys")
+    import_parser.add_argument("file", nargs="?", default="-", help="input file, - for stdin")
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.command:
+        asyncio.run(transfer_command(args))
+        return
+
     print(Fore.CYAN + Style.BRIGHT + """
        ___                      _   _      
       / _ \/\_/\__ _  ___ _ __ | |_(_) ___ 
@@ -87,7 +271,40 @@ def run():
         Created by rUv
     """ + Style.RESET_ALL)
 
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    if not args.workers:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    async def migrate():
+        # Once here, so the workers start against an up-to-date schema.
+        await connect_db()
+        await disconnect_db()
+
+    asyncio.run(migrate())
+    state = SharedState.create()
+    state.export()
+    try:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers,
+                    timeout_graceful_shutdown=args.graceful_timeout)
+    finally:
+        state.close(unlink=True)
+
+async def transfer_command(args):
+    from app.services import transfer
+
+    await connect_db()
+    try:
+        if args.command == "export":
+            written = await transfer.export_file(args.file, args.tables, args.thread_id, args.resume, args.chunk_size)
+            print(f"Exported {written} rows", file=sys.stderr)
+        else:
+            counts = await transfer.import_file(args.file, args.batch_size)
+            for table, count in counts.items():
+                print(f"{table}: {count['created']} created, {count['skipped']} skipped", file=sys.stderr)
+    except transfer.TransferError as e:
+        sys.exit(f"pygentic {args.command}: {e}")
+    finally:
+        await disconnect_db()
 
 if __name__ == "__main__":
     run()
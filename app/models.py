@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+import time
+from pydantic import BaseModel, Field
 from pydbantic import DataBaseModel, PrimaryKey
-from typing import List, Optional
+from typing import Any, List, Optional
 
 
 class Assistant(BaseModel):
@@ -10,6 +11,7 @@ class Assistant(BaseModel):
     model: str
     instructions: Optional[str] = None
     tools: List[str] = []
+    max_context_tokens: Optional[int] = None
 
     class Config:
         schema_extra = {
@@ -30,7 +32,8 @@ class AssistantDB(DataBaseModel):
     description: Optional[str] = None
     model: str
     instructions: Optional[str] = None
-    tools: List[str] = []
+    tools: list = []
+    max_context_tokens: Optional[int] = None
 
     class Config:
         schema_extra = {
@@ -48,7 +51,12 @@ class AssistantDB(DataBaseModel):
 class Thread(BaseModel):
     id: str
     assistant_id: str
+    # Initial messages, stored as user messages when the thread is created.
+    # Threads are returned with a count and the last message instead.
     messages: List[str] = []
+    message_count: int = 0
+    last_message_id: Optional[str] = None
+    last_message_at: Optional[float] = None
 
     class Config:
         schema_extra = {
@@ -63,23 +71,37 @@ class Thread(BaseModel):
 class ThreadDB(DataBaseModel):
     id: str = PrimaryKey()
     assistant_id: str
-    messages: List[str] = []
+    message_count: int = 0
+    last_message_id: Optional[str] = None
+    last_message_at: Optional[float] = None
 
     class Config:
         schema_extra = {
             "example": {
                 "id": "thread_db_1",
                 "assistant_id": "assistant_db_1",
-                "messages": ["message_db1", "message_db2"]
+                "message_count": 2,
+                "last_message_id": "message_db_2",
+                "last_message_at": 1700000000.0
             }
         }
 
 
+class ThreadSummaryDB(DataBaseModel):
+    """Rolling summary of a thread's older messages, up to and including
+    the message at (``created_at``, ``message_id``)."""
+    thread_id: str = PrimaryKey()
+    content: str
+    message_id: str
+    created_at: float
+
+
 class Message(BaseModel):
     id: str
     thread_id: str
     role: str
     content: str
+    created_at: Optional[float] = None
 
     class Config:
         schema_extra = {
@@ -92,11 +114,72 @@ class Message(BaseModel):
         }
 
 
+class MessageList(BaseModel):
+    object: str = "list"
+    data: List[Message]
+    first_id: Optional[str] = None
+    last_id: Optional[str] = None
+    has_more: bool = False
+
+
+class MessageSearchHit(BaseModel):
+    score: float
+    message: Message
+
+
+class MessageSearchList(BaseModel):
+    object: str = "list"
+    data: List[MessageSearchHit]
+
+
+class MessageBatch(BaseModel):
+    messages: List[dict]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "messages": [
+                    {"id": "message_1", "role": "user", "content": "Hello."},
+                    {"id": "message_2", "role": "assistant", "content": "Hi, how can I help?"}
+                ]
+            }
+        }
+
+
+class MessageBatchItem(BaseModel):
+    index: int
+    id: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+
+
+class MessageBatchResult(BaseModel):
+    object: str = "list"
+    data: List[MessageBatchItem]
+    created: int
+    failed: int
+
+
+class FanOutRequest(BaseModel):
+    payloads: List[Any]
+    # At most [connectors.serverless_service] max_concurrency.
+    concurrency: Optional[int] = Field(None, ge=1)
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "payloads": [{"code": "print(1)"}, {"code": "print(2)"}],
+                "concurrency": 2
+            }
+        }
+
+
 class MessageDB(DataBaseModel):
     id: str = PrimaryKey()
     thread_id: str
     role: str
     content: str
+    created_at: float = Field(default_factory=time.time)
 
     class Config:
         schema_extra = {
@@ -104,7 +187,8 @@ class MessageDB(DataBaseModel):
                 "id": "message_db_1",
                 "thread_id": "thread_db_1",
                 "role": "user",
-                "content": "Example message content for MessageDB."
+                "content": "Example message content for MessageDB.",
+                "created_at": 1700000000.0
             }
         }
 
@@ -134,6 +218,10 @@ class RunDB(DataBaseModel):
     assistant_id: str
     status: str
     result: Optional[str] = None
+    created_at: float = Field(default_factory=time.time)
+    # The claim of the scheduler executing a queued run, held until lease_until.
+    worker: Optional[str] = None
+    lease_until: Optional[float] = None
 
     class Config:
         schema_extra = {
@@ -145,3 +233,14 @@ class RunDB(DataBaseModel):
                 "result": "Example result for RunDB."
             }
         }
+
+
+class IdempotencyDB(DataBaseModel):
+    """A create request made with an Idempotency-Key: pending while it runs
+    (``status_code`` unset), then its response, until ``expires_at``."""
+    key: str = PrimaryKey()
+    fingerprint: str
+    status_code: Optional[int] = None
+    media_type: Optional[str] = None
+    body: Optional[str] = None
+    expires_at: float
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, HTTPException
 from app.models import Assistant, AssistantDB
+from app.services.cache import assistant_cache
+from app.services.database import is_duplicate_key
+from app.services.idempotency import IdempotentRoute
+from app.services.responses import fields, response_settings
 from typing import Optional
 
-router = APIRouter()
+router = APIRouter(route_class=IdempotentRoute)
 
 
 @router.post("/assistants", response_model=Assistant, summary="Create an assistant",
@@ -12,10 +16,14 @@ router = APIRouter()
 async def create_assistant(assistant: Assistant):
     assistant_db = AssistantDB(**assistant.dict())
     try:
-        await assistant_db.save()
+        await assistant_cache.insert(assistant_db)
     except AttributeError as e:
         raise HTTPException(status_code=500, detail=str(e))
-    return assistant
+    except Exception as e:
+        if not is_duplicate_key(e):
+            raise
+        raise HTTPException(status_code=409, detail=f"Assistant {assistant.id} already exists")
+    return response_settings.trusted(fields(Assistant, assistant))
 
 
 @router.get("/assistants/{assistant_id}", response_model=Assistant, summary="Get an assistant",
@@ -23,7 +31,7 @@ async def create_assistant(assistant: Assistant):
             response_description="The requested assistant.",
             tags=["Assistants"])
 async def get_assistant(assistant_id: str):
-    assistant = await AssistantDB.get(assistant_id)
+    assistant = await assistant_cache.get(assistant_id)
     if not assistant:
         raise HTTPException(status_code=404, detail="Assistant not found")
-    return assistant
+    return response_settings.trusted(fields(Assistant, assistant))
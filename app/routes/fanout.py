@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from app.models import FanOutRequest
+from app.services.open_interpreter_service import handle_batch, serverless_config
+from app.services.streaming import sse_json_response
+
+router = APIRouter()
+
+
+@router.post("/fanout")
+async def fan_out_requests(request: FanOutRequest):
+    concurrency = min(
+        request.concurrency or serverless_config.get("concurrency", 10),
+        serverless_config.get("max_concurrency", 50),
+    )
+
+    async def results():
+        async for result in handle_batch(request.payloads, concurrency):
+            yield result.dict()
+
+    return sse_json_response(results())
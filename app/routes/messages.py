@@ -1,18 +1,180 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from app.models import Message, MessageDB
+import time
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import ValidationError
+from typing import Dict, List, Optional, Tuple
+from typing_extensions import Literal
+from sqlalchemy import select
+from app.models import Message, MessageBatch, MessageBatchResult, MessageDB, MessageList, MessageSearchList
+from app.services.cache import thread_cache
+from app.services.database import (
+    bulk_insert, existing_keys, fetch_rows, is_duplicate_key, message_beyond, message_order, record_messages,
+)
+from app.services.idempotency import IdempotentRoute
+from app.services.responses import fields, response_settings
+from app.services.search import semantic_search
 
-router = APIRouter()
+router = APIRouter(route_class=IdempotentRoute)
+
+MESSAGE_FIELDS = list(Message.__fields__)
 
 
 @router.post("/threads/{thread_id}/messages", response_model=Message)
 async def add_message(thread_id: str, message: Message):
-    message_db = MessageDB(**message.dict())
-    await message_db.save()
-    return message
+    if message.thread_id != thread_id:
+        raise HTTPException(status_code=400, detail=f"thread_id must be {thread_id}")
+    message_db = MessageDB(**message.dict(exclude_none=True))
+    try:
+        await message_db.insert()
+    except Exception as e:
+        if not is_duplicate_key(e):
+            raise
+        # A message is counted on its thread once, when it is created.
+        raise HTTPException(status_code=409, detail=f"Message {message.id} already exists")
+    await record_messages(message_db.thread_id, 1, message_db.id, message_db.created_at)
+    await thread_cache.invalidate(message_db.thread_id)
+    semantic_search.submit([message_db.dict()])
+    return response_settings.trusted(fields(Message, message_db))
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+
+def _batch_item(index: int, message_id: Optional[str], error: Optional[str] = None) -> dict:
+    return {"index": index, "id": message_id, "status": "failed" if error else "created", "error": error}
+
+
+async def _insert_new(pending: Dict[str, Tuple[int, dict]], results: Dict[int, dict]) -> List[dict]:
+    """Inserts the ``pending`` messages not stored yet and marks the others
+    failed in ``results``. A message another request stores between the
+    check and the insert fails the insert, so the check is made again."""
+    retried = False
+    while True:
+        existing = await existing_keys(MessageDB, list(pending))
+        for message_id in existing:
+            index, _ = pending.pop(message_id)
+            results[index] = _batch_item(index, message_id, "Message already exists")
+        if retried and not existing:
+            raise HTTPException(status_code=409, detail="Messages were changed by a concurrent request")
+        rows = [row for _, row in pending.values()]
+        try:
+            await bulk_insert(MessageDB, rows)
+            return rows
+        except Exception as e:
+            if not is_duplicate_key(e):
+                raise
+            retried = True
+
+
+@router.post("/threads/{thread_id}/messages/batch", response_model=MessageBatchResult)
+async def add_messages(thread_id: str, batch: MessageBatch):
+    now = time.time()
+    results = {}
+    pending = {}
+    for index, item in enumerate(batch.messages):
+        item_id = item.get("id")
+        try:
+            message = Message(**{"thread_id": thread_id, **item})
+        except ValidationError as e:
+            results[index] = _batch_item(index, item_id, _validation_message(e))
+            continue
+        if message.thread_id != thread_id:
+            results[index] = _batch_item(index, message.id, f"thread_id must be {thread_id}")
+        elif message.id in pending:
+            results[index] = _batch_item(index, message.id, "Duplicate id in batch")
+        else:
+            # Space default timestamps apart so the batch keeps its order.
+            if message.created_at is None:
+                message.created_at = now + index * 1e-6
+            pending[message.id] = (index, message.dict())
+
+    rows = await _insert_new(pending, results)
+    if rows:
+        last = max(rows, key=lambda row: (row["created_at"], row["id"]))
+        await record_messages(thread_id, len(rows), last["id"], last["created_at"])
+        await thread_cache.invalidate(thread_id)
+        semantic_search.submit(rows)
+    for message_id, (index, _) in pending.items():
+        results[index] = _batch_item(index, message_id)
+
+    # The items are built here from validated input, so they are returned
+    # as-is rather than re-validated through the response model.
+    return response_settings.raw({
+        "object": "list",
+        "data": [results[index] for index in sorted(results)],
+        "created": len(pending),
+        "failed": len(results) - len(pending),
+    })
+
+
+async def _cursor(thread_id: str, message_id: str) -> Tuple[float, str]:
+    cursor = await MessageDB.get(id=message_id)
+    if not cursor or cursor.thread_id != thread_id:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {message_id}")
+    return cursor.created_at, cursor.id
+
+
+async def _search(q: str, limit: int, thread_id: Optional[str]) -> MessageSearchList:
+    if not semantic_search.enabled:
+        raise HTTPException(status_code=404, detail="Semantic search is not enabled")
+    hits = await semantic_search.search(q, limit, thread_id)
+    return MessageSearchList(data=[{"score": score, "message": message} for message, score in hits])
+
+
+@router.get("/threads/{thread_id}/messages/search", response_model=MessageSearchList)
+async def search_thread_messages(thread_id: str, q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=100)):
+    return await _search(q, limit, thread_id)
+
+
+@router.get("/messages/search", response_model=MessageSearchList)
+async def search_messages(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=100)):
+    return await _search(q, limit, None)
+
+
+@router.get("/threads/{thread_id}/messages", response_model=MessageList)
+async def get_messages(
+    thread_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    order: Literal["asc", "desc"] = "desc",
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated message fields to return, e.g. id,role,content"),
+):
+    selected = MESSAGE_FIELDS
+    if fields:
+        selected = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip())) or MESSAGE_FIELDS
+        unknown = [name for name in selected if name not in MESSAGE_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown message fields: {', '.join(unknown)}")
+    table = MessageDB.get_table()
+    ascending = order == "asc"
+    conditions = [table.c.thread_id == thread_id]
+    if after:
+        conditions.append(message_beyond(await _cursor(thread_id, after), newer=ascending))
+    if before:
+        # Walk backwards from ``before`` and restore the requested order afterwards.
+        conditions.append(message_beyond(await _cursor(thread_id, before), newer=not ascending))
+        ascending = not ascending
 
+    # Stored rows are read as plain values, never as models.
+    columns = [table.c[name] for name in dict.fromkeys(["id", *selected])]
+    messages = await fetch_rows(
+        MessageDB,
+        select(*columns).where(*conditions).order_by(*message_order(ascending)).limit(limit + 1),
+    )
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if before:
+        messages.reverse()
 
-@router.get("/threads/{thread_id}/messages", response_model=List[Message])
-async def get_messages(thread_id: str):
-    messages = await MessageDB.filter(thread_id=thread_id)
-    return messages
+    content = {
+        "object": "list",
+        "data": messages if not fields else [{name: message[name] for name in selected} for message in messages],
+        "first_id": messages[0]["id"] if messages else None,
+        "last_id": messages[-1]["id"] if messages else None,
+        "has_more": has_more,
+    }
+    if fields:
+        # Slimmed messages are not full Messages, so they skip the response model.
+        return response_settings.raw(content)
+    return response_settings.trusted(content)
@@ -1,19 +1,127 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query, WebSocket
+from app import config
 from app.models import Run, RunDB
+from app.services.database import is_duplicate_key
+from app.services.idempotency import HEADER, IdempotentRoute
+from app.services.prompts import build_thread_prompt
+from app.services.rate_limit import current_assistant
+from app.services.registry import registry
+from app.services.responses import fields, response_settings
+from app.services.run_events import FINISHED, next_change, run_events
+from app.services.run_scheduler import scheduler
+from app.services.streaming import sse_response
 
-router = APIRouter()
+router = APIRouter(route_class=IdempotentRoute)
 
 
 @router.post("/threads/{thread_id}/runs", response_model=Run)
-async def run_thread(thread_id: str, run: Run):
-    run_db = RunDB(**run.dict())
-    await run_db.save()
-    return run
+async def run_thread(thread_id: str, run: Run, stream: bool = False,
+                     idempotency_key: Optional[str] = Header(None, alias=HEADER)):
+    if stream:
+        if idempotency_key is not None:
+            # A stream cannot be replayed, so a retry would run the model again.
+            raise HTTPException(status_code=400, detail=f"{HEADER} is not supported with stream=true")
+        return await stream_run(thread_id, run)
+    if await scheduler.pending() >= scheduler.queue_size:
+        raise HTTPException(status_code=429, detail="Run queue is full")
+    run_db = RunDB(**{**run.dict(), "thread_id": thread_id, "status": "queued", "result": None})
+    await _create(run_db)
+    run_events.publish(run_db)
+    scheduler.submit(run_db.id, run_db.assistant_id)
+    return response_settings.trusted(fields(Run, run_db))
+
+
+async def stream_run(thread_id: str, run: Run):
+    connector = registry.require(config.get("runs", {}).get("connector", "openaiassistantconnector"))
+
+    run_db = RunDB(**{**run.dict(), "thread_id": thread_id, "status": "in_progress", "result": None})
+    await _create(run_db)
+    run_events.publish(run_db)
+    try:
+        prompt = await build_thread_prompt(thread_id, run_db.assistant_id)
+    except BaseException:
+        await _finish(run_db, "failed")
+        raise
+
+    async def chunks():
+        current_assistant.set(run_db.assistant_id)
+        parts = []
+        status = "failed"
+        try:
+            async for chunk in connector.stream_text(prompt):
+                parts.append(chunk)
+                yield chunk
+            status = "completed"
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client went away before the stream ended.
+            status = "cancelled"
+            raise
+        finally:
+            await _finish(run_db, status, "".join(parts) if status == "completed" else None)
+
+    return sse_response(chunks())
+
+
+async def _create(run_db: RunDB):
+    # Inserted, never saved over: a run stored under the id may be running.
+    try:
+        await run_db.insert()
+    except Exception as e:
+        if not is_duplicate_key(e):
+            raise
+        raise HTTPException(status_code=409, detail=f"Run {run_db.id} already exists")
+
+
+async def _finish(run_db: RunDB, status: str, result: Optional[str] = None):
+    # Shielded, so a run is not left in progress by a cancelled request.
+    await asyncio.shield(run_db.update(status=status, result=result))
+    run_events.publish(run_db, status=status, result=result)
 
 
 @router.get("/threads/{thread_id}/runs/{run_id}", response_model=Run)
-async def get_run(thread_id: str, run_id: str):
-    run = await RunDB.get(run_id)
-    if not run:
+async def get_run(
+    thread_id: str,
+    run_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the status of an unfinished run to change"),
+):
+    if not wait:
+        return response_settings.trusted(await _run(run_id, thread_id))
+    async with run_events.watching(run_id, thread_id) as changes:
+        run = await _run(run_id, thread_id)
+        if run["status"] in FINISHED:
+            return response_settings.trusted(run)
+        return response_settings.trusted(await next_change(changes, run["status"], wait) or run)
+
+
+async def _run(run_id: str, thread_id: str) -> dict:
+    run = await RunDB.get(id=run_id)
+    # A run is only found under its own thread.
+    if not run or run.thread_id != thread_id:
         raise HTTPException(status_code=404, detail="Run not found")
-    return run
+    return fields(Run, run)
+
+
+async def _closed(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.websocket("/threads/{thread_id}/runs/events")
+async def run_status_feed(websocket: WebSocket, thread_id: str):
+    """Sends each status change of the thread's runs, as a Run object, until
+    the client disconnects."""
+    await websocket.accept()
+    async with run_events.subscribe(thread_id) as changes:
+        closed = asyncio.create_task(_closed(websocket))
+        try:
+            while True:
+                change = asyncio.create_task(changes.get())
+                await asyncio.wait({change, closed}, return_when=asyncio.FIRST_COMPLETED)
+                if closed.done():
+                    change.cancel()
+                    return
+                await websocket.send_json(change.result())
+        finally:
+            closed.cancel()
@@ -1,19 +1,46 @@
+import time
+import uuid
 from fastapi import APIRouter, HTTPException
-from app.models import Thread, ThreadDB
+from app.models import MessageDB, Thread, ThreadDB
+from app.services.cache import thread_cache
+from app.services.database import bulk_insert, is_duplicate_key
+from app.services.idempotency import IdempotentRoute
+from app.services.responses import fields, response_settings
+from app.services.search import semantic_search
 
-router = APIRouter()
+router = APIRouter(route_class=IdempotentRoute)
 
 
-@router.post("/threads", response_model=Thread)
+@router.post("/threads", response_model=Thread, response_model_exclude={"messages"})
 async def create_thread(thread: Thread):
-    thread_db = ThreadDB(**thread.dict())
-    await thread_db.save()
-    return thread
+    now = time.time()
+    rows = [
+        {"id": f"msg_{uuid.uuid4().hex}", "thread_id": thread.id, "role": "user",
+         "content": content, "created_at": now + index * 1e-6}
+        for index, content in enumerate(thread.messages)
+    ]
+    thread_db = ThreadDB(
+        id=thread.id,
+        assistant_id=thread.assistant_id,
+        message_count=len(rows),
+        last_message_id=rows[-1]["id"] if rows else None,
+        last_message_at=rows[-1]["created_at"] if rows else None,
+    )
+    try:
+        await thread_cache.insert(thread_db)
+    except Exception as e:
+        if not is_duplicate_key(e):
+            raise
+        # Its initial messages would be stored a second time under new ids.
+        raise HTTPException(status_code=409, detail=f"Thread {thread.id} already exists")
+    await bulk_insert(MessageDB, rows)
+    semantic_search.submit(rows)
+    return response_settings.trusted(fields(Thread, thread_db, exclude={"messages"}))
 
 
-@router.get("/threads/{thread_id}", response_model=Thread)
+@router.get("/threads/{thread_id}", response_model=Thread, response_model_exclude={"messages"})
 async def get_thread(thread_id: str):
-    thread = await ThreadDB.get(thread_id)
+    thread = await thread_cache.get(thread_id)
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found")
-    return thread
+    return response_settings.trusted(fields(Thread, thread, exclude={"messages"}))
@@ -0,0 +1,44 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.services.transfer import TransferError, export_jsonl_gz, import_jsonl_gz, parse_cursor
+
+router = APIRouter()
+
+
+@router.get("/export")
+async def export_data(
+    tables: Optional[List[str]] = Query(None),
+    thread_id: Optional[str] = None,
+    after: Optional[str] = Query(None, description="Table:key of the last line already exported"),
+    chunk_size: int = Query(1000, ge=1, le=10000),
+):
+    try:
+        chunks = export_jsonl_gz(tables, thread_id, parse_cursor(after), chunk_size)
+        # The first chunk is read here so a bad cursor or table is a 400,
+        # not a broken stream.
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except TransferError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type="application/gzip",
+        headers={"Content-Disposition": 'attachment; filename="pygentic-export.jsonl.gz"'},
+    )
+
+
+@router.post("/import")
+async def import_data(request: Request, batch_size: int = Query(1000, ge=1, le=10000)):
+    try:
+        counts = await import_jsonl_gz(request.stream(), batch_size)
+    except TransferError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"object": "import", "tables": counts}
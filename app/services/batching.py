@@ -0,0 +1,116 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class BatcherClosed(RuntimeError):
+    """The batcher was closed before the item's batch completed."""
+
+
+class MicroBatcher:
+    """Coalesces concurrent calls into batched calls of a blocking function.
+
+    ``submit`` queues one item and waits for its result. Items are collected
+    until ``max_batch_size`` are pending or ``max_wait_ms`` have passed since
+    the first one arrived, then ``fn`` is called once with the whole list on
+    ``executor`` (a dedicated thread by default) and must return one result
+    per item, in order. A coroutine function ``fn`` is awaited instead, and
+    runs its batches where it likes, e.g. on a connector's executor.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        executor: Optional[Executor] = None,
+    ):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.is_async = asyncio.iscoroutinefunction(fn)
+        self.owns_executor = executor is None and not self.is_async
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batch") if self.owns_executor else executor
+        # (item, future, arrival time) of the items not yet batched.
+        self.pending: List[Tuple[Any, asyncio.Future, float]] = []
+        # The batch handed to the executor, until its results are in.
+        self.running: List[Tuple[Any, asyncio.Future, float]] = []
+        self.has_pending = asyncio.Event()
+        self.is_full = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((item, future, loop.time()))
+        self.has_pending.set()
+        if len(self.pending) >= self.max_batch_size:
+            self.is_full.set()
+        return await future
+
+    async def close(self):
+        running = self.running
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        # Nothing will resolve these any more, so their callers are failed
+        # rather than left waiting.
+        _fail(running + self.pending, BatcherClosed("The micro-batcher was closed"))
+        self.running = []
+        self.pending = []
+        self.has_pending.clear()
+        if self.owns_executor:
+            self.executor.shutdown(wait=False)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.has_pending.wait()
+            # Items that queued up while the previous batch ran, or were left
+            # over from a full one, have already waited, so the window is
+            # measured from the oldest one.
+            remaining = self.pending[0][2] + self.max_wait - loop.time()
+            if len(self.pending) < self.max_batch_size and remaining > 0:
+                self.is_full.clear()
+                try:
+                    await asyncio.wait_for(self.is_full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = [entry for entry in self.pending[:self.max_batch_size] if not entry[1].cancelled()]
+            self.pending = self.pending[self.max_batch_size:]
+            if not self.pending:
+                self.has_pending.clear()
+            if not batch:
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            self.running = batch
+            try:
+                items = [item for item, _, _ in batch]
+                if self.is_async:
+                    results = await self.fn(items)
+                else:
+                    results = await loop.run_in_executor(self.executor, self.fn, items)
+                if len(results) != len(batch):
+                    raise ValueError(f"A batch of {len(batch)} items returned {len(results)} results")
+            except Exception as e:
+                _fail(batch, e)
+                continue
+            finally:
+                self.running = []
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+def _fail(entries: List[Tuple[Any, asyncio.Future, float]], error: Exception):
+    for _, future, _ in entries:
+        if not future.done():
+            future.set_exception(error)
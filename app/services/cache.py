@@ -0,0 +1,161 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from app import config
+from app.models import AssistantDB, ThreadDB
+from app.services.shared_state import SharedState, shared_state
+
+
+class CacheBackend(ABC):
+    """Storage behind a ModelCache. Implement this to plug in a shared cache."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: Any):
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    async def clear(self):
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class LRUCache(CacheBackend):
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any):
+        self.entries[key] = (self.clock() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    async def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class ModelCache:
+    """Read-through, write-through cache of pydbantic rows keyed by ``id``.
+
+    With ``state`` (several server processes), writers bump the row's version
+    in the shared state and readers only use a cached copy stored at the
+    current version, so no process serves a row another process changed.
+    """
+
+    def __init__(self, model, backend: Optional[CacheBackend] = None, state: Optional[SharedState] = None):
+        self.model = model
+        self.backend = backend
+        self.state = state
+
+    def _version_key(self, key: str) -> str:
+        return f"{self.model.__name__}:{key}"
+
+    async def get(self, key: str):
+        if self.backend is None:
+            return await self.model.get(id=key)
+        if self.state is None:
+            instance = await self.backend.get(key)
+            if instance is None:
+                instance = await self.model.get(id=key)
+                if instance is not None:
+                    await self.backend.set(key, instance)
+            return instance
+        # Read the version before the row: a write in between leaves the
+        # stored copy at an old version, to be read again next time.
+        version = self.state.version(self._version_key(key))
+        entry = await self.backend.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        instance = await self.model.get(id=key)
+        if instance is not None:
+            await self.backend.set(key, (version, instance))
+        return instance
+
+    async def save(self, instance):
+        await instance.save()
+        return await self._written(instance)
+
+    async def insert(self, instance):
+        """Like ``save``, but fails rather than replace a stored row."""
+        await instance.insert()
+        return await self._written(instance)
+
+    async def _written(self, instance):
+        if self.state is not None:
+            self.state.bump(self._version_key(instance.id))
+            if self.backend is not None:
+                await self.backend.delete(instance.id)
+        elif self.backend is not None:
+            await self.backend.set(instance.id, instance)
+        return instance
+
+    async def invalidate(self, key: str):
+        if self.state is not None:
+            self.state.bump(self._version_key(key))
+        if self.backend is not None:
+            await self.backend.delete(key)
+
+    def stats(self) -> Dict[str, int]:
+        if self.backend is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.backend.stats()}
+
+
+def create_cache(model, cache_config: dict) -> ModelCache:
+    if not cache_config.get("enabled", True):
+        return ModelCache(model)
+    return ModelCache(model, LRUCache(
+        max_size=cache_config.get("max_size", 1024),
+        ttl=cache_config.get("ttl", 300.0),
+    ), shared_state)
+
+
+assistant_cache = create_cache(AssistantDB, config.get("cache", {}).get("assistants", {}))
+thread_cache = create_cache(ThreadDB, config.get("cache", {}).get("threads", {}))
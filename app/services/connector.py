@@ -1,26 +1,109 @@
-from sqlalchemy import create_engine
-from transformers import pipeline
+from typing import Optional
+
 import httpx
+from app.services import database as database_service
+from app.services.batching import MicroBatcher
+from app.services.executors import cpu_bound
+from app.services.interfaces import BaseConnector
 
 class DatabaseConnector:
+    # A view of the shared database service; it does not open connections of its own.
     def __init__(self, config):
-        self.engine = create_engine(config["url"])
-    
+        self.url = config.get("url", database_service.DATABASE_URL)
+
+    def get_database(self):
+        return database_service.database
+
     def get_engine(self):
-        return self.engine
+        if database_service.model_database is None:
+            return None
+        return database_service.model_database.engine
 
-class LLMServiceConnector:
-    def __init__(self, config):
-        self.generator = pipeline(config["model"])
-    
-    def generate_text(self, prompt: str) -> str:
-        return self.generator(prompt, max_length=50)[0]['generated_text']
+class LLMServiceConnector(BaseConnector):
+    """Generates text with a local Hugging Face pipeline. Enabled with
+    ``enabled = true`` in ``[connectors.llm_service]`` and registered as
+    ``llmserviceconnector``. Batches of prompts run on the connector's
+    executor, whose workers load the model when it starts."""
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = {}
+        self.generator = None
+        self.batcher = None
+        if config is not None:
+            self.initialize(config)
+            self.configure_executor(config)
+            self.load()
+
+    def initialize(self, config: dict):
+        self.config = config
+        self.max_length = config.get("max_length", 50)
+
+    def load(self):
+        # Imported here: transformers takes seconds to import and is only
+        # needed once a local model is actually loaded.
+        from transformers import pipeline
+
+        self.generator = pipeline(self.config.get("task", "text-generation"), model=self.config["model"])
+        tokenizer = getattr(self.generator, "tokenizer", None)
+        if tokenizer is not None and tokenizer.pad_token_id is None:
+            # Batched generation pads prompts; GPT-style models have no pad token.
+            tokenizer.pad_token_id = self.generator.model.config.eos_token_id
+
+    def warm_up(self):
+        if self.generator is None:
+            self.load()
+
+    async def connect(self):
+        if self.executor is None:
+            self.configure_executor(self.config)
+        if self.batcher is None:
+            # Concurrent prompts are coalesced into one pipeline call that
+            # runs on the executor.
+            self.batcher = MicroBatcher(
+                self.generate_batch,
+                max_batch_size=self.config.get("batch_size", 8),
+                max_wait_ms=self.config.get("batch_wait_ms", 10.0),
+            )
+
+    async def disconnect(self):
+        if self.batcher is not None:
+            await self.batcher.close()
+            self.batcher = None
+
+    @cpu_bound
+    def generate_batch(self, prompts):
+        self.warm_up()
+        outputs = self.generator(prompts, max_length=self.max_length, batch_size=len(prompts))
+        return [output[0]['generated_text'] for output in outputs]
+
+    async def generate_text(self, prompt: str) -> str:
+        if self.batcher is None:
+            await self.connect()
+        return await self.batcher.submit(prompt)
+
+    async def close(self):
+        await self.disconnect()
+        self.stop_executor()
 
 class ServerlessServiceConnector:
     def __init__(self, config):
         self.endpoint = config["endpoint"]
-    
+        self.limits = httpx.Limits(
+            max_connections=config.get("max_connections", 100),
+            max_keepalive_connections=config.get("max_keepalive_connections", 20),
+        )
+        self.timeout = httpx.Timeout(config.get("timeout", 60.0), connect=config.get("connect_timeout", 5.0))
+        self.client = None
+
     async def call_endpoint(self, data):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(self.endpoint, json=data)
+        # One pooled client for every call, created on first use.
+        if self.client is None:
+            self.client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        response = await self.client.post(self.endpoint, json=data)
+        response.raise_for_status()
         return response.json()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
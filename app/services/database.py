@@ -1,13 +1,351 @@
+import hashlib
+import pickle
+import sqlite3
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+import pydbantic
+import sqlalchemy
 from databases import Database
 
-DATABASE_URL = "sqlite:///./test.db"
-database = Database(DATABASE_URL)
+from app import config
+from app.models import AssistantDB, IdempotencyDB, MessageDB, RunDB, ThreadDB, ThreadSummaryDB
+from app.services.metrics import metrics, observe_db
+
+database_config = config["connectors"].get("database", {})
+DATABASE_URL = database_config.get("url", "sqlite:///./test.db")
+TABLES = [AssistantDB, ThreadDB, MessageDB, RunDB, ThreadSummaryDB, IdempotencyDB]
+
+# SQLite (3.32+) and PostgreSQL both accept at least this many bind
+# parameters in a single statement.
+MAX_BIND_PARAMS = 32766
+
+
+def _sqlite_connection_factory(settings: dict):
+    pragmas = [
+        "PRAGMA foreign_keys=ON",
+        f"PRAGMA synchronous={settings.get('synchronous', 'NORMAL')}",
+        f"PRAGMA busy_timeout={int(settings.get('busy_timeout', 5.0) * 1000)}",
+    ]
+
+    class SQLiteConnection(sqlite3.Connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            for pragma in pragmas:
+                self.execute(pragma)
+
+    return SQLiteConnection
+
+
+def create_pool(url: str, settings: dict) -> Database:
+    """Build the ``databases`` connection pool for ``url`` from the
+    ``[connectors.database]`` settings."""
+    statement_timeout = settings.get("statement_timeout")
+    if url.startswith("sqlite"):
+        return Database(
+            url,
+            factory=_sqlite_connection_factory(settings),
+            timeout=settings.get("busy_timeout", 5.0),
+        )
+    options = {"min_size": settings.get("min_size", 1), "max_size": settings.get("max_size", 10)}
+    if statement_timeout and url.startswith("postgres"):
+        options["command_timeout"] = statement_timeout
+        options["server_settings"] = {"statement_timeout": str(int(statement_timeout * 1000))}
+    elif statement_timeout and url.startswith("mysql"):
+        options["init_command"] = f"SET SESSION max_execution_time={int(statement_timeout * 1000)}"
+    return Database(url, **options)
+
+
+class ModelDatabase(pydbantic.Database):
+    """pydbantic database whose queries run on the shared ``databases`` pool
+    instead of pydbantic's own per-instance connections."""
+
+    pool: Optional[Database] = None
+
+    async def __aenter__(self):
+        return self.pool
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    async def execute(self, query, values: dict = {}):
+        if not metrics.enabled:
+            return await super().execute(query, values)
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, values)
+        finally:
+            observe_db(_table_name(query), type(query).__name__.lower(), start)
+
+    async def execute_many(self, query, values):
+        if not metrics.enabled:
+            return await super().execute_many(query, values)
+        start = time.perf_counter()
+        try:
+            return await super().execute_many(query, values)
+        finally:
+            observe_db(_table_name(query), "execute_many", start)
+
+    async def fetch(self, query, table_name, values=None):
+        if not metrics.enabled:
+            return await super().fetch(query, table_name, values)
+        start = time.perf_counter()
+        try:
+            return await super().fetch(query, table_name, values)
+        finally:
+            # pydbantic passes the set of tables a query reads.
+            model = table_name if isinstance(table_name, str) else ",".join(sorted(table_name))
+            observe_db(model, "select", start)
+
+
+def _table_name(query) -> str:
+    table = getattr(query, "table", None)
+    return getattr(table, "name", "unknown")
+
+
+def setup_models(pool: Database, url: str = None, settings: dict = None) -> ModelDatabase:
+    url = url or str(pool.url)
+    settings = database_config if settings is None else settings
+    model_database = ModelDatabase.create(url, tables=TABLES)
+    model_database.pool = pool
+    if url.startswith("sqlite"):
+        # WAL lets readers proceed while a writer holds the lock; the mode is
+        # stored in the database file, so it only needs to be set once.
+        with model_database.engine.connect() as connection:
+            connection.exec_driver_sql(f"PRAGMA journal_mode={settings.get('journal_mode', 'WAL')}")
+    create_indexes(model_database.engine)
+    return model_database
+
+
+database = create_pool(DATABASE_URL, database_config)
+model_database: Optional[ModelDatabase] = None
 
 
 async def connect_db():
+    global model_database
     await database.connect()
+    model_database = setup_models(database, DATABASE_URL)
+    fingerprint = schema_fingerprint(model_database.engine)
+    # pydbantic's migration check always waits seconds to coordinate workers,
+    # so it only runs when the models changed since the last migration.
+    if database_config.get("migrate", True) and stored_fingerprint(model_database.engine) != fingerprint:
+        # Must run before the schema migration, which drops the old column.
+        legacy_threads = move_embedded_messages(model_database.engine)
+        # Compares the models against the stored schema and migrates changed tables.
+        await model_database
+        if legacy_threads:
+            backfill_thread_stats(model_database.engine)
+        store_fingerprint(model_database.engine, fingerprint)
 
 
 async def disconnect_db():
     await database.disconnect()
 
+
+SCHEMA_TABLE = sqlalchemy.Table(
+    "pygentic_schema", sqlalchemy.MetaData(), sqlalchemy.Column("fingerprint", sqlalchemy.String(64), primary_key=True)
+)
+
+
+def schema_fingerprint(engine) -> str:
+    """Hash of the DDL of every model's table."""
+    ddl = [str(sqlalchemy.schema.CreateTable(model.get_table()).compile(engine)) for model in TABLES]
+    return hashlib.sha256("\n".join(ddl).encode()).hexdigest()
+
+
+def stored_fingerprint(engine) -> Optional[str]:
+    SCHEMA_TABLE.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        return connection.execute(sqlalchemy.select(SCHEMA_TABLE.c.fingerprint)).scalar()
+
+
+def store_fingerprint(engine, fingerprint: str):
+    with engine.begin() as connection:
+        connection.execute(SCHEMA_TABLE.delete())
+        connection.execute(SCHEMA_TABLE.insert().values(fingerprint=fingerprint))
+
+
+def create_indexes(engine):
+    # pydbantic only creates primary keys, so secondary indexes are added here
+    # once the models have been registered with a database.
+    messages = MessageDB.get_table()
+    runs = RunDB.get_table()
+    idempotency = IdempotencyDB.get_table()
+    indexes = [
+        sqlalchemy.Index("ix_messagedb_thread_id_created_at", messages.c.thread_id, messages.c.created_at),
+        sqlalchemy.Index("ix_rundb_status_created_at", runs.c.status, runs.c.created_at),
+        sqlalchemy.Index("ix_rundb_thread_id", runs.c.thread_id),
+        sqlalchemy.Index("ix_idempotencydb_expires_at", idempotency.c.expires_at),
+    ]
+    for index in indexes:
+        index.create(engine, checkfirst=True)
+
+
+def _sqlite_multirow_insert(table, columns: List[str], rows: List[dict]):
+    # Compiling a multi-row VALUES clause through SQLAlchemy creates one bind
+    # parameter object per value, which dominates large imports; SQLite's qmark
+    # placeholders let us build the statement directly instead.
+    placeholders = "(" + ", ".join("?" * len(columns)) + ")"
+    sql = 'INSERT INTO "{}" ({}) VALUES {}'.format(
+        table.name, ", ".join(f'"{column}"' for column in columns), ", ".join([placeholders] * len(rows))
+    )
+    return sql, [row.get(column) for row in rows for column in columns]
+
+
+async def bulk_insert(model, rows: List[dict]):
+    """Insert ``rows`` (plain column values) into ``model``'s table in one
+    transaction, using as few multi-row INSERT statements as possible."""
+    if not rows:
+        return
+    table = model.get_table()
+    columns = [column.name for column in table.c]
+    chunk_size = max(1, MAX_BIND_PARAMS // len(columns))
+    began = time.perf_counter()
+    async with model.__metadata__.database as db:
+        async with db.connection() as connection:
+            async with connection.transaction():
+                for start in range(0, len(rows), chunk_size):
+                    chunk = rows[start:start + chunk_size]
+                    if db.url.dialect == "sqlite":
+                        await connection.raw_connection.execute(*_sqlite_multirow_insert(table, columns, chunk))
+                    else:
+                        await connection.execute(table.insert().values(chunk))
+    if metrics.enabled:
+        observe_db(table.name, "bulk_insert", began)
+
+
+async def fetch_rows(model, query) -> List[dict]:
+    """Run a select on ``model``'s table and return plain rows, without
+    building (and validating) a model instance per row."""
+    began = time.perf_counter()
+    async with model.__metadata__.database as db:
+        rows = await db.fetch_all(query)
+    if metrics.enabled:
+        observe_db(model.get_table().name, "select", began)
+    return [dict(row._mapping) for row in rows]
+
+
+async def existing_keys(model, keys: List[str]) -> set:
+    """Return the subset of primary ``keys`` already stored for ``model``."""
+    table = model.get_table()
+    primary_key = table.primary_key.columns.values()[0]
+    found = set()
+    began = time.perf_counter()
+    async with model.__metadata__.database as db:
+        async with db.connection() as connection:
+            for start in range(0, len(keys), MAX_BIND_PARAMS):
+                chunk = keys[start:start + MAX_BIND_PARAMS]
+                if db.url.dialect == "sqlite":
+                    sql = 'SELECT "{}" FROM "{}" WHERE "{}" IN ({})'.format(
+                        primary_key.name, table.name, primary_key.name, ", ".join("?" * len(chunk))
+                    )
+                    cursor = await connection.raw_connection.execute(sql, chunk)
+                    rows = await cursor.fetchall()
+                    await cursor.close()
+                else:
+                    rows = await connection.fetch_all(sqlalchemy.select(primary_key).where(primary_key.in_(chunk)))
+                found.update(row[0] for row in rows)
+    if metrics.enabled:
+        observe_db(table.name, "existing_keys", began)
+    return found
+
+
+def is_duplicate_key(error: Exception) -> bool:
+    """Whether ``error`` is the database rejecting a row whose key is taken."""
+    # asyncpg raises UniqueViolationError; the DB-API drivers an IntegrityError.
+    return isinstance(error, sqlite3.IntegrityError) or type(error).__name__ in ("IntegrityError", "UniqueViolationError")
+
+
+def message_beyond(position: Tuple[float, str], newer: bool, inclusive: bool = False):
+    """Messages newer (or older) than ``position``, a (created_at, id) pair.
+    A row-value comparison, so the scan of the (thread_id, created_at)
+    index starts at the position's created_at instead of at the beginning
+    of the thread; only messages sharing that timestamp are compared by id."""
+    table = MessageDB.get_table()
+    key = sqlalchemy.tuple_(table.c.created_at, table.c.id)
+    value = sqlalchemy.tuple_(sqlalchemy.literal(position[0]), sqlalchemy.literal(position[1]))
+    if newer:
+        return key >= value if inclusive else key > value
+    return key <= value if inclusive else key < value
+
+
+def message_order(ascending: bool) -> tuple:
+    """Order clauses for messages by (created_at, id)."""
+    table = MessageDB.get_table()
+    if ascending:
+        return table.c.created_at.asc(), table.c.id.asc()
+    return table.c.created_at.desc(), table.c.id.desc()
+
+
+async def record_messages(thread_id: str, count: int, last_id: str, last_at: float):
+    """Add ``count`` appended messages to the thread's count, and make the
+    newest of them its last message unless a newer one is already recorded.
+    Runs as one UPDATE, so concurrent appends do not lose counts."""
+    table = ThreadDB.get_table()
+    newer = sqlalchemy.or_(table.c.last_message_at.is_(None), table.c.last_message_at <= last_at)
+    query = table.update().where(table.c.id == thread_id).values(
+        message_count=table.c.message_count + count,
+        last_message_id=sqlalchemy.case((newer, last_id), else_=table.c.last_message_id),
+        last_message_at=sqlalchemy.case((newer, last_at), else_=table.c.last_message_at),
+    )
+    await ThreadDB.__metadata__.database.execute(query)
+
+
+def move_embedded_messages(engine) -> bool:
+    """Threads used to store their messages as a pickled list in a
+    ``messages`` column. Copies those lists into the message table as user
+    messages, for threads that have no messages there yet. Returns whether
+    the old layout was found."""
+    name = ThreadDB.get_table().name
+    inspector = sqlalchemy.inspect(engine)
+    if name not in inspector.get_table_names():
+        return False
+    if "messages" not in {column["name"] for column in inspector.get_columns(name)}:
+        return False
+    legacy = sqlalchemy.Table(name, sqlalchemy.MetaData(), autoload_with=engine)
+    messages = MessageDB.get_table()
+    now = time.time()
+    with engine.begin() as connection:
+        stored = {row[0] for row in connection.execute(sqlalchemy.select(messages.c.thread_id).distinct())}
+        rows = []
+        for thread_id, embedded in connection.execute(sqlalchemy.select(legacy.c.id, legacy.c.messages)):
+            if thread_id in stored or not embedded:
+                continue
+            rows.extend(
+                {"id": f"msg_{uuid.uuid4().hex}", "thread_id": thread_id, "role": "user",
+                 "content": str(content), "created_at": now + index * 1e-6}
+                for index, content in enumerate(pickle.loads(embedded))
+            )
+        if rows:
+            connection.execute(messages.insert(), rows)
+    return True
+
+
+def _thread_stats():
+    # Each thread's message count and last message, from its messages.
+    threads = ThreadDB.get_table()
+    messages = MessageDB.get_table()
+    of_thread = messages.c.thread_id == threads.c.id
+    last = sqlalchemy.select(messages.c.id, messages.c.created_at).where(of_thread).order_by(
+        messages.c.created_at.desc(), messages.c.id.desc()
+    ).limit(1)
+    return threads.update().values(
+        message_count=sqlalchemy.select(sqlalchemy.func.count()).where(of_thread).scalar_subquery(),
+        last_message_id=last.with_only_columns(messages.c.id).scalar_subquery(),
+        last_message_at=last.with_only_columns(messages.c.created_at).scalar_subquery(),
+    )
+
+
+def backfill_thread_stats(engine):
+    """Recomputes every thread's message count and last message from its messages."""
+    with engine.begin() as connection:
+        connection.execute(_thread_stats())
+
+
+async def refresh_thread_stats(thread_ids: List[str]):
+    """Recomputes the message count and last message of ``thread_ids``."""
+    threads = ThreadDB.get_table()
+    for start in range(0, len(thread_ids), MAX_BIND_PARAMS):
+        chunk = thread_ids[start:start + MAX_BIND_PARAMS]
+        await ThreadDB.__metadata__.database.execute(_thread_stats().where(threads.c.id.in_(chunk)))
@@ -1,91 +1,158 @@
+import json
+import time
+from typing import AsyncIterator, Dict
+
 import httpx
 from app.services.interfaces import BaseConnector
+from app.services.metrics import metrics, observe_upstream, upstream_requests_in_flight
+
+
+def _operation(path: str) -> str:
+    # "/threads/abc/runs/xyz" -> "threads/runs", so ids do not become labels.
+    return "/".join(path.strip("/").split("/")[::2])
+
 
 class OpenAIAssistantConnector(BaseConnector):
     def initialize(self, config: dict):
         self.api_key = config.get("api_key", "your-default-api-key")
-        self.base_url = "https://api.openai.com/v1"
+        self.base_url = config.get("base_url", "https://api.openai.com/v1")
+        self.http2 = config.get("http2", True)
+        self.limits = httpx.Limits(
+            max_connections=config.get("max_connections", 100),
+            max_keepalive_connections=config.get("max_keepalive_connections", 20),
+            keepalive_expiry=config.get("keepalive_expiry", 30.0),
+        )
+        self.timeout = httpx.Timeout(
+            config.get("timeout", 60.0),
+            connect=config.get("connect_timeout", 5.0),
+        )
+        self.client = None
 
     async def connect(self):
-        pass
+        # One pooled client per connector so connections (and TLS sessions)
+        # are kept alive and reused across requests.
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout,
+            )
 
     async def disconnect(self):
-        pass
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
 
-    async def generate_text(self, prompt: str) -> str:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/completions",
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if self.client is None:
+            await self.connect()
+        if not metrics.enabled:
+            return await self.client.request(
+                method,
+                path,
                 headers={"Authorization": f"Bearer {self.api_key}"},
-                json={"prompt": prompt, "max_tokens": 50}
+                **kwargs
             )
+        labels = (type(self).__name__,)
+        status, size = "error", None
+        upstream_requests_in_flight.inc(labels=labels)
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(
+                method,
+                path,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                **kwargs
+            )
+            status, size = str(response.status_code), len(response.content)
+            return response
+        finally:
+            upstream_requests_in_flight.dec(labels=labels)
+            observe_upstream(type(self).__name__, _operation(path), status, start, size)
+
+    async def generate_text(self, prompt: str) -> str:
+        response = await self._request(
+            "POST", "/completions", json={"prompt": prompt, "max_tokens": 50}
+        )
+        response.raise_for_status()
         response_data = response.json()
         return response_data['choices'][0]['text']
 
-    async def create_assistant(self, data: dict):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/assistants",
+    async def stream_text(self, prompt: str) -> AsyncIterator[str]:
+        if self.client is None:
+            await self.connect()
+        labels = (type(self).__name__,)
+        status, size = "error", None
+        if metrics.enabled:
+            upstream_requests_in_flight.inc(labels=labels)
+        start = time.perf_counter()
+        try:
+            async with self.client.stream(
+                "POST",
+                "/completions",
                 headers={"Authorization": f"Bearer {self.api_key}"},
-                json=data
-            )
+                json={"prompt": prompt, "max_tokens": 50, "stream": True}
+            ) as response:
+                status = str(response.status_code)
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    text = json.loads(data)['choices'][0].get('text')
+                    if text:
+                        yield text
+                size = response.num_bytes_downloaded
+        finally:
+            if metrics.enabled:
+                upstream_requests_in_flight.dec(labels=labels)
+                observe_upstream(type(self).__name__, "completions/stream", status, start, size)
+
+    async def create_assistant(self, data: dict):
+        response = await self._request("POST", "/assistants", json=data)
         return response.json()
 
     async def get_assistant(self, assistant_id: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/assistants/{assistant_id}",
-                headers={"Authorization": f"Bearer {self.api_key}"}
-            )
+        response = await self._request("GET", f"/assistants/{assistant_id}")
         return response.json()
 
     async def create_thread(self, data: dict):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/threads",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=data
-            )
+        response = await self._request("POST", "/threads", json=data)
         return response.json()
 
     async def get_thread(self, thread_id: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/threads/{thread_id}",
-                headers={"Authorization": f"Bearer {self.api_key}"}
-            )
+        response = await self._request("GET", f"/threads/{thread_id}")
         return response.json()
 
     async def add_message(self, thread_id: str, data: dict):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/threads/{thread_id}/messages",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=data
-            )
+        response = await self._request("POST", f"/threads/{thread_id}/messages", json=data)
         return response.json()
 
     async def get_messages(self, thread_id: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/threads/{thread_id}/messages",
-                headers={"Authorization": f"Bearer {self.api_key}"}
-            )
+        response = await self._request("GET", f"/threads/{thread_id}/messages")
         return response.json()
 
     async def run_thread(self, thread_id: str, data: dict):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/threads/{thread_id}/runs",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=data
-            )
+        response = await self._request("POST", f"/threads/{thread_id}/runs", json=data)
         return response.json()
 
     async def get_run(self, thread_id: str, run_id: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/threads/{thread_id}/runs/{run_id}",
-                headers={"Authorization": f"Bearer {self.api_key}"}
-            )
+        response = await self._request("GET", f"/threads/{thread_id}/runs/{run_id}")
         return response.json()
+
+
+def named_connectors(config: dict) -> Dict[str, OpenAIAssistantConnector]:
+    """One connector per ``[connectors.openai_assistant.<name>]`` sub-table,
+    e.g. for several endpoints or API keys to route over. Each takes the
+    settings of ``[connectors.openai_assistant]`` and overrides them with its
+    own."""
+    shared = {key: value for key, value in config.items() if not isinstance(value, dict)}
+    connectors = {}
+    for name, overrides in config.items():
+        if isinstance(overrides, dict):
+            connectors[name] = OpenAIAssistantConnector()
+            connectors[name].initialize({**shared, **overrides})
+    return connectors
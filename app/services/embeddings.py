@@ -0,0 +1,107 @@
+import hashlib
+import importlib
+import re
+from abc import ABC, abstractmethod
+from typing import List
+
+import httpx
+import numpy as np
+
+TOKEN = re.compile(r"\w+")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    # Unit length, so a dot product is the cosine similarity.
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+class EmbeddingConnector(ABC):
+    """Turns texts into vectors for semantic search. ``embed`` returns one
+    unit-length float32 row of ``dimensions`` values per text."""
+
+    dimensions: int
+
+    @abstractmethod
+    def initialize(self, config: dict):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        pass
+
+
+class HashEmbedder(EmbeddingConnector):
+    """Deterministic, local embeddings: words and word pairs hashed into
+    ``dimensions`` signed buckets. Needs no model, so texts only match on
+    shared words; meant for tests and offline use."""
+
+    def initialize(self, config: dict):
+        self.dimensions = config.get("dimensions", 256)
+
+    def _features(self, text: str):
+        words = TOKEN.findall(text.lower())
+        return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        return normalize(vectors)
+
+
+class OpenAIEmbedder(EmbeddingConnector):
+    """Embeddings from an OpenAI-compatible ``/embeddings`` endpoint."""
+
+    def initialize(self, config: dict):
+        self.dimensions = config.get("dimensions", 1536)
+        self.model = config.get("model", "text-embedding-3-small")
+        self.api_key = config.get("api_key", "your-default-api-key")
+        self.base_url = config.get("base_url", "https://api.openai.com/v1")
+        self.timeout = config.get("timeout", 60.0)
+        self.client = None
+
+    async def connect(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout)
+
+    async def disconnect(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        await self.connect()
+        response = await self.client.post(
+            "/embeddings",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={"model": self.model, "input": texts, "dimensions": self.dimensions},
+        )
+        response.raise_for_status()
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return normalize(np.array([item["embedding"] for item in data], dtype=np.float32))
+
+
+EMBEDDERS = {"hash": HashEmbedder, "openai": OpenAIEmbedder}
+
+
+def create_embedder(config: dict) -> EmbeddingConnector:
+    """The embedder named by ``embedder``: ``hash``, ``openai``, or a
+    ``module:Class`` path to an EmbeddingConnector subclass."""
+    name = config.get("embedder", "hash")
+    if name in EMBEDDERS:
+        embedder_class = EMBEDDERS[name]
+    else:
+        module, _, class_name = name.partition(":")
+        embedder_class = getattr(importlib.import_module(module), class_name)
+    embedder = embedder_class()
+    embedder.initialize(config)
+    return embedder
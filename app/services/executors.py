@@ -0,0 +1,101 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+EXECUTOR_MODES = ("thread", "process", "inline")
+
+# The connector owned by this worker process (process mode only).
+_worker_connector = None
+
+
+def cpu_bound(method):
+    """Marks a synchronous connector method as CPU-bound.
+
+    The decorated method becomes awaitable and runs on the connector's
+    executor instead of the event loop.
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        return await self.run_cpu_bound(method.__name__, *args, **kwargs)
+
+    wrapper.cpu_bound = method
+    return wrapper
+
+
+def _load_worker(connector_class, config: dict):
+    # Runs once per worker process so models are loaded before the first call.
+    global _worker_connector
+    _worker_connector = connector_class()
+    _worker_connector.initialize(config)
+    _worker_connector.warm_up()
+
+
+def _call_worker(name: str, args: tuple, kwargs: dict):
+    return getattr(type(_worker_connector), name).cpu_bound(_worker_connector, *args, **kwargs)
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+class ConnectorExecutor:
+    """Runs a connector's ``cpu_bound`` methods in a thread or process pool.
+
+    Configured per connector with ``executor`` (``thread``, ``process`` or
+    ``inline``), ``executor_workers`` and, for processes,
+    ``executor_start_method``. Process workers build their own connector
+    from the same config, so the connector class must be importable.
+    """
+
+    def __init__(self, connector_class, config: dict):
+        self.mode = config.get("executor", "thread")
+        if self.mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor {self.mode!r}, expected one of {EXECUTOR_MODES}")
+        self.workers = config.get("executor_workers", min(4, os.cpu_count() or 1))
+        self.pool: Optional[Executor] = None
+        if self.mode == "thread":
+            self.pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix=connector_class.__name__
+            )
+        elif self.mode == "process":
+            start_method = config.get("executor_start_method")
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(start_method) if start_method else None,
+                initializer=_load_worker,
+                initargs=(connector_class, config),
+            )
+
+    async def start(self, connector):
+        loop = asyncio.get_running_loop()
+        if self.mode == "process":
+            # Start every worker (and load its model) up front rather than on
+            # the first request.
+            await asyncio.gather(*(
+                loop.run_in_executor(self.pool, _worker_ready) for _ in range(self.workers)
+            ))
+        elif self.mode == "thread":
+            await loop.run_in_executor(self.pool, connector.warm_up)
+        else:
+            connector.warm_up()
+
+    async def run(self, connector, name: str, args: tuple, kwargs: dict):
+        method = getattr(type(connector), name).cpu_bound
+        if self.mode == "inline":
+            return method(connector, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        if self.mode == "thread":
+            return await loop.run_in_executor(self.pool, functools.partial(method, connector, *args, **kwargs))
+        return await loop.run_in_executor(self.pool, _call_worker, name, args, kwargs)
+
+    def shutdown(self):
+        if self.pool is not None:
+            if sys.version_info >= (3, 9):
+                self.pool.shutdown(wait=False, cancel_futures=True)
+            else:
+                self.pool.shutdown(wait=False)
@@ -0,0 +1,98 @@
+import asyncio
+import random
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+import httpx
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+@dataclass
+class FanOutResult:
+    index: int
+    result: Any = None
+    error: Optional[str] = None
+    attempts: int = 0
+    elapsed_ms: float = 0.0
+
+    def dict(self) -> dict:
+        return asdict(self)
+
+
+class FanOutError(RuntimeError):
+    """A call of a batch failed, for callers that need every result."""
+
+
+def retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def describe(error: Exception) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "Timed out"
+    return str(error) or type(error).__name__
+
+
+async def fan_out(
+    call: Callable[[Any], Awaitable[Any]],
+    payloads: Iterable[Any],
+    concurrency: int = 10,
+    timeout: Optional[float] = 30.0,
+    retries: int = 2,
+    backoff_base: float = 0.1,
+) -> AsyncIterator[FanOutResult]:
+    """Calls ``call`` once per payload, at most ``concurrency`` at a time,
+    and yields each result as soon as it completes (so not in payload order).
+
+    Each attempt is limited to ``timeout`` seconds. Timeouts, connection
+    errors and 429/5xx responses are retried up to ``retries`` times with
+    jittered exponential backoff; other errors fail the item at once.
+    Failures are reported in the result's ``error`` instead of raising.
+    Closing the iterator early cancels the calls still in progress.
+    """
+    items = enumerate(payloads)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def attempt(index: int, payload: Any) -> FanOutResult:
+        start = time.perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                result = await asyncio.wait_for(call(payload), timeout)
+                return FanOutResult(index, result=result, attempts=attempts,
+                                    elapsed_ms=(time.perf_counter() - start) * 1000)
+            except Exception as e:
+                if attempts > retries or not retryable(e):
+                    return FanOutResult(index, error=describe(e), attempts=attempts,
+                                        elapsed_ms=(time.perf_counter() - start) * 1000)
+            await asyncio.sleep(random.uniform(0, backoff_base * 2 ** (attempts - 1)))
+
+    async def worker():
+        # Workers pull payloads as they free up, so a large batch never has
+        # more than ``concurrency`` calls (or tasks) at once.
+        try:
+            for index, payload in items:
+                await results.put(await attempt(index, payload))
+        finally:
+            results.put_nowait(None)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        finished = 0
+        while finished < len(workers):
+            result = await results.get()
+            if result is None:
+                finished += 1
+            else:
+                yield result
+        # Re-raises anything a worker failed with outside of ``call``.
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+from starlette.responses import Response
+
+from app import config
+from app.models import IdempotencyDB
+from app.services.cache import LRUCache
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+class KeyReused(Exception):
+    """The key was first used for a different request."""
+
+
+class RequestInProgress(Exception):
+    """Another process is still executing the first request with the key."""
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    media_type: Optional[str]
+    body: bytes
+    expires_at: float
+
+    def response(self) -> Response:
+        return Response(self.body, status_code=self.status_code, media_type=self.media_type,
+                        headers={"Idempotent-Replayed": "true"})
+
+
+def fingerprint(request: Request, body: bytes) -> str:
+    digest = hashlib.sha256(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class Idempotency:
+    """Executes each create request that carries an Idempotency-Key once.
+
+    The first request with a key claims it with a pending row in the
+    idempotency table; a successful (2xx/3xx) response is then stored there
+    for ``ttl`` seconds and returned to every repeat. Duplicates that arrive
+    while the first is running wait for it: in this process on its future,
+    sharing its outcome whether it succeeds or fails, in other processes by
+    polling the row for up to ``wait_timeout`` seconds. A request that fails
+    releases its key, so a later retry runs again. A pending row outlives a
+    crashed process by ``lease`` seconds at most.
+    """
+
+    def __init__(self, ttl: float = 86400.0, cache_size: int = 4096, lease: float = 60.0,
+                 wait_timeout: float = 30.0, poll_interval: float = 0.05, clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.lease = lease
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.cache = LRUCache(cache_size, ttl)
+        self.inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.next_purge = 0.0
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+
+    def configure(self, idempotency_config: dict):
+        self.ttl = idempotency_config.get("ttl", self.ttl)
+        self.lease = idempotency_config.get("lease", self.lease)
+        self.wait_timeout = idempotency_config.get("wait_timeout", self.wait_timeout)
+        self.poll_interval = idempotency_config.get("poll_interval", self.poll_interval)
+        self.cache = LRUCache(idempotency_config.get("cache_size", self.cache.max_size), self.ttl)
+
+    async def execute(self, key: str, fingerprint: str, call: Callable[[], Awaitable[Response]]) -> Response:
+        stored = await self.cache.get(key)
+        if stored is not None and stored.expires_at > self.clock():
+            self.replayed += 1
+            return self._replay(stored, fingerprint)
+        running = self.inflight.get(key)
+        if running is not None:
+            return await self._join(running, fingerprint)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = (fingerprint, future)
+        # What the duplicates waiting here get: the response, or the error.
+        outcome: Union[StoredResponse, Exception, None] = None
+        try:
+            stored = await self._claim(key, fingerprint)
+            if stored is not None:
+                self.replayed += 1
+                outcome = stored
+                return self._replay(stored, fingerprint)
+            response = await self._call(key, call)
+            outcome = await self._store(key, fingerprint, response)
+            return response
+        except Exception as error:
+            if outcome is None:
+                outcome = error
+            raise
+        finally:
+            del self.inflight[key]
+            future.set_result(outcome)
+
+    async def _join(self, running: Tuple[str, asyncio.Future], fingerprint: str) -> Response:
+        """Waits for the request with the key running in this process and
+        answers as it did, even when it failed: the handler never runs twice
+        for concurrent duplicates."""
+        first, future = running
+        if first != fingerprint:
+            raise KeyReused()
+        self.coalesced += 1
+        outcome = await asyncio.shield(future)
+        if isinstance(outcome, StoredResponse):
+            return outcome.response()
+        if outcome is not None:
+            raise outcome
+        # The first request was cancelled; a retry claims the key again.
+        raise RequestInProgress()
+
+    def _replay(self, stored: StoredResponse, fingerprint: str) -> Response:
+        if stored.fingerprint != fingerprint:
+            raise KeyReused()
+        return stored.response()
+
+    async def _call(self, key: str, call: Callable[[], Awaitable[Response]]) -> Response:
+        self.executed += 1
+        try:
+            return await call()
+        except BaseException:
+            await self._release(key)
+            raise
+
+    async def _claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Claims ``key`` for this request (returning None), or returns the
+        response already stored for it."""
+        table = IdempotencyDB.get_table()
+        database = IdempotencyDB.__metadata__.database
+        deadline = self.clock() + self.wait_timeout
+        retried = False
+        await self._purge()
+        while True:
+            now = self.clock()
+            # Expired records, pending or not, give their key up.
+            await database.execute(table.delete().where(table.c.key == key, table.c.expires_at <= now))
+            try:
+                await database.execute(table.insert().values(
+                    key=key, fingerprint=fingerprint, expires_at=now + self.lease,
+                ))
+                return None
+            except Exception:
+                # Either the key is taken, or the insert failed for real.
+                record = await IdempotencyDB.get(key=key)
+                if record is None:
+                    # Released since the insert; claim it once more.
+                    if not retried:
+                        retried = True
+                        continue
+                    raise
+            if record.status_code is not None:
+                stored = StoredResponse(record.fingerprint, record.status_code, record.media_type,
+                                        record.body.encode(), record.expires_at)
+                await self.cache.set(key, stored)
+                return stored
+            if record.fingerprint != fingerprint:
+                raise KeyReused()
+            if self.clock() >= deadline:
+                raise RequestInProgress()
+            await asyncio.sleep(self.poll_interval)
+
+    async def _store(self, key: str, fingerprint: str, response: Response) -> Optional[StoredResponse]:
+        """Stores a successful response for ``key``; a failure releases the
+        key instead, and is returned only for the duplicates waiting here."""
+        body = getattr(response, "body", None)
+        if body is None:
+            # Streams cannot be replayed; the routes that stream reject keys.
+            await self._release(key)
+            return None
+        stored = StoredResponse(fingerprint, response.status_code, response.media_type, body, self.clock() + self.ttl)
+        if response.status_code >= 400:
+            # Failures may succeed when retried.
+            await self._release(key)
+            return stored
+        table = IdempotencyDB.get_table()
+        await IdempotencyDB.__metadata__.database.execute(table.update().where(table.c.key == key).values(
+            status_code=stored.status_code, media_type=stored.media_type, body=body.decode(),
+            expires_at=stored.expires_at,
+        ))
+        await self.cache.set(key, stored)
+        return stored
+
+    async def _release(self, key: str):
+        table = IdempotencyDB.get_table()
+        await asyncio.shield(IdempotencyDB.__metadata__.database.execute(
+            table.delete().where(table.c.key == key, table.c.status_code.is_(None))
+        ))
+
+    async def _purge(self):
+        now = self.clock()
+        if now < self.next_purge:
+            return
+        self.next_purge = now + min(self.ttl, 60.0)
+        table = IdempotencyDB.get_table()
+        await IdempotencyDB.__metadata__.database.execute(table.delete().where(table.c.expires_at <= now))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "inflight": len(self.inflight),
+        }
+
+
+idempotency = Idempotency()
+idempotency.configure(config.get("idempotency", {}))
+
+
+class IdempotentRoute(APIRoute):
+    """Route class for create routes: a POST with an Idempotency-Key header
+    runs through ``idempotency``."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            key = request.headers.get(HEADER)
+            if key is None or request.method != "POST":
+                return await handler(request)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                raise HTTPException(status_code=400, detail=f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+            try:
+                return await idempotency.execute(key, fingerprint(request, await request.body()), lambda: handler(request))
+            except KeyReused:
+                raise HTTPException(status_code=422, detail=f"{HEADER} was already used for a different request")
+            except RequestInProgress:
+                raise HTTPException(
+                    status_code=409, detail=f"A request with this {HEADER} is still in progress",
+                    headers={"Retry-After": "1"},
+                )
+
+        return route_handler
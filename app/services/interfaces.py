@@ -1,7 +1,11 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, List, Optional
+
+from app.services.executors import ConnectorExecutor
 
 class BaseConnector(ABC):
-    
+    executor: Optional[ConnectorExecutor] = None
+
     @abstractmethod
     def initialize(self, config: dict):
         pass
@@ -17,3 +21,34 @@ class BaseConnector(ABC):
     @abstractmethod
     def generate_text(self, prompt: str) -> str:
         pass
+
+    async def stream_text(self, prompt: str) -> AsyncIterator[str]:
+        # Connectors without native streaming yield the whole completion once.
+        yield await self.generate_text(prompt)
+
+    def warm_up(self):
+        # Load models or other heavy state; called once per executor process.
+        pass
+
+    @classmethod
+    def cpu_bound_methods(cls) -> List[str]:
+        return [name for name in dir(cls) if hasattr(getattr(cls, name, None), "cpu_bound")]
+
+    def configure_executor(self, config: dict):
+        # Connectors without @cpu_bound methods would never use the pool.
+        if self.cpu_bound_methods():
+            self.executor = ConnectorExecutor(type(self), config)
+
+    async def start_executor(self):
+        if self.executor is not None:
+            await self.executor.start(self)
+
+    def stop_executor(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    async def run_cpu_bound(self, name: str, *args, **kwargs):
+        if self.executor is None:
+            self.configure_executor({})
+        return await self.executor.run(self, name, args, kwargs)
@@ -0,0 +1,230 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app import config
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+Labels = Tuple[str, ...]
+# A scrape-time sample: metric name, type, help and (labels, value) pairs.
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, values: Labels) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """The sample lines of this metric."""
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, labels: Labels = ()):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self._labels(labels))} {_format_value(value)}" for labels, value in self.values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, labels: Labels = ()):
+        self.inc(-amount, labels)
+
+    def set(self, value: float, labels: Labels = ()):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self.values.items():
+            base = self._labels(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**base, 'le': _format_value(float(bound))})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(base)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(base)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text format.
+
+    Instrumented code checks ``enabled`` before measuring anything, so a
+    disabled registry costs one attribute lookup per call site.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def _register(self, metric: Metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Callable[[], Iterable[Family]]):
+        """Registers a function that reports current values (queue depths,
+        cache sizes, ...) at scrape time."""
+        self.collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for name, metric_type, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(enabled=config.get("metrics", {}).get("enabled", False))
+
+http_request_seconds = metrics.histogram(
+    "pygentic_http_request_duration_seconds", "HTTP request latency by route.", ["method", "route", "status"]
+)
+http_requests_in_flight = metrics.gauge(
+    "pygentic_http_requests_in_flight", "HTTP requests currently being served."
+)
+db_query_seconds = metrics.histogram(
+    "pygentic_db_query_duration_seconds", "Database query latency by model.", ["model", "operation"]
+)
+upstream_request_seconds = metrics.histogram(
+    "pygentic_upstream_request_duration_seconds", "Upstream call latency by connector method.",
+    ["connector", "operation", "status"],
+)
+upstream_response_bytes = metrics.histogram(
+    "pygentic_upstream_response_bytes", "Upstream response size by connector method.",
+    ["connector", "operation"], buckets=SIZE_BUCKETS,
+)
+upstream_requests_in_flight = metrics.gauge(
+    "pygentic_upstream_requests_in_flight", "Upstream calls currently in flight.", ["connector"]
+)
+
+
+def observe_db(model: str, operation: str, start: float):
+    db_query_seconds.observe(time.perf_counter() - start, (model, operation))
+
+
+def observe_upstream(connector: str, operation: str, status: str, start: float, size: Optional[int]):
+    upstream_request_seconds.observe(time.perf_counter() - start, (connector, operation, status))
+    if size is not None:
+        upstream_response_bytes.observe(size, (connector, operation))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each request by its route template."""
+
+    def __init__(self, app):
+        self.app = app
+        self.routes: Optional[dict] = None
+
+    def _route(self, scope) -> str:
+        if self.routes is None:
+            self.routes = {getattr(route, "endpoint", None): route.path for route in scope["app"].routes}
+        return self.routes.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            http_request_seconds.observe(
+                time.perf_counter() - start, (scope["method"], self._route(scope), str(status))
+            )
+
+
+def stats_families(prefix: str, label: str, stats_by_name: Dict[str, dict], help: str,
+                   counters: Collection[str] = ()) -> List[Family]:
+    """Turns ``{name: {stat: value}}`` dictionaries (as returned by the
+    ``stats()`` methods around the app) into one family per stat: a counter
+    named ``..._total`` for the stats in ``counters``, which only grow, and
+    a gauge for the rest."""
+    families: Dict[str, list] = {}
+    for name, stats in stats_by_name.items():
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            families.setdefault(key, []).append(({label: name}, value))
+    return [
+        (f"{prefix}_{key}_total", "counter", f"{help}: {key}.", samples) if key in counters
+        else (f"{prefix}_{key}", "gauge", f"{help}: {key}.", samples)
+        for key, samples in families.items()
+    ]
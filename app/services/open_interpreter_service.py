@@ -1,15 +1,38 @@
 # app/services/open_interpreter_service.py
-import asyncio
+from typing import Any, AsyncIterator, Iterable, Optional
+
 from app.services.connector import ServerlessServiceConnector
+from app.services.fanout import FanOutError, FanOutResult, fan_out
 from app import config
 
-serverless_service = ServerlessServiceConnector(config["connectors"]["serverless_service"])
+serverless_config = config["connectors"]["serverless_service"]
+serverless_service = ServerlessServiceConnector(serverless_config)
 
 async def handle_request(data):
     response = await serverless_service.call_endpoint(data)
     return response
 
-async def main(data):
-    tasks = [handle_request(data) for _ in range(10)]
-    results = await asyncio.gather(*tasks)
-    return results
+def handle_batch(payloads: Iterable[Any], concurrency: Optional[int] = None) -> AsyncIterator[FanOutResult]:
+    """Sends each payload to the serverless endpoint and yields the results
+    as they complete, with the limits from ``[connectors.serverless_service]``."""
+    return fan_out(
+        handle_request,
+        payloads,
+        concurrency=concurrency or serverless_config.get("concurrency", 10),
+        timeout=serverless_config.get("item_timeout", 30.0),
+        retries=serverless_config.get("retries", 2),
+        backoff_base=serverless_config.get("backoff_base", 0.1),
+    )
+
+async def main(data, copies: int = 10):
+    results = []
+    batch = handle_batch([data] * copies)
+    try:
+        async for result in batch:
+            if result.error is not None:
+                # Like gather, fail on the first error; closing the batch cancels the rest.
+                raise FanOutError(f"Call {result.index} failed: {result.error}")
+            results.append(result)
+    finally:
+        await batch.aclose()
+    return [result.result for result in sorted(results, key=lambda result: result.index)]
@@ -1,21 +1,258 @@
+import ast
+import asyncio
+import hashlib
 import importlib.util
+import inspect
+import json
+import logging
 import os
-from typing import List, Type
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from types import ModuleType
+from typing import Callable, Dict, List, Optional, Type
+
+import toml
+
 from app.services.interfaces import BaseConnector
 
-def load_plugins(plugin_dir: str) -> List[Type[BaseConnector]]:
-    connectors = []
-    if not os.path.isdir(plugin_dir):
-        return connectors
-    for filename in os.listdir(plugin_dir):
-        if filename.endswith(".py") and filename != "__init__.py":
-            module_name = filename[:-3]
-            module_path = os.path.join(plugin_dir, filename)
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            for attr_name in dir(module):
-                attr = getattr(module, attr_name)
-                if isinstance(attr, type) and issubclass(attr, BaseConnector) and attr is not BaseConnector:
-                    connectors.append(attr)
-    return connectors
\ No newline at end of file
+# Optional, hand-written: ``[connectors] Name = "module:Class"``.
+MANIFEST = "plugins.toml"
+ENTRY_POINT_GROUP = "pygentic.connectors"
+# Where discovery caches the connector classes found in each plugin file, by
+# mtime: one file per plugin directory, outside it, as it may be read-only.
+CACHE_DIR = os.getenv("PYGENTIC_PLUGIN_CACHE_DIR") or os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "pygentic"
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PluginSpec:
+    name: str
+    load: Callable[[], Type[BaseConnector]]
+
+
+_modules: Dict[str, ModuleType] = {}
+
+
+def _import_file(path: str) -> ModuleType:
+    module = _modules.get(path)
+    if module is None:
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[path] = module
+    return module
+
+
+def _file_loader(path: str, class_name: str) -> Callable[[], Type[BaseConnector]]:
+    return lambda: getattr(_import_file(path), class_name)
+
+
+def connector_classes(source: str) -> Optional[List[str]]:
+    """Names of the classes in ``source`` that subclass ``BaseConnector``
+    (under any name it is imported as), directly or through other classes
+    defined in the same file. Found by parsing, so the module is not
+    executed. None when a class derives from a class imported from
+    elsewhere, which only importing the module can resolve."""
+    connector_names = {"BaseConnector"}
+    imported = set()
+    bases = {}
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                (connector_names if alias.name == "BaseConnector" else imported).add(alias.asname or alias.name)
+        elif isinstance(node, ast.ClassDef):
+            bases[node.name] = [
+                base.id if isinstance(base, ast.Name) else base.attr if base.attr == "BaseConnector" else None
+                for base in node.bases if isinstance(base, (ast.Name, ast.Attribute))
+            ]
+    found = set(connector_names)
+    changed = True
+    while changed:
+        changed = False
+        for name, parents in bases.items():
+            if name not in found and found.intersection(parents):
+                found.add(name)
+                changed = True
+    for name, parents in bases.items():
+        if name not in found and any(parent is None or parent in imported for parent in parents):
+            return None
+    return [name for name in bases if name in found and name not in connector_names]
+
+
+def _imported_classes(path: str) -> Optional[List[str]]:
+    try:
+        module = _import_file(path)
+    except Exception:
+        logger.exception("Plugin %s could not be imported", path)
+        return None
+    return [
+        name for name, value in vars(module).items()
+        if inspect.isclass(value) and issubclass(value, BaseConnector) and value is not BaseConnector
+        and value.__module__ == module.__name__
+    ]
+
+
+def cache_path(plugin_dir: str, cache_dir: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(plugin_dir).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"plugins-{digest}.json")
+
+
+def _read_cache(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _scan(plugin_dir: str, cache_dir: str) -> List[PluginSpec]:
+    path_of_cache = cache_path(plugin_dir, cache_dir)
+    cache = _read_cache(path_of_cache)
+    entries = {}
+    plugins = []
+    for filename in sorted(os.listdir(plugin_dir)):
+        if not filename.endswith(".py") or filename == "__init__.py":
+            continue
+        path = os.path.join(plugin_dir, filename)
+        stat = os.stat(path)
+        entry = cache.get(filename)
+        if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            with open(path, encoding="utf-8") as f:
+                classes = connector_classes(f.read())
+            if classes is None:
+                # Subclassed through a class parsing cannot follow: import it.
+                classes = _imported_classes(path)
+                if classes is None:
+                    continue
+            entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "classes": classes}
+        entries[filename] = entry
+        plugins.extend(PluginSpec(name, _file_loader(path, name)) for name in entry["classes"])
+    if entries != cache:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(path_of_cache, "w") as f:
+                json.dump(entries, f, indent=1)
+        except OSError:
+            # An unwritable cache directory just means scanning again next time.
+            pass
+    return plugins
+
+
+def _from_manifest(plugin_dir: str, manifest_path: str) -> List[PluginSpec]:
+    plugins = []
+    for name, target in toml.load(manifest_path).get("connectors", {}).items():
+        module, _, class_name = target.partition(":")
+        path = os.path.join(plugin_dir, *module.split(".")) + ".py"
+        plugins.append(PluginSpec(name, _file_loader(path, class_name)))
+    return plugins
+
+
+def discover_plugins(plugin_dir: str, cache_dir: Optional[str] = None) -> List[PluginSpec]:
+    """Connector plugins from ``plugin_dir`` and from installed packages'
+    ``pygentic.connectors`` entry points, without importing any of them.
+
+    The directory's ``plugins.toml`` lists its connectors if present;
+    otherwise its files are parsed for connector classes (files whose
+    classes derive from imported classes are imported instead), and the
+    result is cached per file by modification time under ``cache_dir``.
+    """
+    plugins = []
+    if os.path.isdir(plugin_dir):
+        manifest_path = os.path.join(plugin_dir, MANIFEST)
+        if os.path.isfile(manifest_path):
+            plugins.extend(_from_manifest(plugin_dir, manifest_path))
+        else:
+            plugins.extend(_scan(plugin_dir, cache_dir or CACHE_DIR))
+    plugins.extend(PluginSpec(entry.name, entry.load) for entry in _entry_points(ENTRY_POINT_GROUP))
+    return plugins
+
+
+def _entry_points(group: str):
+    found = entry_points()
+    if hasattr(found, "select"):
+        return found.select(group=group)
+    # Before Python 3.10, entry_points() maps each group to its entries.
+    return found.get(group, [])
+
+
+def load_plugins(plugin_dir: str, cache_dir: Optional[str] = None) -> List[Type[BaseConnector]]:
+    return [plugin.load() for plugin in discover_plugins(plugin_dir, cache_dir)]
+
+
+class LazyConnector(BaseConnector):
+    """Stands in for a plugin connector until it is first used.
+
+    The plugin module is imported and the connector created, initialized
+    and (once the app has started) connected on the first call, so plugins
+    that are never used cost nothing at startup.
+    """
+
+    def __init__(self, plugin: PluginSpec, config: dict):
+        self.plugin = plugin
+        self.config = config
+        self.instance: Optional[BaseConnector] = None
+        self.started = False
+        self.connected = False
+        self.lock = asyncio.Lock()
+
+    def resolve(self) -> BaseConnector:
+        if self.instance is None:
+            instance = self.plugin.load()()
+            instance.initialize(self.config)
+            instance.configure_executor(self.config)
+            self.instance = instance
+        return self.instance
+
+    async def ready(self) -> BaseConnector:
+        instance = self.resolve()
+        if self.started and not self.connected:
+            async with self.lock:
+                if not self.connected:
+                    await instance.connect()
+                    await instance.start_executor()
+                    self.connected = True
+        return instance
+
+    def initialize(self, config: dict):
+        self.config = config
+
+    def configure_executor(self, config: dict):
+        self.config = config
+
+    async def connect(self):
+        self.started = True
+
+    async def start_executor(self):
+        pass
+
+    async def disconnect(self):
+        self.started = False
+        if self.connected:
+            self.connected = False
+            await self.instance.disconnect()
+
+    def stop_executor(self):
+        if self.instance is not None:
+            self.instance.stop_executor()
+
+    async def generate_text(self, prompt: str, **params) -> str:
+        return await (await self.ready()).generate_text(prompt, **params)
+
+    async def stream_text(self, prompt: str, **params):
+        async for chunk in (await self.ready()).stream_text(prompt, **params):
+            yield chunk
+
+    def __getattr__(self, name):
+        attribute = getattr(self.resolve(), name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        async def call(*args, **kwargs):
+            await self.ready()
+            return await attribute(*args, **kwargs)
+
+        return call
@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from pydbantic.core import DataBaseModelCondition
+from sqlalchemy.sql.expression import ClauseList
+
+from app import config
+from app.models import MessageDB, ThreadSummaryDB
+from app.services.cache import assistant_cache
+from app.services.database import message_beyond, message_order
+from app.services.interfaces import BaseConnector
+from app.services.rate_limit import estimate_tokens
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below in a few sentences. Keep names, facts, "
+    "decisions and open questions.\n\n{conversation}\n\nsummary:"
+)
+
+
+def message_line(message) -> str:
+    return f"{message.role}: {message.content}"
+
+
+def _compare(position: Tuple[float, str], newer: bool, inclusive: bool = False) -> DataBaseModelCondition:
+    return DataBaseModelCondition(
+        f"{'newer' if newer else 'older'} than {position[1]}", message_beyond(position, newer, inclusive), position
+    )
+
+
+class TokenCounter:
+    """Token lengths of message lines, remembered per message id. Messages
+    are only ever inserted (the routes answer a taken id with a 409, and
+    imports skip it), so a remembered length cannot go stale."""
+
+    def __init__(self, count: Callable[[str], int] = estimate_tokens, max_size: int = 100_000):
+        self.count = count
+        self.max_size = max_size
+        self.lengths: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, message) -> int:
+        tokens = self.lengths.get(message.id)
+        if tokens is not None:
+            self.lengths.move_to_end(message.id)
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        # One more for the newline joining it to the next line.
+        tokens = self.lengths[message.id] = self.count(message_line(message)) + 1
+        if len(self.lengths) > self.max_size:
+            self.lengths.popitem(last=False)
+        return tokens
+
+    def stats(self) -> dict:
+        return {"size": len(self.lengths), "hits": self.hits, "misses": self.misses}
+
+
+@dataclass
+class Context:
+    messages: List[MessageDB]
+    tokens: int
+    summary: Optional[ThreadSummaryDB] = None
+    # The newest message that was left out of the window, if any.
+    dropped: Optional[MessageDB] = None
+
+    @property
+    def prompt(self) -> str:
+        lines = [f"summary: {self.summary.content}"] if self.summary else []
+        lines.extend(message_line(message) for message in self.messages)
+        return "\n".join(lines)
+
+
+class ContextBuilder:
+    """Builds the prompt for a run from the most recent messages of a thread
+    that fit the assistant's token budget.
+
+    Messages are read newest first, ``page_size`` at a time, so only about
+    the window is loaded however long the thread is. With ``summaries``
+    enabled, older messages are folded into a rolling ``ThreadSummaryDB``
+    that is put in front of the window instead.
+    """
+
+    def __init__(self, max_tokens: int = 4096, page_size: int = 50, summaries: bool = False,
+                 summary_tokens: int = 2048, counter: Optional[TokenCounter] = None):
+        self.max_tokens = max_tokens
+        self.page_size = page_size
+        self.summaries = summaries
+        self.summary_tokens = summary_tokens
+        self.counter = counter or TokenCounter()
+
+    def configure(self, config: dict):
+        self.max_tokens = config.get("max_tokens", self.max_tokens)
+        self.page_size = config.get("page_size", self.page_size)
+        self.summaries = config.get("summaries", self.summaries)
+        self.summary_tokens = config.get("summary_tokens", self.summary_tokens)
+
+    async def budget(self, assistant_id: Optional[str]) -> int:
+        assistant = await assistant_cache.get(assistant_id) if assistant_id else None
+        if assistant is not None and assistant.max_context_tokens:
+            return assistant.max_context_tokens
+        return self.max_tokens
+
+    async def build(self, thread_id: str, max_tokens: int) -> Context:
+        """The newest messages of ``thread_id`` whose lines add up to at most
+        ``max_tokens``. The latest message is always included, even when it
+        alone exceeds the budget."""
+        summary = await ThreadSummaryDB.get(thread_id=thread_id) if self.summaries else None
+        remaining = max_tokens
+        if summary is not None:
+            remaining -= self.counter.count(f"summary: {summary.content}") + 1
+
+        window: List[MessageDB] = []
+        dropped = None
+        cursor = None
+        while dropped is None:
+            conditions = []
+            if cursor is not None:
+                conditions.append(_compare((cursor.created_at, cursor.id), newer=False))
+            if summary is not None:
+                conditions.append(_compare((summary.created_at, summary.message_id), newer=True))
+            page = await MessageDB.filter(
+                *conditions, thread_id=thread_id, order_by=ClauseList(*message_order(False)), limit=self.page_size
+            )
+            for message in page:
+                tokens = self.counter(message)
+                if tokens > remaining and window:
+                    dropped = message
+                    break
+                window.append(message)
+                remaining -= tokens
+            if len(page) < self.page_size:
+                break
+            cursor = page[-1]
+
+        window.reverse()
+        return Context(window, max_tokens - remaining, summary, dropped)
+
+    async def for_run(self, thread_id: str, assistant_id: Optional[str]) -> Context:
+        return await self.build(thread_id, await self.budget(assistant_id))
+
+    async def summarize(self, thread_id: str, context: Context, connector: BaseConnector) -> Optional[ThreadSummaryDB]:
+        """Folds the oldest messages left out of ``context`` into the thread's
+        rolling summary, at most ``summary_tokens`` worth per call."""
+        if context.dropped is None:
+            return None
+        summary = context.summary
+        conditions = [_compare((context.dropped.created_at, context.dropped.id), newer=False, inclusive=True)]
+        if summary is not None:
+            conditions.append(_compare((summary.created_at, summary.message_id), newer=True))
+        candidates = await MessageDB.filter(
+            *conditions, thread_id=thread_id, order_by=ClauseList(*message_order(True)), limit=self.page_size
+        )
+        folded = []
+        budget = self.summary_tokens
+        for message in candidates:
+            tokens = self.counter(message)
+            if tokens > budget and folded:
+                break
+            folded.append(message)
+            budget -= tokens
+
+        lines = [f"summary so far: {summary.content}"] if summary else []
+        lines.extend(message_line(message) for message in folded)
+        content = (await connector.generate_text(SUMMARY_PROMPT.format(conversation="\n".join(lines)))).strip()
+        last = folded[-1]
+        if summary is None:
+            summary = ThreadSummaryDB(thread_id=thread_id, content=content, message_id=last.id, created_at=last.created_at)
+            await summary.save()
+        else:
+            summary.content, summary.message_id, summary.created_at = content, last.id, last.created_at
+            await summary.update()
+        return summary
+
+
+context_builder = ContextBuilder()
+context_builder.configure(config.get("context", {}))
+
+
+async def build_thread_prompt(thread_id: str, assistant_id: Optional[str] = None) -> str:
+    return (await context_builder.for_run(thread_id, assistant_id)).prompt
@@ -0,0 +1,302 @@
+import asyncio
+import random
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.services.interfaces import BaseConnector
+from app.services.shared_state import SharedState, shared_state
+
+RETRY_STATUSES = (429, 503)
+
+# The assistant a connector call is made for; set by the run paths so limits
+# can be applied per assistant without changing connector signatures.
+current_assistant: ContextVar[Optional[str]] = ContextVar("current_assistant", default=None)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def estimate_tokens(text: str) -> int:
+    # About four characters per token for English text.
+    return len(text) // 4 + 1
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Refills ``per_minute`` tokens per minute up to ``capacity``.
+
+    Callers reserve tokens up front, so the balance can go negative; the
+    deficit is how long the reserving caller has to wait.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def reserve(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class SharedTokenBucket(TokenBucket):
+    """A TokenBucket whose balance lives in SharedState under ``key``, so
+    every server process draws from the same bucket. Use it with the
+    state's lock held."""
+
+    def __init__(self, state: SharedState, key: str, per_minute: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.state = state
+        self.key = key
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self.clock = clock
+
+    def _refill(self):
+        now = self.clock()
+        stored = self.state.get(self.key)
+        tokens, updated = stored if stored is not None else (self.capacity, now)
+        self.tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        self.updated = now
+        self.state.set(self.key, self.tokens, self.updated)
+
+    def reserve(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+        self.state.set(self.key, self.tokens, self.updated)
+
+
+class RateLimiter:
+    """Requests- and tokens-per-minute buckets for one connector, overall and
+    per assistant id. A caller waits for capacity for at most ``max_wait``
+    seconds; longer waits raise RateLimitExceeded instead of queueing.
+    """
+
+    MAX_ASSISTANTS = 4096
+
+    def __init__(self, config: dict, clock: Callable[[], float] = time.monotonic,
+                 state: Optional[SharedState] = None, name: str = ""):
+        self.config = config
+        self.clock = clock
+        # Buckets are shared between server processes when there is a state.
+        self.state = state
+        self.name = name
+        self.max_wait = config.get("max_wait", 30.0)
+        self.burst_window = config.get("burst_window", 60.0)
+        self.requests = self._bucket("requests_per_minute")
+        self.tokens = self._bucket("tokens_per_minute")
+        self.assistants: Dict[str, Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._paused_until = 0.0
+        self.throttled_requests = 0
+        self.throttled_seconds = 0.0
+        self.rejected = 0
+
+    def _bucket(self, key: str, assistant_id: Optional[str] = None) -> Optional[TokenBucket]:
+        per_minute = self.config.get(key)
+        if not per_minute:
+            return None
+        # Up to burst_window seconds of quota may be spent at once.
+        capacity = max(1.0, per_minute * self.burst_window / 60)
+        if self.state is not None:
+            shared_key = f"rate:{self.name}:{key}:{assistant_id or ''}"
+            return SharedTokenBucket(self.state, shared_key, per_minute, capacity=capacity, clock=self.clock)
+        return TokenBucket(per_minute, capacity=capacity, clock=self.clock)
+
+    @property
+    def paused_until(self) -> float:
+        if self.state is None:
+            return self._paused_until
+        stored = self.state.get(f"rate:{self.name}:paused")
+        return stored[0] if stored is not None else 0.0
+
+    @paused_until.setter
+    def paused_until(self, value: float):
+        if self.state is None:
+            self._paused_until = value
+        else:
+            self.state.set(f"rate:{self.name}:paused", value, 0.0)
+
+    def _assistant_buckets(self, assistant_id: str):
+        if assistant_id not in self.assistants:
+            if len(self.assistants) >= self.MAX_ASSISTANTS and self.state is not None:
+                # Shared buckets keep their balance in the state, so none is lost.
+                self.assistants = {}
+            elif len(self.assistants) >= self.MAX_ASSISTANTS:
+                # Full buckets carry no state, so idle assistants can be dropped.
+                self.assistants = {
+                    key: buckets for key, buckets in self.assistants.items()
+                    if not all(bucket is None or bucket.is_full() for bucket in buckets)
+                }
+            self.assistants[assistant_id] = (
+                self._bucket("assistant_requests_per_minute", assistant_id),
+                self._bucket("assistant_tokens_per_minute", assistant_id),
+            )
+        return self.assistants[assistant_id]
+
+    def _locked(self):
+        return self.state.locked() if self.state is not None else nullcontext()
+
+    def pause(self, seconds: float):
+        # Upstream asked us to back off; hold every caller until then.
+        with self._locked():
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    async def acquire(self, tokens: int = 0, assistant_id: Optional[str] = None):
+        wanted: List[Tuple[TokenBucket, float]] = [(self.requests, 1), (self.tokens, tokens)]
+        if assistant_id is not None:
+            assistant_requests, assistant_tokens = self._assistant_buckets(assistant_id)
+            wanted += [(assistant_requests, 1), (assistant_tokens, tokens)]
+        wanted = [(bucket, amount) for bucket, amount in wanted if bucket is not None]
+
+        with self._locked():
+            wait = max([self.paused_until - self.clock()] + [bucket.wait_time(amount) for bucket, amount in wanted])
+            if wait <= self.max_wait:
+                for bucket, amount in wanted:
+                    bucket.reserve(amount)
+        if wait > self.max_wait:
+            self.rejected += 1
+            raise RateLimitExceeded(wait)
+        if wait > 0:
+            self.throttled_requests += 1
+            self.throttled_seconds += wait
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        return {
+            "throttled_requests": self.throttled_requests,
+            "throttled_seconds": self.throttled_seconds,
+            "rejected": self.rejected,
+        }
+
+
+class RateLimitedConnector(BaseConnector):
+    """Paces ``generate_text``/``stream_text`` through a RateLimiter and retries
+    upstream 429/503 responses with jittered exponential backoff, waiting at
+    least as long as the upstream ``Retry-After`` asks for.
+    """
+
+    def __init__(self, connector: BaseConnector, name: str = ""):
+        self.connector = connector
+        self.name = name
+        self.initialize({})
+
+    def initialize(self, config: dict):
+        self.limiter = RateLimiter(config, state=shared_state, name=self.name)
+        self.completion_tokens = config.get("completion_tokens", 50)
+        self.max_retries = config.get("max_retries", 3)
+        self.backoff_base = config.get("backoff_base", 0.5)
+        self.backoff_max = config.get("backoff_max", 20.0)
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.upstream_throttled = 0
+
+    async def connect(self):
+        await self.connector.connect()
+
+    async def disconnect(self):
+        await self.connector.disconnect()
+
+    async def start_executor(self):
+        await self.connector.start_executor()
+
+    def stop_executor(self):
+        self.connector.stop_executor()
+
+    def __getattr__(self, name):
+        return getattr(self.connector, name)
+
+    def _backoff(self, attempt: int, response: httpx.Response) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            self.limiter.pause(retry_after)
+            delay = max(delay, retry_after)
+        if delay > self.limiter.max_wait:
+            raise RateLimitExceeded(delay)
+        return delay
+
+    async def _with_retries(self, prompt: str, call: Callable[[], Awaitable]):
+        tokens = estimate_tokens(prompt) + self.completion_tokens
+        attempt = 0
+        while True:
+            await self.limiter.acquire(tokens, current_assistant.get())
+            try:
+                return await call()
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRY_STATUSES:
+                    raise
+                self.upstream_throttled += 1
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e.response)
+            self.retries += 1
+            self.backoff_seconds += delay
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def generate_text(self, prompt: str, **params) -> str:
+        return await self._with_retries(prompt, lambda: self.connector.generate_text(prompt, **params))
+
+    async def stream_text(self, prompt: str) -> AsyncIterator[str]:
+        # Throttling responses arrive before any chunk, so only opening the
+        # stream (up to its first chunk) is retried.
+        async def open_stream():
+            chunks = self.connector.stream_text(prompt)
+            try:
+                return chunks, await chunks.__anext__()
+            except StopAsyncIteration:
+                return chunks, None
+
+        chunks, first = await self._with_retries(prompt, open_stream)
+        try:
+            if first is None:
+                return
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    def stats(self) -> dict:
+        return {
+            **self.limiter.stats(),
+            "retries": self.retries,
+            "backoff_seconds": self.backoff_seconds,
+            "upstream_throttled": self.upstream_throttled,
+        }
@@ -0,0 +1,48 @@
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.services.interfaces import BaseConnector
+
+
+class ConnectorRegistry:
+    """Connector instances by (case-insensitive) name, filled once at startup."""
+
+    def __init__(self):
+        self.connectors: Dict[str, BaseConnector] = {}
+
+    def register(self, name: str, instance: BaseConnector):
+        self.connectors[name.lower()] = instance
+
+    def get(self, name: str) -> Optional[BaseConnector]:
+        return self.connectors.get(name.lower())
+
+    def require(self, name: str) -> BaseConnector:
+        instance = self.get(name)
+        if instance is None:
+            raise HTTPException(status_code=503, detail=f"Connector {name!r} is not available")
+        return instance
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self.connectors
+
+    def values(self):
+        return self.connectors.values()
+
+    def items(self):
+        return self.connectors.items()
+
+
+registry = ConnectorRegistry()
+
+
+def require_connector(name: str) -> Callable[[], BaseConnector]:
+    """Dependency that resolves a connector by name, or fails with 503.
+
+    Usage: ``connector: BaseConnector = Depends(require_connector("name"))``
+    """
+
+    def dependency() -> BaseConnector:
+        return registry.require(name)
+
+    return dependency
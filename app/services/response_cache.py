@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import time
+import unicodedata
+from typing import AsyncIterator, Dict, Optional
+
+import aiosqlite
+
+from app.services.cache import LRUCache
+from app.services.interfaces import BaseConnector
+from app.services.plugin_loader import LazyConnector
+
+
+def normalize_prompt(prompt: str) -> str:
+    return unicodedata.normalize("NFC", prompt).strip()
+
+
+class DiskStore:
+    """Persists cached completions in a SQLite file so they survive restarts."""
+
+    def __init__(self, path: str, ttl: Optional[float] = None):
+        self.path = path
+        self.ttl = ttl
+        self.connection: Optional[aiosqlite.Connection] = None
+
+    async def open(self):
+        self.connection = await aiosqlite.connect(self.path)
+        await self.connection.execute("PRAGMA journal_mode=WAL")
+        await self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        await self.connection.commit()
+
+    async def close(self):
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+    async def get(self, key: str) -> Optional[str]:
+        query = "SELECT value FROM responses WHERE key = ?"
+        params = [key]
+        if self.ttl:
+            query += " AND created_at > ?"
+            params.append(time.time() - self.ttl)
+        async with self.connection.execute(query, params) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def set(self, key: str, value: str):
+        await self.connection.execute(
+            "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+            (key, value, time.time()),
+        )
+        await self.connection.commit()
+
+
+class CachingConnector(BaseConnector):
+    """Wraps a connector and caches ``generate_text`` results.
+
+    Identical requests (same registered connector, model, normalized prompt
+    and parameters) are answered from memory or from the optional disk store,
+    and concurrent identical requests share a single upstream call.
+    Everything else is delegated to the wrapped connector.
+    """
+
+    def __init__(self, connector: BaseConnector, name: Optional[str] = None):
+        self.connector = connector
+        self.name = name
+        self.memory = LRUCache()
+        self.disk: Optional[DiskStore] = None
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.waiters: Dict[asyncio.Task, int] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def initialize(self, config: dict):
+        ttl = config.get("ttl", 3600.0)
+        self.memory = LRUCache(max_size=config.get("max_entries", 1024), ttl=ttl)
+        if config.get("path"):
+            self.disk = DiskStore(config["path"], ttl=ttl)
+
+    async def connect(self):
+        if self.disk is not None and self.disk.connection is None:
+            await self.disk.open()
+        await self.connector.connect()
+
+    async def disconnect(self):
+        await self.connector.disconnect()
+        if self.disk is not None:
+            await self.disk.close()
+
+    async def start_executor(self):
+        await self.connector.start_executor()
+
+    def stop_executor(self):
+        self.connector.stop_executor()
+
+    def __getattr__(self, name):
+        return getattr(self.connector, name)
+
+    def cache_key(self, prompt: str, params: dict) -> str:
+        connector = self.connector.resolve() if isinstance(self.connector, LazyConnector) else self.connector
+        payload = {
+            # The registered name tells apart instances of one connector class
+            # configured with different models or endpoints.
+            "name": self.name,
+            "connector": type(connector).__name__,
+            "model": getattr(connector, "model", None),
+            "base_url": getattr(connector, "base_url", None),
+            "prompt": normalize_prompt(prompt),
+            "params": params,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    async def generate_text(self, prompt: str, **params) -> str:
+        key = self.cache_key(prompt, params)
+        text = await self.memory.get(key)
+        if text is not None:
+            self.hits += 1
+            return text
+
+        # The upstream call runs in a task of its own that every identical
+        # request awaits, so one caller going away does not fail the others;
+        # it is cancelled only once all of them have.
+        call = self.in_flight.get(key)
+        if call is None or call.done():
+            call = asyncio.create_task(self._fetch(key, prompt, params))
+            call.add_done_callback(lambda task: self._finished(key, task))
+            self.in_flight[key] = call
+            self.waiters[call] = 0
+        else:
+            self.coalesced += 1
+        self.waiters[call] += 1
+        try:
+            return await asyncio.shield(call)
+        finally:
+            if not call.done():
+                # This caller was cancelled while the call is still running.
+                self.waiters[call] -= 1
+                if not self.waiters[call]:
+                    call.cancel()
+
+    async def _fetch(self, key: str, prompt: str, params: dict) -> str:
+        text = await self.disk.get(key) if self.disk is not None and self.disk.connection else None
+        if text is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            text = await self.connector.generate_text(prompt, **params)
+            if self.disk is not None and self.disk.connection:
+                await self.disk.set(key, text)
+        await self.memory.set(key, text)
+        return text
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        self.waiters.pop(task, None)
+        if not task.cancelled():
+            # Mark a failure as retrieved when nobody was left waiting.
+            task.exception()
+
+    async def stream_text(self, prompt: str) -> AsyncIterator[str]:
+        async for chunk in self.connector.stream_text(prompt):
+            yield chunk
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            "size": len(self.memory.entries),
+        }
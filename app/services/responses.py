@@ -0,0 +1,54 @@
+import logging
+from typing import Any, Collection, Dict, Type
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+
+from app import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseSettings:
+    """How JSON responses are serialized.
+
+    In fast mode (``[responses] fast = true``) responses are encoded with
+    orjson, and stored rows are sent without being validated again against
+    the route's response model: they were validated when they were written.
+    """
+
+    def __init__(self, fast: bool = False):
+        self.fast = fast
+
+    def configure(self, responses_config: dict):
+        self.fast = responses_config.get("fast", self.fast)
+        if self.fast and orjson is None:
+            logger.warning("[responses] fast needs the orjson package; using the standard JSON encoder")
+            self.fast = False
+
+    @property
+    def response_class(self) -> Type[JSONResponse]:
+        return ORJSONResponse if self.fast else JSONResponse
+
+    def raw(self, content: Any, status_code: int = 200) -> JSONResponse:
+        """``content`` as is: plain JSON types, not checked against a response model."""
+        return self.response_class(content, status_code=status_code)
+
+    def trusted(self, content: Any) -> Any:
+        """Plain data built from stored rows. In fast mode it is encoded as
+        is; otherwise FastAPI validates it against the route's response model."""
+        return self.raw(content) if self.fast else content
+
+
+def fields(response_model: Type[BaseModel], row: Any, exclude: Collection[str] = ()) -> Dict[str, Any]:
+    """The values of ``response_model``'s (flat) fields on ``row``."""
+    return {name: getattr(row, name) for name in response_model.__fields__ if name not in exclude}
+
+
+response_settings = ResponseSettings()
+response_settings.configure(config.get("responses", {}))
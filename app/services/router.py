@@ -0,0 +1,210 @@
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from app.services.interfaces import BaseConnector
+
+STRATEGIES = ("least_outstanding", "ewma")
+
+
+class NoBackendAvailableError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    Once ``reset_timeout`` seconds have passed, one probe call is let through
+    (half-open); it closes the breaker on success and re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allows(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+    def on_start(self):
+        if self.state == "half_open":
+            self.probing = True
+
+    def on_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def on_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+        self.probing = False
+
+
+class Backend:
+    def __init__(self, name: str, connector: BaseConnector, breaker: CircuitBreaker):
+        self.name = name
+        self.connector = connector
+        self.breaker = breaker
+        self.outstanding = 0
+        self.ewma: Optional[float] = None
+        self.requests = 0
+        self.errors = 0
+
+    def observe(self, latency: float, decay: float):
+        self.ewma = latency if self.ewma is None else decay * latency + (1 - decay) * self.ewma
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "outstanding": self.outstanding,
+            "ewma_ms": None if self.ewma is None else self.ewma * 1000,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+class RoutingConnector(BaseConnector):
+    """Spreads calls over several connectors with load balancing and failover.
+
+    Each call goes to the available backend with the fewest outstanding
+    requests (``least_outstanding``) or the lowest EWMA latency weighted by
+    its outstanding requests (``ewma``). A failed call is retried on the next
+    best backend, up to ``max_attempts`` backends, and backends that keep
+    failing are skipped while their circuit breaker is open.
+    """
+
+    def __init__(self, backends: Dict[str, BaseConnector], clock: Callable[[], float] = time.monotonic):
+        self.connectors = backends
+        self.clock = clock
+        self.initialize({})
+
+    def initialize(self, config: dict):
+        self.strategy = config.get("strategy", "least_outstanding")
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"Unknown routing strategy {self.strategy!r}, expected one of {STRATEGIES}")
+        self.ewma_decay = config.get("ewma_decay", 0.3)
+        self.max_attempts = config.get("max_attempts", len(self.connectors))
+        self.backends: List[Backend] = [
+            Backend(name, connector, CircuitBreaker(
+                failure_threshold=config.get("failure_threshold", 5),
+                reset_timeout=config.get("reset_timeout", 30.0),
+                clock=self.clock,
+            ))
+            for name, connector in self.connectors.items()
+        ]
+
+    async def connect(self):
+        # Backends are registered connectors with their own lifecycle.
+        pass
+
+    async def disconnect(self):
+        pass
+
+    def _score(self, backend: Backend):
+        if self.strategy == "ewma":
+            # Untried backends score zero so each one gets measured.
+            return ((backend.ewma or 0.0) * (backend.outstanding + 1), backend.outstanding)
+        return (backend.outstanding, backend.ewma or 0.0)
+
+    def _pick(self, tried: List[Backend]) -> Optional[Backend]:
+        candidates = [backend for backend in self.backends if backend not in tried and backend.breaker.allows()]
+        if not candidates:
+            return None
+        return min(candidates, key=self._score)
+
+    def _begin(self, backend: Backend) -> float:
+        backend.breaker.on_start()
+        backend.outstanding += 1
+        backend.requests += 1
+        return self.clock()
+
+    def _succeed(self, backend: Backend, start: float):
+        backend.observe(self.clock() - start, self.ewma_decay)
+        backend.breaker.on_success()
+
+    def _fail(self, backend: Backend):
+        backend.errors += 1
+        backend.breaker.on_failure()
+
+    def _release(self, backend: Backend):
+        backend.outstanding -= 1
+        # A probe that was cancelled neither closes nor re-opens the breaker.
+        backend.breaker.probing = False
+
+    async def generate_text(self, prompt: str, **params) -> str:
+        tried: List[Backend] = []
+        last_error: Optional[Exception] = None
+        while len(tried) < self.max_attempts:
+            backend = self._pick(tried)
+            if backend is None:
+                break
+            tried.append(backend)
+            start = self._begin(backend)
+            try:
+                text = await backend.connector.generate_text(prompt, **params)
+                self._succeed(backend, start)
+                return text
+            except Exception as e:
+                self._fail(backend)
+                last_error = e
+            finally:
+                self._release(backend)
+        if last_error is not None:
+            raise last_error
+        raise NoBackendAvailableError("No backend is available")
+
+    async def stream_text(self, prompt: str) -> AsyncIterator[str]:
+        # Fail over only until the first chunk; after that the caller has
+        # already received part of one backend's answer.
+        tried: List[Backend] = []
+        last_error: Optional[Exception] = None
+        while len(tried) < self.max_attempts:
+            backend = self._pick(tried)
+            if backend is None:
+                break
+            tried.append(backend)
+            start = self._begin(backend)
+            started = False
+            try:
+                async for chunk in backend.connector.stream_text(prompt):
+                    started = True
+                    yield chunk
+                self._succeed(backend, start)
+                return
+            except Exception as e:
+                self._fail(backend)
+                if started:
+                    raise
+                last_error = e
+            finally:
+                self._release(backend)
+        if last_error is not None:
+            raise last_error
+        raise NoBackendAvailableError("No backend is available")
+
+    def stats(self) -> Dict[str, dict]:
+        return {backend.name: backend.stats() for backend in self.backends}
+
+
+def create_router(router_config: dict, connectors: Dict[str, BaseConnector]) -> RoutingConnector:
+    backends = {}
+    for name in router_config.get("backends", []):
+        if name.lower() not in connectors:
+            raise ValueError(f"Router backend {name!r} is not a configured connector")
+        backends[name] = connectors[name.lower()]
+    router = RoutingConnector(backends)
+    router.initialize(router_config)
+    return router
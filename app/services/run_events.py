@@ -0,0 +1,177 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import sqlalchemy
+
+from app import config
+from app.models import Run, RunDB
+from app.services.responses import fields
+from app.services.shared_state import SharedState, shared_state
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("completed", "failed", "cancelled")
+
+
+class RunEvents:
+    """Run status changes, delivered to waiters in this process as they are
+    published: long-polls of one run get that run's changes on a queue, and
+    subscribers to a thread (its WebSocket) get every change of its runs.
+
+    Whoever stores a run's new status publishes it. With several worker
+    processes, publishing also changes a version per thread in the shared
+    state; each process checks the versions of the threads it has waiters
+    for every ``poll_interval`` seconds (a memory read) and only then reads
+    those threads' runs from the database, once for all its waiters.
+    """
+
+    def __init__(self, poll_interval: float = 0.02, state: Optional[SharedState] = None):
+        self.poll_interval = poll_interval
+        self.state = state
+        self.waiters: Dict[str, Set[asyncio.Queue]] = {}
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # Per watched thread: how many waiters and subscribers it has, and
+        # the last status of each of its runs seen here.
+        self.watchers: Dict[str, int] = {}
+        self.statuses: Dict[str, Dict[str, str]] = {}
+        self.versions: Dict[str, int] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.delivered = 0
+
+    def configure(self, runs_config: dict):
+        self.poll_interval = runs_config.get("events_poll_interval", self.poll_interval)
+
+    def publish(self, run, **changes):
+        """Announces the stored state of ``run`` (a RunDB or Run), with
+        ``changes`` applied for fields just updated in the database."""
+        event = {**fields(Run, run), **changes}
+        self.published += 1
+        if self.state is not None:
+            self.state.bump(f"runs:{event['thread_id']}")
+        self._deliver(event)
+
+    def _deliver(self, event: dict):
+        statuses = self.statuses.get(event["thread_id"])
+        if statuses is None:
+            return
+        if statuses.get(event["id"]) == event["status"]:
+            return
+        statuses[event["id"]] = event["status"]
+        for queue in (*self.waiters.get(event["id"], ()), *self.subscribers.get(event["thread_id"], ())):
+            queue.put_nowait(event)
+            self.delivered += 1
+
+    async def _watch(self, thread_id: str):
+        if self.watchers.get(thread_id):
+            self.watchers[thread_id] += 1
+            return
+        self.watchers[thread_id] = 1
+        self.statuses[thread_id] = {}
+        if self.state is None:
+            return
+        self.versions[thread_id] = self.state.version(f"runs:{thread_id}")
+        # Changes made elsewhere are found by comparing with what is stored now.
+        try:
+            runs = await self._runs([thread_id])
+        except BaseException:
+            self._unwatch(thread_id)
+            raise
+        for run in runs:
+            self.statuses[thread_id].setdefault(run["id"], run["status"])
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._poll())
+
+    def _unwatch(self, thread_id: str):
+        self.watchers[thread_id] -= 1
+        if not self.watchers[thread_id]:
+            del self.watchers[thread_id]
+            del self.statuses[thread_id]
+            self.versions.pop(thread_id, None)
+
+    async def _runs(self, thread_ids: List[str]) -> List[dict]:
+        table = RunDB.get_table()
+        query = sqlalchemy.select(*(table.c[name] for name in Run.__fields__)).where(table.c.thread_id.in_(thread_ids))
+        async with RunDB.__metadata__.database as db:
+            return [dict(row._mapping) for row in await db.fetch_all(query)]
+
+    async def _poll(self):
+        while self.watchers:
+            await asyncio.sleep(self.poll_interval)
+            changed = []
+            for thread_id, seen in list(self.versions.items()):
+                version = self.state.version(f"runs:{thread_id}")
+                if version != seen:
+                    self.versions[thread_id] = version
+                    changed.append(thread_id)
+            if not changed:
+                continue
+            try:
+                for run in await self._runs(changed):
+                    self._deliver(run)
+            except Exception:
+                logger.exception("Runs of threads %s could not be read", changed)
+
+    @asynccontextmanager
+    async def watching(self, run_id: str, thread_id: str) -> AsyncIterator[asyncio.Queue]:
+        """A queue of the status changes of ``run_id``. Enter it before
+        reading the run, so a change made in between is not missed."""
+        queue = asyncio.Queue()
+        await self._watch(thread_id)
+        self.waiters.setdefault(run_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            self.waiters[run_id].discard(queue)
+            if not self.waiters[run_id]:
+                del self.waiters[run_id]
+            self._unwatch(thread_id)
+
+    @asynccontextmanager
+    async def subscribe(self, thread_id: str) -> AsyncIterator[asyncio.Queue]:
+        """A queue of the status changes of ``thread_id``'s runs."""
+        queue = asyncio.Queue()
+        await self._watch(thread_id)
+        self.subscribers.setdefault(thread_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers[thread_id].discard(queue)
+            if not self.subscribers[thread_id]:
+                del self.subscribers[thread_id]
+            self._unwatch(thread_id)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "waiters": sum(len(queues) for queues in self.waiters.values()),
+            "subscribers": sum(len(queues) for queues in self.subscribers.values()),
+            "threads": len(self.watchers),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+async def next_change(queue: asyncio.Queue, status: str, timeout: float) -> Optional[dict]:
+    """The first change on ``queue`` to a status other than ``status``, or
+    None after ``timeout`` seconds."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            event = await asyncio.wait_for(queue.get(), deadline - loop.time())
+        except asyncio.TimeoutError:
+            return None
+        if event["status"] != status:
+            return event
+
+
+run_events = RunEvents(state=shared_state)
+run_events.configure(config.get("runs", {}))
@@ -0,0 +1,204 @@
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import List, Optional, Set
+
+import sqlalchemy
+from pydbantic.core import DataBaseModelCondition
+
+from app.models import RunDB
+from app.services.interfaces import BaseConnector
+from app.services.prompts import context_builder
+from app.services.rate_limit import current_assistant
+from app.services.run_events import run_events
+
+logger = logging.getLogger(__name__)
+
+
+class RunScheduler:
+    """Executes queued runs, up to ``workers`` at a time per process.
+
+    The queue is the run table itself, so every server process draws from
+    the same queue: a process claims the oldest queued run by writing its
+    claim into the row, and holds it under a lease that it renews while the
+    run executes. Runs whose lease expires (their process died) are claimed
+    again. At most ``max_concurrent_per_assistant`` runs of the same
+    assistant execute at once across all processes.
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 100, max_concurrent_per_assistant: int = 2,
+                 poll_interval: float = 0.5, lease: float = 60.0, drain_timeout: float = 30.0):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_concurrent_per_assistant = max_concurrent_per_assistant
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.drain_timeout = drain_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.claims = itertools.count()
+        self.connector: Optional[BaseConnector] = None
+        self.running: Set[asyncio.Task] = set()
+        self.tasks: List[asyncio.Task] = []
+        self.wake = asyncio.Event()
+        self.stopping = False
+        # Queued runs as of the last count, for metrics.
+        self.queued = 0
+
+    def configure(self, config: dict):
+        self.workers = config.get("workers", self.workers)
+        self.queue_size = config.get("queue_size", self.queue_size)
+        self.max_concurrent_per_assistant = config.get(
+            "max_concurrent_per_assistant", self.max_concurrent_per_assistant
+        )
+        self.poll_interval = config.get("poll_interval", self.poll_interval)
+        self.lease = config.get("lease", self.lease)
+        self.drain_timeout = config.get("drain_timeout", self.drain_timeout)
+
+    async def pending(self) -> int:
+        table = RunDB.get_table()
+        query = sqlalchemy.select(sqlalchemy.func.count()).select_from(table).where(table.c.status == "queued")
+        async with RunDB.__metadata__.database as db:
+            self.queued = await db.fetch_val(query)
+        return self.queued
+
+    def submit(self, run_id: str, assistant_id: str):
+        # The run is already stored as queued; this only saves this process's
+        # workers from waiting for their next poll.
+        self.wake.set()
+
+    async def claim(self) -> Optional[RunDB]:
+        """Claims the oldest queued run whose assistant is below its
+        concurrency cap, or whose previous claim's lease expired."""
+        table = RunDB.get_table()
+        other = table.alias("other")
+        now = time.time()
+        token = f"{self.worker_id}/{next(self.claims)}"
+        active = sqlalchemy.select(sqlalchemy.func.count()).select_from(other).where(
+            other.c.assistant_id == table.c.assistant_id,
+            other.c.status == "in_progress",
+            other.c.worker.is_not(None),
+            other.c.lease_until > now,
+        ).scalar_subquery()
+        # Streamed runs are in progress without a worker and are never claimed.
+        claimable = sqlalchemy.or_(
+            table.c.status == "queued",
+            sqlalchemy.and_(table.c.status == "in_progress", table.c.worker.is_not(None), table.c.lease_until <= now),
+        )
+        eligible = sqlalchemy.and_(claimable, active < self.max_concurrent_per_assistant)
+        # Looking first keeps idle polling to reads, which do not block writers.
+        async with RunDB.__metadata__.database as db:
+            candidate = await db.fetch_val(
+                sqlalchemy.select(table.c.id).where(eligible).order_by(table.c.created_at).limit(1)
+            )
+        if candidate is None:
+            return None
+        # The conditions are checked again as the row is written, so two
+        # processes cannot both claim it.
+        query = table.update().where(table.c.id == candidate, eligible).values(
+            status="in_progress", worker=token, lease_until=now + self.lease
+        )
+        await RunDB.__metadata__.database.execute(query)
+        run = await RunDB.get(id=candidate)
+        if run is None or run.worker != token:
+            return None
+        run_events.publish(run)
+        return run
+
+    async def start(self, connector: BaseConnector):
+        self.connector = connector
+        self.stopping = False
+        self.tasks = [asyncio.create_task(self._dispatch()), asyncio.create_task(self._heartbeat())]
+
+    async def stop(self):
+        """Stops claiming runs and waits up to ``drain_timeout`` for the
+        runs in progress. Runs still executing then are cancelled and put
+        back in the queue for another process."""
+        self.stopping = True
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.running:
+            await asyncio.wait(self.running, timeout=self.drain_timeout)
+            for task in self.running:
+                task.cancel()
+            await asyncio.gather(*self.running, return_exceptions=True)
+        if self.tasks:
+            await self._release()
+        self.tasks = []
+
+    async def _dispatch(self):
+        slots = asyncio.Semaphore(self.workers)
+        while not self.stopping:
+            await slots.acquire()
+            run = None
+            while run is None:
+                self.wake.clear()
+                try:
+                    run = await self.claim()
+                except Exception:
+                    logger.exception("Runs could not be claimed")
+                if run is None:
+                    try:
+                        await asyncio.wait_for(self.wake.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+            task = asyncio.create_task(self._execute(run))
+            self.running.add(task)
+            task.add_done_callback(lambda task: self._finished(task, slots))
+
+    def _finished(self, task: asyncio.Task, slots: asyncio.Semaphore):
+        self.running.discard(task)
+        slots.release()
+        # A finished run may let another run of its assistant be claimed.
+        self.wake.set()
+
+    async def _heartbeat(self):
+        table = RunDB.get_table()
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not self.running:
+                continue
+            query = table.update().where(
+                table.c.worker.startswith(f"{self.worker_id}/"), table.c.status == "in_progress"
+            ).values(lease_until=time.time() + self.lease)
+            try:
+                await RunDB.__metadata__.database.execute(query)
+            except Exception:
+                logger.exception("Run leases could not be renewed")
+
+    async def _release(self):
+        table = RunDB.get_table()
+        mine = sqlalchemy.and_(table.c.worker.startswith(f"{self.worker_id}/"), table.c.status == "in_progress")
+        released = await RunDB.filter(DataBaseModelCondition("claimed here", mine, (self.worker_id,)))
+        await RunDB.__metadata__.database.execute(table.update().where(mine).values(
+            status="queued", worker=None, lease_until=None
+        ))
+        for run in released:
+            run_events.publish(run, status="queued")
+
+    async def _execute(self, run: RunDB):
+        try:
+            current_assistant.set(run.assistant_id)
+            try:
+                context = await context_builder.for_run(run.thread_id, run.assistant_id)
+                result = await self.connector.generate_text(context.prompt)
+            except Exception as e:
+                await run.update(status="failed", result=str(e))
+                run_events.publish(run, status="failed", result=str(e))
+                return
+            await run.update(status="completed", result=result)
+            run_events.publish(run, status="completed", result=result)
+            if context_builder.summaries and context.dropped is not None:
+                try:
+                    await context_builder.summarize(run.thread_id, context, self.connector)
+                except Exception:
+                    logger.exception("Summary of thread %s could not be updated", run.thread_id)
+        except Exception:
+            logger.exception("Run %s could not be executed", run.id)
+
+
+scheduler = RunScheduler()
@@ -0,0 +1,227 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from typing import IO, TYPE_CHECKING, Iterable, List, Optional, Set, Tuple
+
+import sqlalchemy
+from pydbantic.core import DataBaseModelCondition
+
+from app import config
+from app.models import MessageDB
+
+if TYPE_CHECKING:
+    from app.services.embeddings import EmbeddingConnector
+    from app.services.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticSearch:
+    """Embeds messages as they are added and finds the ones most similar to
+    a query, within a thread or across all threads.
+
+    Messages are embedded in the background, ``batch_size`` at a time, so
+    adding messages never waits for the embedder; a message becomes
+    searchable shortly after it is stored. Messages stored before the index
+    existed are embedded once, by the first process to start with it; the
+    progress is saved after every page, so a backfill cut short is resumed
+    by the next process to start.
+    """
+
+    def __init__(self, enabled: bool = False, path: str = "./search_index", batch_size: int = 64,
+                 embedder: Optional["EmbeddingConnector"] = None):
+        self.enabled = enabled
+        self.path = path
+        self.batch_size = batch_size
+        self.embedder = embedder
+        self.index: Optional["VectorIndex"] = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # Ids in the queue, so a message submitted twice is embedded once.
+        self.queued: Set[str] = set()
+        self.tasks: List[asyncio.Task] = []
+        self.backfill_lock: Optional[IO] = None
+        self.indexed = 0
+        self.failed = 0
+
+    def configure(self, search_config: dict):
+        self.enabled = search_config.get("enabled", self.enabled)
+        self.path = search_config.get("path", self.path)
+        self.batch_size = search_config.get("batch_size", self.batch_size)
+        if self.enabled:
+            # Imported only when enabled: the index and embedders need numpy.
+            from app.services.embeddings import create_embedder
+
+            self.embedder = create_embedder(search_config)
+
+    async def start(self):
+        if not self.enabled:
+            return
+        from app.services.vector_index import VectorIndex
+
+        await self.embedder.connect()
+        self.index = VectorIndex(self.path, self.embedder.dimensions)
+        self.tasks = [asyncio.create_task(self._worker())]
+        state = self._claim_backfill()
+        if state is not None:
+            self.tasks.append(asyncio.create_task(self.backfill(state["before"], after=state["last"])))
+
+    def _claim_backfill(self) -> Optional[dict]:
+        """The saved state of the backfill if it is unfinished and no other
+        process is running it; it is then this process's until it ends."""
+        import fcntl
+
+        lock = open(os.path.join(self.path, "backfill.lock"), "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        state = self._backfill_state()
+        if state is None:
+            # Messages added from now on are submitted by the routes.
+            state = {"before": time.time(), "last": None, "done": False}
+            self._save_backfill(state)
+        if state["done"]:
+            lock.close()
+            return None
+        self.backfill_lock = lock
+        return state
+
+    def _backfill_state(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.path, "backfill.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_backfill(self, state: dict):
+        path = os.path.join(self.path, "backfill.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _release_backfill(self):
+        if self.backfill_lock is not None:
+            self.backfill_lock.close()
+            self.backfill_lock = None
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.embedder is not None:
+            await self.embedder.disconnect()
+
+    def submit(self, messages: Iterable[dict]):
+        """Queues stored messages (``id``, ``thread_id``, ``content``) for embedding."""
+        if self.index is None:
+            return
+        for message in messages:
+            if len(message["id"].encode()) > self.index.max_id_bytes:
+                logger.warning("Message %s is not indexed: its id is longer than %d bytes",
+                               message["id"], self.index.max_id_bytes)
+                continue
+            if message["id"] in self.queued:
+                continue
+            self.queued.add(message["id"])
+            self.queue.put_nowait((message["id"], message["thread_id"], message["content"]))
+
+    async def flush(self):
+        """Waits until every queued message is searchable."""
+        await self.queue.join()
+
+    async def _worker(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self._index(batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("%d messages could not be indexed", len(batch))
+            finally:
+                for message_id, _, _ in batch:
+                    self.queued.discard(message_id)
+                    self.queue.task_done()
+
+    async def _index(self, batch: List[Tuple[str, str, str]]):
+        message_ids, thread_ids, texts = zip(*batch)
+        vectors = await self.embedder.embed(list(texts))
+        await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self.index.add, message_ids, thread_ids, vectors)
+        )
+        self.indexed += len(batch)
+
+    async def backfill(self, before: float, page_size: int = 1000, after: Optional[str] = None):
+        # Messages added from ``before`` on are submitted by the routes. Those
+        # given an earlier created_at are also found here, so ids already in
+        # the index are skipped. Pages go by id, and the last id done is saved
+        # after each one, so a backfill cut short resumes ``after`` it.
+        table = MessageDB.get_table()
+        query = sqlalchemy.select(table.c.id, table.c.thread_id, table.c.content).where(
+            table.c.created_at < before
+        ).order_by(table.c.id)
+        last = after
+        # Ids in the index that later pages may still hold, and how many
+        # index rows have been looked at for them.
+        indexed: Set[str] = set()
+        checked = 0
+        try:
+            while True:
+                page = query.where(table.c.id > last) if last is not None else query
+                async with MessageDB.__metadata__.database as db:
+                    rows = await db.fetch_all(page.limit(page_size))
+                if not rows:
+                    self._save_backfill({"before": before, "last": last, "done": True})
+                    return
+                count = len(self.index)
+                indexed.update(message_id for message_id in self.index.ids(checked, count)
+                               if last is None or message_id > last)
+                checked = count
+                self.submit({"id": row[0], "thread_id": row[1], "content": row[2]}
+                            for row in rows if row[0] not in indexed)
+                last = rows[-1][0]
+                # Keep the queue short so newly added messages are not stuck behind the backlog.
+                await self.flush()
+                self._save_backfill({"before": before, "last": last, "done": False})
+                indexed = {message_id for message_id in indexed if message_id > last}
+        finally:
+            self._release_backfill()
+
+    async def search(self, query: str, limit: int = 10, thread_id: Optional[str] = None) -> List[Tuple[MessageDB, float]]:
+        """The ``limit`` stored messages most similar to ``query``, with
+        their cosine similarity, most similar first."""
+        vectors = await self.embedder.embed([query])
+        hits = (await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self.index.search, vectors, limit, thread_id)
+        ))[0]
+        if not hits:
+            return []
+        ids = list(dict.fromkeys(message_id for message_id, _ in hits))
+        condition = DataBaseModelCondition("id in hits", MessageDB.get_table().c.id.in_(ids), tuple(ids))
+        messages = {message.id: message for message in await MessageDB.filter(condition)}
+        results = []
+        for message_id, score in hits:
+            # Thread ids are matched by hash in the index; check the real one.
+            message = messages.pop(message_id, None)
+            if message is not None and (thread_id is None or message.thread_id == thread_id):
+                results.append((message, score))
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "vectors": len(self.index) if self.index is not None else 0,
+            "queued": self.queue.qsize(),
+            "indexed": self.indexed,
+            "failed": self.failed,
+        }
+
+
+semantic_search = SemanticSearch()
+semantic_search.configure(config.get("search", {}))
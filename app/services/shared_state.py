@@ -0,0 +1,113 @@
+import hashlib
+import os
+import random
+import struct
+import tempfile
+import uuid
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+ENV_VAR = "PYGENTIC_SHARED_STATE"
+
+VERSION = struct.Struct("Q")
+# Key hash (0 marks a free slot) and two float values.
+RECORD = struct.Struct("Qdd")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+class SharedState:
+    """State shared by the worker processes of one server, in a shared
+    memory block the serving process creates before starting the workers.
+
+    It holds cache versions, which writers change so other workers' cached
+    copies are detected as stale, and small records (rate-limit buckets)
+    that are read and written under a lock file.
+    """
+
+    def __init__(self, name: str, lock_path: str, versions: int = 65536, records: int = 65536, create: bool = False):
+        self.lock_path = lock_path
+        self.versions = versions
+        self.records = records
+        size = versions * VERSION.size + records * RECORD.size
+        self.memory = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        if not create:
+            # The creating process unlinks the block; workers only detach.
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.memory._name, "shared_memory")
+        self.buffer = self.memory.buf
+        self.lock_file = open(lock_path, "a+")
+
+    @classmethod
+    def create(cls) -> "SharedState":
+        lock_path = os.path.join(tempfile.gettempdir(), f"pygentic-{uuid.uuid4().hex}.lock")
+        return cls(f"pygentic_{uuid.uuid4().hex[:16]}", lock_path, create=True)
+
+    @classmethod
+    def attach(cls) -> Optional["SharedState"]:
+        value = os.environ.get(ENV_VAR)
+        if not value:
+            return None
+        name, lock_path = value.split(":", 1)
+        return cls(name, lock_path)
+
+    def export(self):
+        """Makes the state available to worker processes started after this."""
+        os.environ[ENV_VAR] = f"{self.memory.name}:{self.lock_path}"
+
+    def close(self, unlink: bool = False):
+        self.buffer = None
+        self.lock_file.close()
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+            os.unlink(self.lock_path)
+
+    def version(self, key: str) -> int:
+        return VERSION.unpack_from(self.buffer, VERSION.size * (_hash(key) % self.versions))[0]
+
+    def bump(self, key: str):
+        # A random value rather than an increment: two workers bumping at once
+        # still leave a value no reader has seen, without taking the lock.
+        VERSION.pack_into(self.buffer, VERSION.size * (_hash(key) % self.versions), random.getrandbits(64))
+
+    @contextmanager
+    def locked(self):
+        import fcntl
+
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _slot(self, key: str, claim: bool) -> Optional[int]:
+        # Open addressing; a key that finds the table full reuses its home slot.
+        key_hash = _hash(key)
+        home = key_hash % self.records
+        base = self.versions * VERSION.size
+        for probe in range(self.records):
+            offset = base + RECORD.size * ((home + probe) % self.records)
+            stored = RECORD.unpack_from(self.buffer, offset)[0]
+            if stored == key_hash or (stored == 0 and claim):
+                return offset
+            if stored == 0:
+                return None
+        return base + RECORD.size * home if claim else None
+
+    def get(self, key: str) -> Optional[Tuple[float, float]]:
+        """The record stored for ``key``; call with the lock held."""
+        offset = self._slot(key, claim=False)
+        if offset is None:
+            return None
+        key_hash, first, second = RECORD.unpack_from(self.buffer, offset)
+        return (first, second) if key_hash == _hash(key) else None
+
+    def set(self, key: str, first: float, second: float):
+        RECORD.pack_into(self.buffer, self._slot(key, claim=True), _hash(key), first, second)
+
+
+shared_state = SharedState.attach()
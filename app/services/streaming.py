@@ -0,0 +1,36 @@
+import json
+from typing import AsyncIterator
+
+from fastapi.responses import StreamingResponse
+
+
+def sse_event(data: str) -> str:
+    return f"data: {data}\n\n"
+
+
+async def sse_chunks(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    async for chunk in chunks:
+        yield sse_event(json.dumps({"text": chunk}))
+    yield sse_event("[DONE]")
+
+
+async def sse_objects(objects: AsyncIterator[dict]) -> AsyncIterator[str]:
+    async for data in objects:
+        yield sse_event(json.dumps(data))
+    yield sse_event("[DONE]")
+
+
+def _event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def sse_response(chunks: AsyncIterator[str]) -> StreamingResponse:
+    return _event_stream(sse_chunks(chunks))
+
+
+def sse_json_response(objects: AsyncIterator[dict]) -> StreamingResponse:
+    return _event_stream(sse_objects(objects))
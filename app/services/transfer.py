@@ -0,0 +1,311 @@
+import gzip
+import json
+import os
+import pickle
+import sys
+import zlib
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import sqlalchemy
+from pydantic import ValidationError
+from sqlalchemy import literal, tuple_
+
+from app.models import AssistantDB, MessageDB, RunDB, ThreadDB, ThreadSummaryDB
+from app.services.cache import assistant_cache, thread_cache
+from app.services.database import bulk_insert, existing_keys, refresh_thread_stats
+from app.services.search import semantic_search
+
+# Idempotency records are request state, not data, and are not exported.
+TABLES = [AssistantDB, ThreadDB, MessageDB, RunDB, ThreadSummaryDB]
+MODELS = {model.__name__: model for model in TABLES}
+
+
+class TransferError(ValueError):
+    pass
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """``Table:key``, the table and primary key of the last exported line."""
+    if not cursor:
+        return None
+    table, separator, key = cursor.partition(":")
+    if not separator or table not in MODELS:
+        raise TransferError(f"Invalid cursor: {cursor}")
+    return table, key
+
+
+def line_cursor(line: dict) -> Tuple[str, str]:
+    """The (table, key) of an export line, to resume after it."""
+    table = MODELS[line["table"]].get_table()
+    return line["table"], line["data"][_primary_key(table).name]
+
+
+def _primary_key(table: sqlalchemy.Table) -> sqlalchemy.Column:
+    return table.primary_key.columns.values()[0]
+
+
+def _pickled(table: sqlalchemy.Table) -> List[str]:
+    # pydbantic stores list and model fields pickled in binary columns.
+    return [column.name for column in table.c if isinstance(column.type, sqlalchemy.LargeBinary)]
+
+
+def _of_thread(model, table: sqlalchemy.Table, thread_id: str):
+    threads = ThreadDB.get_table()
+    if model is AssistantDB:
+        return table.c.id.in_(sqlalchemy.select(threads.c.assistant_id).where(threads.c.id == thread_id))
+    if model is ThreadDB:
+        return table.c.id == thread_id
+    return table.c.thread_id == thread_id
+
+
+def _order(model, table: sqlalchemy.Table, thread_id: Optional[str]) -> List[sqlalchemy.Column]:
+    if model is MessageDB and thread_id is not None:
+        # Walks the (thread_id, created_at) index instead of sorting the thread.
+        return [table.c.created_at, table.c.id]
+    return [_primary_key(table)]
+
+
+async def _position(model, table: sqlalchemy.Table, order: List[sqlalchemy.Column], key: str) -> tuple:
+    if len(order) == 1:
+        return (key,)
+    async with model.__metadata__.database as db:
+        row = await db.fetch_one(sqlalchemy.select(*order).where(_primary_key(table) == key))
+    if row is None:
+        raise TransferError(f"Invalid cursor: {model.__name__}:{key}")
+    return tuple(row)
+
+
+async def export_rows(tables: Optional[List[str]] = None, thread_id: Optional[str] = None,
+                      after: Optional[Tuple[str, str]] = None, chunk_size: int = 1000) -> AsyncIterator[List[dict]]:
+    """Yields the stored rows as export lines (``table`` and ``data``),
+    ``chunk_size`` at a time: table by table, each in key order, so only one
+    chunk is held at once. ``after`` resumes past a (table, key) already
+    exported; ``thread_id`` limits the export to that thread and its
+    assistant."""
+    names = [model.__name__ for model in TABLES]
+    for name in tables or []:
+        if name not in MODELS:
+            raise TransferError(f"Unknown table: {name}")
+    for model in TABLES:
+        name = model.__name__
+        if tables and name not in tables:
+            continue
+        if after is not None and names.index(name) < names.index(after[0]):
+            continue
+        table = model.get_table()
+        order = _order(model, table, thread_id)
+        pickled = _pickled(table)
+        query = sqlalchemy.select(table).order_by(*order).limit(chunk_size)
+        if thread_id is not None:
+            query = query.where(_of_thread(model, table, thread_id))
+        position = None
+        if after is not None and after[0] == name:
+            position = await _position(model, table, order, after[1])
+        while True:
+            # Keyset pagination: each chunk starts where the last one ended.
+            page = query if position is None else query.where(tuple_(*order) > tuple_(*map(literal, position)))
+            async with model.__metadata__.database as db:
+                rows = await db.fetch_all(page)
+            if not rows:
+                break
+            chunk = []
+            for row in rows:
+                data = dict(row._mapping)
+                for column in pickled:
+                    if data[column] is not None:
+                        data[column] = pickle.loads(data[column])
+                chunk.append({"table": name, "data": data})
+            yield chunk
+            position = tuple(rows[-1]._mapping[column.name] for column in order)
+
+
+async def export_jsonl_gz(tables: Optional[List[str]] = None, thread_id: Optional[str] = None,
+                          after: Optional[Tuple[str, str]] = None, chunk_size: int = 1000) -> AsyncIterator[bytes]:
+    """The export as gzip-compressed JSON lines, one gzip member per chunk.
+
+    Concatenated members are one valid gzip file, and a stream cut short
+    loses at most its last member: everything before it can be read, and the
+    export resumed after its last line."""
+    async for chunk in export_rows(tables, thread_id, after, chunk_size):
+        yield _member(chunk)
+
+
+def _member(chunk: List[dict]) -> bytes:
+    lines = "".join(json.dumps(line, separators=(",", ":")) + "\n" for line in chunk)
+    return gzip.compress(lines.encode(), compresslevel=6, mtime=0)
+
+
+async def read_jsonl_gz(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    """Parses gzip-compressed JSON lines (any number of members) as they arrive."""
+    decompressor = zlib.decompressobj(wbits=31)
+    fed = False
+    buffer = b""
+    number = 0
+    async for data in chunks:
+        while data:
+            fed = True
+            try:
+                # Bounded output per call, so a small, highly compressed
+                # input cannot expand all at once.
+                buffer += decompressor.decompress(data, 1 << 20)
+            except zlib.error as e:
+                raise TransferError(f"Not gzip-compressed JSON lines: {e}")
+            data = decompressor.unconsumed_tail
+            if decompressor.eof:
+                # The next member, if any, starts right after this one.
+                data, decompressor, fed = decompressor.unused_data, zlib.decompressobj(wbits=31), False
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                number += 1
+                if line.strip():
+                    yield _parse_line(line, number)
+    if fed:
+        raise TransferError("The input ends in the middle of a gzip member")
+    if buffer.strip():
+        # The last line need not end with a newline.
+        yield _parse_line(buffer, number + 1)
+
+
+def _parse_line(line: bytes, number: int) -> dict:
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise TransferError(f"Line {number} is not valid JSON")
+
+
+async def import_jsonl_gz(chunks: AsyncIterator[bytes], batch_size: int = 1000) -> Dict[str, Dict[str, int]]:
+    """Stores the rows of an export, ``batch_size`` at a time. Rows whose key
+    is already stored are skipped, so an interrupted import can be run again
+    from the start. Returns created and skipped counts per table."""
+    counts = {name: {"created": 0, "skipped": 0} for name in MODELS}
+    threads = set()
+    batch: List[dict] = []
+    model = None
+
+    async def store():
+        table = model.get_table()
+        key = _primary_key(table).name
+        rows = {}
+        for row in batch:
+            rows.setdefault(row[key], row)
+        stored = await existing_keys(model, list(rows))
+        created = [row for row_key, row in rows.items() if row_key not in stored]
+        for row in created:
+            for column in _pickled(table):
+                if row.get(column) is not None:
+                    row[column] = pickle.dumps(row[column])
+        await bulk_insert(model, created)
+        counts[model.__name__]["created"] += len(created)
+        counts[model.__name__]["skipped"] += len(batch) - len(created)
+        if model is AssistantDB:
+            for row in created:
+                await assistant_cache.invalidate(row["id"])
+        elif model is MessageDB:
+            threads.update(row["thread_id"] for row in created)
+            semantic_search.submit(created)
+        batch.clear()
+
+    try:
+        async for line in read_jsonl_gz(chunks):
+            line_model = MODELS.get(line.get("table")) if isinstance(line, dict) else None
+            if line_model is None or not isinstance(line.get("data"), dict):
+                raise TransferError(f"Not an export line: {json.dumps(line)[:200]}")
+            if batch and (line_model is not model or len(batch) >= batch_size):
+                await store()
+            model = line_model
+            table = model.get_table()
+            # Validated through the model, then stored as plain column values.
+            try:
+                data = model.parse_obj(line["data"]).dict()
+            except ValidationError as e:
+                raise TransferError(f"Invalid {model.__name__} row: {e}")
+            batch.append({column.name: data.get(column.name) for column in table.c})
+        if batch:
+            await store()
+    finally:
+        # Messages imported into a thread count towards it, whether or not
+        # the thread itself came from this export.
+        if threads:
+            await refresh_thread_stats(sorted(threads))
+            for thread_id in threads:
+                await thread_cache.invalidate(thread_id)
+    return counts
+
+
+def resume_point(path: str) -> Tuple[int, Optional[Tuple[str, str]]]:
+    """The size of the complete gzip members at the start of the export at
+    ``path``, and the cursor of the last line in them. What follows is an
+    export cut short, to be truncated before resuming."""
+    end, cursor = 0, None
+    offset = 0
+    decompressor = zlib.decompressobj(wbits=31)
+    buffer = b""
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(1 << 16)
+            if not data:
+                break
+            while data:
+                try:
+                    buffer += decompressor.decompress(data, 1 << 20)
+                except zlib.error:
+                    return end, cursor
+                if not decompressor.eof:
+                    offset += len(data) - len(decompressor.unconsumed_tail)
+                    data = decompressor.unconsumed_tail
+                    # Only the last line of the member is needed.
+                    buffer = buffer[buffer.rfind(b"\n", 0, len(buffer) - 1) + 1:]
+                    continue
+                offset += len(data) - len(decompressor.unused_data)
+                data = decompressor.unused_data
+                lines = buffer.splitlines()
+                if lines:
+                    end, cursor = offset, line_cursor(json.loads(lines[-1]))
+                decompressor = zlib.decompressobj(wbits=31)
+                buffer = b""
+    return end, cursor
+
+
+async def export_file(path: str, tables: Optional[List[str]] = None, thread_id: Optional[str] = None,
+                      resume: bool = False, chunk_size: int = 1000) -> int:
+    """Exports to ``path`` (``-`` for stdout). With ``resume``, an existing
+    export there is continued after its last complete chunk. Returns the
+    number of lines written."""
+    after = None
+    if path == "-":
+        output = sys.stdout.buffer
+    elif resume and os.path.exists(path):
+        offset, after = resume_point(path)
+        output = open(path, "r+b")
+        output.truncate(offset)
+        output.seek(offset)
+    else:
+        output = open(path, "wb")
+    written = 0
+    try:
+        async for chunk in export_rows(tables, thread_id, after, chunk_size):
+            output.write(_member(chunk))
+            written += len(chunk)
+    finally:
+        output.flush()
+        if output is not sys.stdout.buffer:
+            output.close()
+    return written
+
+
+async def _read(path: str, size: int = 1 << 16) -> AsyncIterator[bytes]:
+    source = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while True:
+            data = source.read(size)
+            if not data:
+                return
+            yield data
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+
+
+async def import_file(path: str, batch_size: int = 1000) -> Dict[str, Dict[str, int]]:
+    """Imports the export at ``path`` (``-`` for stdin)."""
+    return await import_jsonl_gz(_read(path), batch_size)
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ROW = np.dtype([("message", "S64"), ("thread", "<u8")])
+MAX_ID_BYTES = ROW["message"].itemsize
+
+
+def thread_key(thread_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(thread_id.encode(), digest_size=8).digest(), "little")
+
+
+class VectorIndex:
+    """Unit-length float32 vectors of messages in memory-mapped files under
+    ``directory``, searched by exact (brute-force) cosine similarity.
+
+    ``vectors.f32`` holds the vectors and ``rows.bin`` the message id and a
+    hash of the thread id of each; ``count`` holds how many rows are valid.
+    Appends take a lock file and publish the new count last, so any number
+    of processes can search and append to the same directory. Only the
+    pages a search touches are read, and the OS caches them across
+    processes.
+    """
+
+    max_id_bytes = MAX_ID_BYTES
+
+    def __init__(self, directory: str, dimensions: int, chunk_rows: int = 65536):
+        self.directory = directory
+        self.dimensions = dimensions
+        self.chunk_rows = chunk_rows
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored = json.load(f)["dimensions"]
+            if stored != dimensions:
+                raise ValueError(f"Index in {directory} has {stored} dimensions, not {dimensions}")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"dimensions": dimensions}, f)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.rows_path = os.path.join(directory, "rows.bin")
+        self.lock_path = os.path.join(directory, "lock")
+        count_path = os.path.join(directory, "count")
+        for path in (self.vectors_path, self.rows_path, count_path, self.lock_path):
+            open(path, "ab").close()
+        if os.path.getsize(count_path) == 0:
+            with open(count_path, "wb") as f:
+                f.write(np.zeros(1, dtype="<i8").tobytes())
+        self.counter = np.memmap(count_path, dtype="<i8", mode="r+", shape=(1,))
+        self.capacity = 0
+        self.vectors: Optional[np.memmap] = None
+        self.rows: Optional[np.memmap] = None
+        self._map()
+
+    def __len__(self) -> int:
+        return int(self.counter[0])
+
+    def _map(self):
+        capacity = os.path.getsize(self.rows_path) // ROW.itemsize
+        if capacity == self.capacity:
+            return
+        self.capacity = capacity
+        if capacity:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimensions))
+            self.rows = np.memmap(self.rows_path, dtype=ROW, mode="r+", shape=(capacity,))
+
+    @contextmanager
+    def _locked(self):
+        import fcntl
+
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _grow(self, needed: int):
+        capacity = max(needed, 2 * self.capacity, 1024)
+        with open(self.vectors_path, "r+b") as f:
+            f.truncate(capacity * self.dimensions * 4)
+        with open(self.rows_path, "r+b") as f:
+            f.truncate(capacity * ROW.itemsize)
+        self._map()
+
+    def add(self, message_ids: Sequence[str], thread_ids: Sequence[str], vectors: np.ndarray):
+        """Appends unit-length ``vectors``. Ids must fit in 64 bytes."""
+        if not len(message_ids):
+            return
+        rows = np.empty(len(message_ids), dtype=ROW)
+        rows["message"] = [message_id.encode() for message_id in message_ids]
+        rows["thread"] = [thread_key(thread_id) for thread_id in thread_ids]
+        with self._locked():
+            start = len(self)
+            end = start + len(rows)
+            self._map()
+            if end > self.capacity:
+                self._grow(end)
+            self.vectors[start:end] = vectors
+            self.rows[start:end] = rows
+            # Searches only read up to the count, so it is written last.
+            self.counter[0] = end
+
+    def ids(self, start: int = 0, end: Optional[int] = None) -> List[str]:
+        """The message ids of rows ``start`` to ``end`` (by default, the last)."""
+        end = len(self) if end is None else end
+        if end > self.capacity:
+            self._map()
+        return [id_.decode() for id_ in self.rows["message"][start:end]] if end > start else []
+
+    def search(self, queries: np.ndarray, k: int, thread_id: Optional[str] = None) -> List[List[Tuple[str, float]]]:
+        """The ``k`` most similar messages to each unit-length query row,
+        as (message id, cosine similarity), most similar first. With
+        ``thread_id``, only that thread's messages are searched."""
+        queries = np.atleast_2d(queries).astype(np.float32)
+        count = len(self)
+        if count > self.capacity:
+            self._map()
+        if not count or k <= 0:
+            return [[] for _ in queries]
+        if thread_id is not None:
+            # Scanning the 8-byte thread column costs a fraction of the vectors.
+            positions = np.flatnonzero(self.rows["thread"][:count] == thread_key(thread_id))
+            candidates = [self._top(positions, self.vectors[positions] @ queries.T, k)]
+        else:
+            # One matrix product per chunk scores every query at once, and
+            # only each chunk's top k are kept.
+            candidates = [
+                self._top(np.arange(start, min(count, start + self.chunk_rows)),
+                          self.vectors[start:min(count, start + self.chunk_rows)] @ queries.T, k)
+                for start in range(0, count, self.chunk_rows)
+            ]
+        positions = np.concatenate([chunk[0] for chunk in candidates])
+        scores = np.concatenate([chunk[1] for chunk in candidates])
+        best, best_scores = self._top(positions, scores, k)
+        results = []
+        for query in range(len(queries)):
+            order = np.argsort(-best_scores[:, query], kind="stable")
+            ids = self.rows["message"][best[order, query]]
+            results.append([(id_.decode(), float(score)) for id_, score in zip(ids, best_scores[order, query])])
+        return results
+
+    @staticmethod
+    def _top(positions: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # The best k (position, score) rows per query column, unsorted.
+        # ``positions`` is either per row or already per row and query.
+        if len(scores) > k:
+            keep = np.argpartition(-scores, k - 1, axis=0)[:k]
+            scores = np.take_along_axis(scores, keep, axis=0)
+        else:
+            keep = np.broadcast_to(np.arange(len(scores))[:, None], scores.shape)
+        if positions.ndim == 1:
+            return positions[keep], scores
+        return np.take_along_axis(positions, keep, axis=0), scores
@@ -0,0 +1,69 @@
+# benchmarks/bench_connector_pool.py
+# Compares a fresh httpx.AsyncClient per call (the old connector behaviour)
+# with the pooled client owned by OpenAIAssistantConnector.
+#
+#   python -m benchmarks.bench_connector_pool --requests 2000 --concurrency 50
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.services.default_connector import OpenAIAssistantConnector
+from benchmarks.stub_upstream import StubUpstream
+
+
+class PerCallClientConnector(OpenAIAssistantConnector):
+    async def generate_text(self, prompt: str) -> str:
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"{self.base_url}/completions",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={"prompt": prompt, "max_tokens": 50}
+            )
+        return response.json()['choices'][0]['text']
+
+
+async def drive(connector, requests: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await connector.generate_text(f"prompt {i}")
+            latencies.append(time.perf_counter() - start)
+
+    await connector.connect()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    await connector.disconnect()
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    with StubUpstream() as upstream:
+        for label, cls in (("per-call client", PerCallClientConnector),
+                           ("pooled client", OpenAIAssistantConnector)):
+            connector = cls()
+            connector.initialize({"base_url": upstream.base_url})
+            result = asyncio.run(drive(connector, args.requests, args.concurrency))
+            print(f"{label:16} {result['rps']:8.1f} req/s  "
+                  f"p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_context.py
+# Seeds threads of increasing length and compares building a run prompt from
+# the whole history (what runs used to send) with the token-budgeted window.
+# The window costs the same however long the thread is, and so does its
+# prompt.
+#
+#   python -m benchmarks.bench_context --messages 100 10000 100000 --budget 4096
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from app.models import MessageDB
+from app.services.prompts import ContextBuilder, message_line
+from app.services.rate_limit import estimate_tokens
+from benchmarks.common import create_database, seed_messages
+
+
+async def full_history(thread_id: str) -> str:
+    messages = await MessageDB.filter(thread_id=thread_id, order_by=MessageDB.asc("created_at"))
+    return "\n".join(message_line(message) for message in messages)
+
+
+async def windowed(builder: ContextBuilder, thread_id: str, budget: int) -> str:
+    return (await builder.build(thread_id, budget)).prompt
+
+
+async def time_prompt(build, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        prompt = await build()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, estimate_tokens(prompt)
+
+
+async def run(sizes, budget: int, repeat: int):
+    builder = ContextBuilder()
+    print(f"{'messages':>9}  {'full ms':>9}  {'full tokens':>11}  {'window ms':>9}  {'window tokens':>13}")
+    for size in sizes:
+        thread_id = f"bench-{size}"
+        full_ms, full_tokens = await time_prompt(lambda: full_history(thread_id), max(1, repeat // 10))
+        window_ms, window_tokens = await time_prompt(lambda: windowed(builder, thread_id, budget), repeat)
+        print(f"{size:>9}  {full_ms:>9.2f}  {full_tokens:>11}  {window_ms:>9.2f}  {window_tokens:>13}")
+    print(f"token lengths cached: {builder.counter.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--budget", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = create_database(tmp)
+        for size in args.messages:
+            seed_messages(database, f"bench-{size}", size, prefix=f"bench-{size}")
+        asyncio.run(run(args.messages, args.budget, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
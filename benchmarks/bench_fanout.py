@@ -0,0 +1,70 @@
+# benchmarks/bench_fanout.py
+# Fans a batch of payloads with varying latency out to a serverless endpoint
+# (the stub upstream), comparing the old approach (a new client per call,
+# unbounded asyncio.gather) with fan_out over the pooled client. Reports the
+# time to the first result and to the whole batch.
+#
+#   python -m benchmarks.bench_fanout --items 200 --concurrency 20
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from app.services.connector import ServerlessServiceConnector
+from app.services.fanout import fan_out
+from benchmarks.stub_upstream import StubUpstream
+
+
+async def call_with_new_client(endpoint: str, data: dict):
+    async with httpx.AsyncClient() as client:
+        response = await client.post(endpoint, json=data)
+    return response.json()
+
+
+async def gather_batch(endpoint: str, payloads) -> tuple:
+    start = time.perf_counter()
+    await asyncio.gather(*(call_with_new_client(endpoint, payload) for payload in payloads))
+    total = time.perf_counter() - start
+    # gather returns nothing until the slowest call is done.
+    return total, total
+
+
+async def fan_out_batch(endpoint: str, payloads, concurrency: int) -> tuple:
+    connector = ServerlessServiceConnector({"endpoint": endpoint})
+    start = time.perf_counter()
+    first = None
+    async for result in fan_out(connector.call_endpoint, payloads, concurrency=concurrency):
+        assert result.error is None, result.error
+        first = first or time.perf_counter() - start
+    total = time.perf_counter() - start
+    await connector.close()
+    return first, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--min-latency", type=float, default=0.01)
+    parser.add_argument("--max-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    random.seed(0)
+    payloads = [
+        {"id": index, "latency": random.uniform(args.min_latency, args.max_latency)} for index in range(args.items)
+    ]
+    with StubUpstream() as upstream:
+        endpoint = f"{upstream.base_url}/serverless"
+        print(f"{'approach':>20}  {'first result ms':>15}  {'batch ms':>9}")
+        for name, batch in (
+            ("gather, new clients", gather_batch(endpoint, payloads)),
+            (f"fan_out, {args.concurrency} at once", fan_out_batch(endpoint, payloads, args.concurrency)),
+        ):
+            first, total = asyncio.run(batch)
+            print(f"{name:>20}  {first * 1000:>15.1f}  {total * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
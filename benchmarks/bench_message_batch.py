@@ -0,0 +1,54 @@
+# benchmarks/bench_message_batch.py
+# Imports a conversation through POST /v1/threads/{id}/messages/batch and,
+# for comparison, through one POST /v1/threads/{id}/messages per message.
+#
+#   python -m benchmarks.bench_message_batch --messages 10000
+import argparse
+import asyncio
+import tempfile
+import time
+
+from httpx import AsyncClient
+
+from app.main import app
+from benchmarks.common import create_database
+
+
+def messages(prefix: str, count: int):
+    return [
+        {"id": f"{prefix}-{i}", "thread_id": prefix, "role": "user" if i % 2 else "assistant",
+         "content": f"message {i} " + "lorem ipsum " * 10}
+        for i in range(count)
+    ]
+
+
+async def run(count: int, single: int):
+    async with AsyncClient(app=app, base_url="http://bench", timeout=None) as ac:
+        batch = messages("batch", count)
+        start = time.perf_counter()
+        response = await ac.post("/v1/threads/batch/messages/batch", json={"messages": batch})
+        elapsed = time.perf_counter() - start
+        assert response.json()["created"] == count, response.text
+        print(f"batch endpoint : {count:6} messages in {elapsed:7.3f}s ({count / elapsed:9.0f} msg/s)")
+
+        start = time.perf_counter()
+        for message in messages("single", single):
+            await ac.post("/v1/threads/single/messages", json=message)
+        elapsed = time.perf_counter() - start
+        print(f"one per request: {single:6} messages in {elapsed:7.3f}s ({single / elapsed:9.0f} msg/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--single", type=int, default=500,
+                        help="messages to import one request at a time for comparison")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        create_database(tmp)
+        asyncio.run(run(args.messages, args.single))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/bench_message_pagination.py
+# Seeds one thread with many messages and times GET /v1/threads/{id}/messages
+# for pages taken at increasing depths of the thread. With the
+# (thread_id, created_at) index and keyset cursors every page costs the same.
+#
+#   python -m benchmarks.bench_message_pagination --messages 100000
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from httpx import AsyncClient
+
+from app.main import app
+from benchmarks.common import create_database, seed_messages
+
+THREAD_ID = "bench-thread"
+
+
+async def time_page(ac, params: dict, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await ac.get(f"/v1/threads/{THREAD_ID}/messages", params=params)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return statistics.median(timings) * 1000
+
+
+async def run(count: int, limit: int, repeat: int):
+    async with AsyncClient(app=app, base_url="http://bench") as ac:
+        print(f"{'cursor depth':>12}  {'median ms/page':>14}")
+        depth = 0
+        while depth < count:
+            params = {"limit": limit, "order": "asc"}
+            if depth:
+                params["after"] = f"msg-{depth - 1:07d}"
+            print(f"{depth:>12}  {await time_page(ac, params, repeat):>14.2f}")
+            depth = depth * 10 if depth else 10
+        params = {"limit": limit, "order": "asc", "after": f"msg-{count - limit - 1:07d}"}
+        print(f"{'last page':>12}  {await time_page(ac, params, repeat):>14.2f}")
+        params = {"limit": limit, "order": "desc"}
+        print(f"{'newest':>12}  {await time_page(ac, params, repeat):>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = create_database(tmp)
+        start = time.perf_counter()
+        seed_messages(database, THREAD_ID, args.messages)
+        print(f"seeded {args.messages} messages in {time.perf_counter() - start:.1f}s")
+        asyncio.run(run(args.messages, args.limit, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_micro_batching.py
+# Throughput of LLMServiceConnector under concurrent load for a range of
+# micro-batch sizes, using a tiny local model (downloaded on first run).
+#
+#   python -m benchmarks.bench_micro_batching --model sshleifer/tiny-gpt2 --requests 256
+#
+# --synthetic replaces the model with a stand-in whose cost is a fixed
+# per-call overhead plus a per-item cost, for machines without transformers.
+import argparse
+import asyncio
+import functools
+import time
+
+from app.services.batching import MicroBatcher
+from benchmarks.common import summarize
+
+
+def synthetic_generator(call_overhead: float, per_item: float):
+    def generate(prompts):
+        # Busy-wait so the cost is CPU time like a real forward pass.
+        deadline = time.perf_counter() + call_overhead + per_item * len(prompts)
+        while time.perf_counter() < deadline:
+            pass
+        return [f"{prompt} ..." for prompt in prompts]
+    return generate
+
+
+def model_generator(model: str, max_length: int):
+    from app.services.connector import LLMServiceConnector
+
+    connector = LLMServiceConnector({"model": model, "max_length": max_length})
+    # The blocking pipeline call itself; the batcher runs it on its own thread.
+    return functools.partial(LLMServiceConnector.generate_batch.cpu_bound, connector)
+
+
+async def drive(batcher: MicroBatcher, requests: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await batcher.submit(f"Prompt number {i}:")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+async def main(args):
+    if args.synthetic:
+        generate = synthetic_generator(args.call_overhead_ms / 1000, args.per_item_ms / 1000)
+    else:
+        generate = model_generator(args.model, args.max_length)
+    generate(["warm up"])
+
+    print(f"{'batch':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'avg fill':>9}")
+    for batch_size in args.batch_sizes:
+        batcher = MicroBatcher(generate, max_batch_size=batch_size, max_wait_ms=args.wait_ms)
+        elapsed, latencies = await drive(batcher, args.requests, args.concurrency)
+        await batcher.close()
+        stats = summarize(latencies)
+        print(
+            f"{batch_size:>6} {args.requests / elapsed:>9.1f} {stats['p50_ms']:>9.1f} "
+            f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {batcher.items / batcher.batches:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2")
+    parser.add_argument("--max-length", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--wait-ms", type=float, default=10.0)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--call-overhead-ms", type=float, default=20.0)
+    parser.add_argument("--per-item-ms", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,76 @@
+# benchmarks/bench_request_overhead.py
+# Per-request cost of the old connector-attaching HTTP middleware compared
+# with resolving connectors through the startup registry and Depends, on an
+# empty route served in-process.
+#
+#   python -m benchmarks.bench_request_overhead --requests 5000 --connectors 5
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import Depends, FastAPI, Request
+
+from app.services.registry import ConnectorRegistry
+from benchmarks.common import summarize
+
+
+def middleware_app(connectors: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def add_connector_to_request(request: Request, call_next):
+        for name, instance in connectors.items():
+            setattr(request.state, name.lower(), instance)
+        return await call_next(request)
+
+    @app.get("/empty")
+    async def empty(request: Request):
+        return {"connector": getattr(request.state, "connector0", None) is not None}
+
+    return app
+
+
+def dependency_app(connectors: dict) -> FastAPI:
+    app = FastAPI()
+    registry = ConnectorRegistry()
+    for name, instance in connectors.items():
+        registry.register(name, instance)
+
+    def connector0():
+        return registry.require("connector0")
+
+    @app.get("/empty")
+    async def empty(connector=Depends(connector0)):
+        return {"connector": connector is not None}
+
+    return app
+
+
+async def drive(app: FastAPI, requests: int):
+    latencies = []
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for _ in range(200):
+            await client.get("/empty")
+        start = time.perf_counter()
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            await client.get("/empty")
+            latencies.append(time.perf_counter() - t0)
+    return time.perf_counter() - start, latencies
+
+
+async def main(args):
+    connectors = {f"connector{i}": object() for i in range(args.connectors)}
+    print(f"{'variant':>12} {'req/s':>9} {'p50 us':>9} {'p99 us':>9}")
+    for name, app in (("middleware", middleware_app(connectors)), ("depends", dependency_app(connectors))):
+        elapsed, latencies = await drive(app, args.requests)
+        stats = summarize(latencies)
+        print(f"{name:>12} {args.requests / elapsed:>9.0f} {stats['p50_ms'] * 1000:>9.0f} {stats['p99_ms'] * 1000:>9.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--connectors", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
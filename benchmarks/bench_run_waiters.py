@@ -0,0 +1,102 @@
+# benchmarks/bench_run_waiters.py
+# Clients waiting for their runs to finish: "poll" asks GET
+# /v1/threads/{id}/runs/{run_id} every --interval seconds, "long-poll" asks
+# once with ?wait=30. The runs all complete --after seconds in; reported are
+# the database reads made by the waiters and how long after completion each
+# client learned of it.
+#
+#   python -m benchmarks.bench_run_waiters --waiters 5000 --interval 1
+import argparse
+import asyncio
+import tempfile
+import time
+
+from httpx import AsyncClient
+
+from app.main import app
+from app.models import Run, RunDB
+from app.services.run_events import run_events
+from benchmarks.common import create_database, summarize
+
+THREADS = 50
+
+
+def run_ids(waiters: int):
+    return [(f"thread-{i % THREADS}", f"run-{i}") for i in range(waiters)]
+
+
+def seed_runs(database, waiters: int):
+    with database.engine.begin() as conn:
+        conn.execute(RunDB.get_table().insert(), [
+            {"id": run_id, "thread_id": thread_id, "assistant_id": "a1", "status": "in_progress",
+             "created_at": 1_700_000_000.0}
+            for thread_id, run_id in run_ids(waiters)
+        ])
+
+
+async def poll(ac: AsyncClient, thread_id: str, run_id: str, interval: float) -> float:
+    while True:
+        response = await ac.get(f"/v1/threads/{thread_id}/runs/{run_id}")
+        if response.json()["status"] == "completed":
+            return time.perf_counter()
+        await asyncio.sleep(interval)
+
+
+async def long_poll(ac: AsyncClient, thread_id: str, run_id: str, interval: float) -> float:
+    while True:
+        response = await ac.get(f"/v1/threads/{thread_id}/runs/{run_id}", params={"wait": 30})
+        if response.json()["status"] == "completed":
+            return time.perf_counter()
+
+
+async def run(waiter, waiters: int, interval: float, after: float) -> dict:
+    table = RunDB.get_table()
+    await RunDB.__metadata__.database.execute(table.update().values(status="in_progress", result=None))
+    reads = 0
+    get = RunDB.get
+
+    async def counted_get(**kwargs):
+        nonlocal reads
+        reads += 1
+        return await get(**kwargs)
+
+    RunDB.get = counted_get
+    try:
+        async with AsyncClient(app=app, base_url="http://bench", timeout=120) as ac:
+            tasks = [asyncio.create_task(waiter(ac, thread_id, run_id, interval))
+                     for thread_id, run_id in run_ids(waiters)]
+            await asyncio.sleep(after)
+            await RunDB.__metadata__.database.execute(table.update().values(status="completed", result="done"))
+            completed = time.perf_counter()
+            for thread_id, run_id in run_ids(waiters):
+                run_events.publish(Run(id=run_id, thread_id=thread_id, assistant_id="a1",
+                                       status="completed", result="done"))
+            learned = await asyncio.gather(*tasks)
+    finally:
+        RunDB.get = get
+    return {"reads": reads, **summarize([moment - completed for moment in learned])}
+
+
+async def main_async(waiters: int, interval: float, after: float):
+    print(f"{'variant':>10}  {'db reads':>8}  {'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}")
+    for name, waiter in (("poll", poll), ("long-poll", long_poll)):
+        result = await run(waiter, waiters, interval, after)
+        print(f"{name:>10}  {result['reads']:>8}  {result['p50_ms']:>8.1f}  "
+              f"{result['p95_ms']:>8.1f}  {result['p99_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--waiters", type=int, default=5000)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--after", type=float, default=10.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = create_database(tmp)
+        seed_runs(database, args.waiters)
+        asyncio.run(main_async(args.waiters, args.interval, args.after))
+
+
+if __name__ == "__main__":
+    main()
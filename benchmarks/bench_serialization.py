@@ -0,0 +1,81 @@
+# benchmarks/bench_serialization.py
+# CPU time per request of GET /v1/threads/{id}/messages on a thread of 5000
+# messages. "models" is the route as it was before plain-row reads: a model
+# built per row, then validated and encoded again by FastAPI. "validated" is
+# the current route with [responses] fast off, "fast" with it on, and
+# "fast, 3 fields" also asks for ?fields=id,role,content.
+#
+#   python -m benchmarks.bench_serialization --messages 5000 --limit 100
+import argparse
+import asyncio
+import tempfile
+import time
+
+from fastapi import FastAPI, Query
+from httpx import AsyncClient
+from sqlalchemy.sql.expression import ClauseList
+
+from app.main import app
+from app.models import MessageDB, MessageList
+from app.services.responses import response_settings
+from benchmarks.common import create_database, seed_messages
+
+THREAD_ID = "bench-thread"
+
+
+def models_app() -> FastAPI:
+    models = FastAPI()
+
+    @models.get("/v1/threads/{thread_id}/messages", response_model=MessageList)
+    async def get_messages(thread_id: str, limit: int = Query(20, ge=1, le=100)):
+        table = MessageDB.get_table()
+        messages = await MessageDB.filter(
+            thread_id=thread_id, order_by=ClauseList(table.c.created_at.desc(), table.c.id.desc()), limit=limit + 1
+        )
+        return MessageList(data=messages[:limit], first_id=messages[0].id, last_id=messages[limit - 1].id,
+                           has_more=len(messages) > limit)
+
+    return models
+
+
+async def cpu_per_request(target: FastAPI, params: dict, requests: int) -> tuple:
+    async with AsyncClient(app=target, base_url="http://bench") as ac:
+        for _ in range(20):
+            response = await ac.get(f"/v1/threads/{THREAD_ID}/messages", params=params)
+            assert response.status_code == 200, response.text
+        began = time.process_time()
+        for _ in range(requests):
+            await ac.get(f"/v1/threads/{THREAD_ID}/messages", params=params)
+        return (time.process_time() - began) / requests * 1000, len(response.content)
+
+
+async def run(limit: int, requests: int):
+    page = {"limit": limit}
+    cases = [
+        ("models", models_app(), False, page),
+        ("validated", app, False, page),
+        ("fast", app, True, page),
+        ("fast, 3 fields", app, True, {**page, "fields": "id,role,content"}),
+    ]
+    print(f"{'variant':>16}  {'cpu ms/request':>14}  {'bytes':>7}")
+    for name, target, fast, params in cases:
+        response_settings.fast = fast
+        cpu_ms, size = await cpu_per_request(target, params, requests)
+        print(f"{name:>16}  {cpu_ms:>14.2f}  {size:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = create_database(tmp)
+        seed_messages(database, THREAD_ID, args.messages)
+        asyncio.run(run(args.limit, args.requests))
+
+
+if __name__ == "__main__":
+    main()
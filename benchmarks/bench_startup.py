@@ -0,0 +1,89 @@
+# benchmarks/bench_startup.py
+# Startup cost of the app with a directory of plugin connectors whose modules
+# are slow to import (each sleeps, standing in for imports like transformers).
+# Runs fresh interpreters and reports the time to import app.main, the time
+# to the first served request, and the slowest imports from -X importtime.
+#
+#   python -m benchmarks.bench_startup --plugins 10 --import-cost 0.2
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+PLUGIN = '''import time
+from app.services.interfaces import BaseConnector
+
+time.sleep({cost})
+
+
+class Plugin{index}Connector(BaseConnector):
+    def initialize(self, config):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def generate_text(self, prompt):
+        return prompt
+'''
+
+CLIENT = '''
+import asyncio, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from httpx import AsyncClient
+
+async def first_request():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        async with AsyncClient(app=app.main.app, base_url="http://bench") as ac:
+            response = await ac.get("/v1/assistants/missing")
+            assert response.status_code == 404, response.text
+
+asyncio.run(first_request())
+print(f"{(imported - start) * 1000:.1f} {(time.perf_counter() - start) * 1000:.1f}")
+'''
+
+
+def run(env: dict, *args: str) -> subprocess.CompletedProcess:
+    result = subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(result.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plugins", type=int, default=10)
+    parser.add_argument("--import-cost", type=float, default=0.2, help="seconds each plugin module takes to import")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as plugin_dir:
+        for index in range(args.plugins):
+            with open(os.path.join(plugin_dir, f"plugin_{index}.py"), "w") as f:
+                f.write(PLUGIN.format(cost=args.import_cost, index=index))
+        env = {**os.environ, "PYGENTIC_PLUGIN_DIR": plugin_dir}
+
+        print(f"{'run':>5}  {'import app.main ms':>18}  {'first request ms':>16}")
+        for index in range(args.runs):
+            imported, first = run(env, "-c", CLIENT).stdout.split()
+            print(f"{index + 1:>5}  {imported:>18}  {first:>16}")
+
+        timings = []
+        for line in run(env, "-X", "importtime", "-c", "import app.main").stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[1].strip().isdigit():
+                timings.append((int(parts[1]), parts[2].rstrip()))
+        print(f"\nslowest imports (cumulative us):")
+        for cumulative, name in sorted(timings, reverse=True)[:args.top]:
+            print(f"{cumulative:>10}  {name}")
+
+
+if __name__ == "__main__":
+    main()
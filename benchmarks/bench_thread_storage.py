@@ -0,0 +1,63 @@
+# benchmarks/bench_thread_storage.py
+# Creates a thread with many messages and times GET /v1/threads/{id} and
+# appending a message to it. The thread cache is bypassed so every read goes
+# to the database. Threads keep only a message count and the last message,
+# so both stay flat as the thread grows.
+#
+#   python -m benchmarks.bench_thread_storage --messages 10000
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from httpx import AsyncClient
+
+from app.main import app
+from app.services.cache import thread_cache
+from benchmarks.common import create_database
+
+THREAD_ID = "bench-thread"
+
+
+async def timed(request, repeat: int) -> float:
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        response = await request(i)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return statistics.median(timings) * 1000
+
+
+async def run(count: int, repeat: int):
+    async with AsyncClient(app=app, base_url="http://bench", timeout=120) as ac:
+        start = time.perf_counter()
+        response = await ac.post("/v1/threads", json={
+            "id": THREAD_ID, "assistant_id": "bench", "messages": [f"message {i}" for i in range(count)],
+        })
+        assert response.status_code == 200, response.text
+        print(f"created thread with {count} messages in {time.perf_counter() - start:.2f}s")
+
+        get_ms = await timed(lambda i: ac.get(f"/v1/threads/{THREAD_ID}"), repeat)
+        append_ms = await timed(lambda i: ac.post(f"/v1/threads/{THREAD_ID}/messages", json={
+            "id": f"bench-append-{i}", "thread_id": THREAD_ID, "role": "user", "content": "hello",
+        }), repeat)
+        print(f"get_thread  median {get_ms:.2f} ms")
+        print(f"append      median {append_ms:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    thread_cache.backend = None
+    with tempfile.TemporaryDirectory() as tmp:
+        create_database(tmp)
+        asyncio.run(run(args.messages, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
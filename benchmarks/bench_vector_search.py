@@ -0,0 +1,74 @@
+# benchmarks/bench_vector_search.py
+# Query latency of the memory-mapped vector index at a million vectors:
+# single queries across all threads, batches of queries scored together,
+# and queries within one thread. Vectors are random unit vectors, written in
+# chunks so building the index does not need them all in memory.
+#
+#   python -m benchmarks.bench_vector_search --vectors 1000000 --dimensions 256
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.embeddings import normalize
+from app.services.vector_index import VectorIndex
+from benchmarks.common import summarize
+
+
+def build(directory: str, count: int, dimensions: int, threads: int, chunk: int = 100_000) -> VectorIndex:
+    index = VectorIndex(directory, dimensions)
+    rng = np.random.default_rng(0)
+    for start in range(0, count, chunk):
+        size = min(chunk, count - start)
+        index.add(
+            [f"msg_{i:032x}" for i in range(start, start + size)],
+            [f"thread-{i % threads}" for i in range(start, start + size)],
+            normalize(rng.standard_normal((size, dimensions), dtype=np.float32)),
+        )
+    return index
+
+
+def measure(search, queries: np.ndarray, batch: int, rounds: int) -> dict:
+    latencies = []
+    for round_ in range(rounds):
+        start = (round_ * batch) % len(queries)
+        began = time.perf_counter()
+        search(queries[start:start + batch])
+        # Per query, so batches compare with single queries.
+        latencies.append((time.perf_counter() - began) / batch)
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=1_000_000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=1000, help="threads the vectors are spread over")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        began = time.perf_counter()
+        index = build(directory, args.vectors, args.dimensions, args.threads)
+        print(f"built {len(index)} x {args.dimensions} vectors in {time.perf_counter() - began:.1f}s "
+              f"({len(index) * args.dimensions * 4 / 2 ** 20:.0f} MiB)")
+        queries = normalize(np.random.default_rng(1).standard_normal((256, args.dimensions), dtype=np.float32))
+
+        # Warm the page cache, as a long-running server would have it.
+        index.search(queries[:1], args.k)
+        cases = [
+            ("all threads, 1 query", lambda q: index.search(q, args.k), 1),
+            (f"all threads, {args.batch} per batch", lambda q: index.search(q, args.k), args.batch),
+            ("one thread, 1 query", lambda q: index.search(q, args.k, thread_id="thread-7"), 1),
+        ]
+        print(f"{'case':>28}  {'p50 ms/query':>12}  {'p95 ms/query':>12}")
+        for name, search, batch in cases:
+            result = measure(search, queries, batch, args.rounds)
+            print(f"{name:>28}  {result['p50_ms']:>12.2f}  {result['p95_ms']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
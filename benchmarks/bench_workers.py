@@ -0,0 +1,197 @@
+# benchmarks/bench_workers.py
+# Throughput of `pygentic --workers N` for several N. Each server runs in its
+# own directory with a copy of connectors.toml pointing at the stub upstream
+# and a fresh SQLite database, and is loaded over real sockets by several
+# client processes:
+#
+#   messages  GET a page of 100 messages (CPU-bound in the server)
+#   generate  GET /generate_text against an upstream with --upstream-latency
+#   runs      queue --runs runs and wait until every one has completed; the
+#             runs are claimed from the shared queue by all workers
+#
+#   python -m benchmarks.bench_workers --workers 1 2 4 --duration 10
+#
+# Scaling is bounded by the cores available to the server and the clients
+# together; the number of cores is printed with the results.
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import toml
+
+from benchmarks.common import create_database, seed_messages, summarize
+from benchmarks.stub_upstream import StubUpstream, free_port
+
+ROOT = Path(__file__).resolve().parent.parent
+THREAD_ID = "bench-thread"
+# Runs get a short thread, so they are bound by the upstream and the queue.
+RUN_THREAD_ID = "bench-runs"
+
+
+def write_config(directory: str, upstream: str):
+    config = toml.load(ROOT / "connectors.toml")
+    config["connectors"]["database"]["url"] = f"sqlite:///{directory}/bench.db"
+    config["connectors"]["openai_assistant"]["base_url"] = upstream
+    config["connectors"]["openai_assistant"]["http2"] = False
+    config["runs"].update(queue_size=10 ** 9, max_concurrent_per_assistant=10 ** 6, poll_interval=0.05)
+    with open(os.path.join(directory, "connectors.toml"), "w") as f:
+        toml.dump(config, f)
+
+
+def start_server(directory: str, workers: int, port: int) -> subprocess.Popen:
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    server = subprocess.Popen(
+        [sys.executable, "-c", "from app.main import run; run()",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(server.stderr.read().decode())
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/v1/threads/{THREAD_ID}").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    sys.exit("server did not start")
+
+
+def stop_server(server: subprocess.Popen):
+    server.send_signal(signal.SIGINT)
+    try:
+        server.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+async def _load(url: str, concurrency: int, duration: float):
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def user():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def load_client(args):
+    return asyncio.run(_load(*args))
+
+
+def measure(url: str, clients: int, concurrency: int, duration: float) -> dict:
+    with multiprocessing.get_context("spawn").Pool(clients) as pool:
+        results = pool.map(load_client, [(url, concurrency, duration)] * clients)
+    latencies = [latency for result in results for latency in result[0]]
+    return {
+        "requests": len(latencies),
+        "errors": sum(result[1] for result in results),
+        "throughput_rps": len(latencies) / duration,
+        **summarize(latencies),
+    }
+
+
+def measure_runs(base: str, directory: str, count: int) -> dict:
+    async def submit():
+        async with httpx.AsyncClient(timeout=30) as client:
+            for index in range(count):
+                response = await client.post(f"{base}/v1/threads/{RUN_THREAD_ID}/runs", json={
+                    "id": f"run-{index}", "thread_id": RUN_THREAD_ID,
+                    "assistant_id": f"assistant-{index % 50}", "status": "queued",
+                })
+                response.raise_for_status()
+
+    start = time.perf_counter()
+    asyncio.run(submit())
+    connection = sqlite3.connect(f"{directory}/bench.db")
+    try:
+        while True:
+            done = connection.execute(
+                "SELECT count(*) FROM RunDB WHERE status IN ('completed', 'failed')"
+            ).fetchone()[0]
+            if done >= count:
+                break
+            time.sleep(0.02)
+        elapsed = time.perf_counter() - start
+        failed = connection.execute("SELECT count(*) FROM RunDB WHERE status = 'failed'").fetchone()[0]
+    finally:
+        connection.close()
+    return {"requests": count, "errors": failed, "throughput_rps": count / elapsed, "p50_ms": None, "p95_ms": None}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="open requests per client process")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=400)
+    parser.add_argument("--upstream-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"cores: {os.cpu_count()}")
+    print(f"{'workers':>7}  {'scenario':>8}  {'req/s':>8}  {'speedup':>7}  {'p50 ms':>7}  {'p95 ms':>7}  {'errors':>6}")
+    baseline = {}
+    with StubUpstream(latency=args.upstream_latency) as upstream:
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as directory:
+                write_config(directory, upstream.base_url)
+                database = create_database(directory)
+                with database.engine.begin() as connection:
+                    for thread_id, count in ((THREAD_ID, args.messages), (RUN_THREAD_ID, 10)):
+                        connection.exec_driver_sql(
+                            'INSERT INTO "ThreadDB" (id, assistant_id, message_count) VALUES (?, ?, ?)',
+                            (thread_id, "assistant-0", count),
+                        )
+                seed_messages(database, THREAD_ID, args.messages)
+                seed_messages(database, RUN_THREAD_ID, 10, prefix="run-msg")
+                database.engine.dispose()
+
+                port = free_port()
+                base = f"http://127.0.0.1:{port}"
+                server = start_server(directory, workers, port)
+                try:
+                    results = {
+                        "messages": measure(f"{base}/v1/threads/{THREAD_ID}/messages?limit=100",
+                                            args.clients, args.concurrency, args.duration),
+                        "generate": measure(f"{base}/generate_text?prompt=hello",
+                                            args.clients, args.concurrency, args.duration),
+                        "runs": measure_runs(base, directory, args.runs),
+                    }
+                finally:
+                    stop_server(server)
+
+            for scenario, result in results.items():
+                baseline.setdefault(scenario, result["throughput_rps"])
+                p50 = f"{result['p50_ms']:.1f}" if result["p50_ms"] is not None else "-"
+                p95 = f"{result['p95_ms']:.1f}" if result["p95_ms"] is not None else "-"
+                print(f"{workers:>7}  {scenario:>8}  {result['throughput_rps']:>8.1f}  "
+                      f"{result['throughput_rps'] / baseline[scenario]:>6.2f}x  {p50:>7}  {p95:>7}  {result['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
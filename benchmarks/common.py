@@ -0,0 +1,34 @@
+# benchmarks/common.py
+import statistics
+
+from app.models import MessageDB
+from app.services.database import ModelDatabase, create_pool, setup_models
+
+
+def create_database(directory: str) -> ModelDatabase:
+    return setup_models(create_pool(f"sqlite:///{directory}/bench.db", {}))
+
+
+def seed_messages(database: ModelDatabase, thread_id: str, count: int, prefix: str = "msg"):
+    # Straight through the sync engine: seeding is setup, not what is measured.
+    table = MessageDB.get_table()
+    with database.engine.begin() as conn:
+        for start in range(0, count, 10_000):
+            conn.execute(table.insert(), [
+                {"id": f"{prefix}-{i:07d}", "thread_id": thread_id, "role": "user",
+                 "content": f"message {i}", "created_at": 1_700_000_000.0 + i}
+                for i in range(start, min(count, start + 10_000))
+            ])
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(latencies) -> dict:
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
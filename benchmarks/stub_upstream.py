@@ -0,0 +1,73 @@
+# benchmarks/stub_upstream.py
+# A tiny OpenAI-compatible upstream used by the benchmarks so they can run
+# offline against a real socket.
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+app = FastAPI()
+app.state.latency = 0.0
+
+
+@app.post("/v1/completions")
+async def completions(body: dict):
+    if app.state.latency:
+        await asyncio.sleep(app.state.latency)
+    text = f"echo: {body.get('prompt', '')}"
+    if body.get("stream"):
+        async def events():
+            for word in text.split(" "):
+                yield f'data: {json.dumps({"choices": [{"text": word + " "}]})}\n\n'
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+    return {"choices": [{"text": text}]}
+
+
+@app.post("/v1/serverless")
+async def serverless(body: dict):
+    await asyncio.sleep(body.get("latency", app.state.latency))
+    return {"echo": body.get("id")}
+
+
+@app.post("/v1/assistants")
+async def create_assistant(body: dict):
+    return body
+
+
+@app.get("/v1/assistants/{assistant_id}")
+async def get_assistant(assistant_id: str):
+    return {"id": assistant_id}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class StubUpstream:
+    """Runs the stub app with uvicorn in a background thread."""
+
+    def __init__(self, latency: float = 0.0, port: int = None):
+        self.port = port or free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+        app.state.latency = latency
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
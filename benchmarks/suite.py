@@ -0,0 +1,328 @@
+"""Load-tests every /v1 route and /generate_text in-process against the stub
+upstream, at several concurrency levels and thread sizes, and writes the
+results as JSON so runs on different commits can be compared.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline results.json --tolerance 0.2
+
+With --baseline the run exits with status 1 if any scenario's p95 latency
+grew, or its throughput dropped, by more than the tolerance.
+"""
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from httpx import AsyncClient
+
+from app.main import app
+from app.services.default_connector import OpenAIAssistantConnector
+from app.services.open_interpreter_service import serverless_service
+from app.services.registry import registry
+from app.services.run_scheduler import scheduler
+from app.services.search import semantic_search
+from benchmarks.common import create_database, seed_messages, summarize
+from benchmarks.stub_upstream import StubUpstream
+
+ASSISTANT_ID = "bench-assistant"
+SMALL_THREAD = "bench-small"
+BATCH_THREAD = "bench-batch"
+RUN_ID = "bench-run"
+FANOUT_PAYLOADS = 20
+IMPORT_THREAD = "bench-import"
+IMPORT_ROWS = 100
+
+# A request: (method, url, keyword arguments for httpx).
+Request = Tuple[str, str, dict]
+
+
+@dataclass
+class Scenario:
+    name: str
+    request: Callable[[int], Request]
+    size: Optional[int] = None
+    expect: Tuple[int, ...] = (200,)
+
+
+@dataclass
+class Result:
+    scenario: str
+    size: Optional[int]
+    concurrency: int
+    requests: int
+    errors: int
+    throughput_rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.scenario}[size={self.size},c={self.concurrency}]"
+
+
+def thread_id(size: int) -> str:
+    return f"bench-thread-{size}"
+
+
+def import_body(batch: int) -> bytes:
+    """An export of ``IMPORT_ROWS`` new messages, numbered by ``batch``."""
+    lines = (
+        json.dumps({"table": "MessageDB", "data": {
+            "id": f"bench-i-{batch}-{n}", "thread_id": IMPORT_THREAD, "role": "user", "content": "imported",
+            "created_at": 1_700_000_000.0 + n,
+        }})
+        for n in range(IMPORT_ROWS)
+    )
+    return gzip.compress("\n".join(lines).encode())
+
+
+def fixed_scenarios() -> List[Scenario]:
+    ids = itertools.count()
+    return [
+        Scenario("create_assistant", lambda i: ("POST", "/v1/assistants", {
+            "json": {"id": f"bench-a-{next(ids)}", "name": "bench", "model": "stub"}})),
+        Scenario("get_assistant", lambda i: ("GET", f"/v1/assistants/{ASSISTANT_ID}", {})),
+        Scenario("create_thread", lambda i: ("POST", "/v1/threads", {
+            "json": {"id": f"bench-t-{next(ids)}", "assistant_id": ASSISTANT_ID, "messages": []}})),
+        Scenario("add_messages_batch", lambda i: ("POST", f"/v1/threads/{BATCH_THREAD}/messages/batch", {
+            "json": {"messages": [
+                {"id": f"bench-b-{next(ids)}", "role": "user", "content": "batched"} for _ in range(50)
+            ]}})),
+        Scenario("create_run", lambda i: ("POST", f"/v1/threads/{SMALL_THREAD}/runs", {
+            "json": {"id": f"bench-r-{next(ids)}", "thread_id": SMALL_THREAD, "assistant_id": ASSISTANT_ID,
+                     "status": "queued"}})),
+        Scenario("create_run_stream", lambda i: ("POST", f"/v1/threads/{SMALL_THREAD}/runs", {
+            "params": {"stream": "true"},
+            "json": {"id": f"bench-s-{next(ids)}", "thread_id": SMALL_THREAD, "assistant_id": ASSISTANT_ID,
+                     "status": "queued"}})),
+        Scenario("get_run", lambda i: ("GET", f"/v1/threads/{SMALL_THREAD}/runs/{RUN_ID}", {})),
+        Scenario("generate_text", lambda i: ("GET", "/generate_text", {"params": {"prompt": f"prompt {i}"}})),
+        Scenario("generate_text_stream", lambda i: ("GET", "/generate_text/stream", {"params": {"prompt": f"prompt {i}"}})),
+        Scenario("fanout", lambda i: ("POST", "/v1/fanout", {
+            "json": {"payloads": [{"id": f"bench-f-{i}-{n}"} for n in range(FANOUT_PAYLOADS)]}})),
+        Scenario("import", lambda i: ("POST", "/v1/import", {"content": import_body(next(ids))})),
+    ]
+
+
+def search_scenarios() -> List[Scenario]:
+    return [
+        Scenario("search_messages", lambda i: ("GET", "/v1/messages/search", {
+            "params": {"q": f"message {i}", "limit": 10}})),
+        Scenario("search_thread_messages", lambda i: ("GET", f"/v1/threads/{SMALL_THREAD}/messages/search", {
+            "params": {"q": f"message {i % 10}", "limit": 10}})),
+    ]
+
+
+async def start_search(path: str):
+    """Turns semantic search on, with the hash embedder, once every seeded
+    message is indexed. Only the search scenarios run with it, so the other
+    routes are measured as the shipped config runs them."""
+    semantic_search.configure({"enabled": True, "path": path, "embedder": "hash"})
+    await semantic_search.start()
+    # The backfill of the seeded messages, if this process claimed it.
+    await asyncio.gather(*semantic_search.tasks[1:])
+
+
+async def stop_search():
+    await semantic_search.stop()
+    semantic_search.index = None
+    semantic_search.enabled = False
+
+
+def sized_scenarios(size: int) -> List[Scenario]:
+    ids = itertools.count()
+    middle = f"{thread_id(size)}-{size // 2:07d}"
+    return [
+        Scenario("get_thread", lambda i: ("GET", f"/v1/threads/{thread_id(size)}", {}), size),
+        Scenario("list_messages", lambda i: ("GET", f"/v1/threads/{thread_id(size)}/messages", {}), size),
+        Scenario("list_messages_deep", lambda i: ("GET", f"/v1/threads/{thread_id(size)}/messages", {
+            "params": {"after": middle, "order": "asc"}}), size),
+        Scenario("export_thread", lambda i: ("GET", "/v1/export", {"params": {"thread_id": thread_id(size)}}), size),
+        Scenario("add_message", lambda i: ("POST", f"/v1/threads/{thread_id(size)}/messages", {
+            "json": {"id": f"{thread_id(size)}-new-{next(ids)}", "thread_id": thread_id(size),
+                     "role": "user", "content": "hello"}}), size),
+    ]
+
+
+async def drive(client: AsyncClient, scenario: Scenario, requests: int, concurrency: int, warmup: int) -> Result:
+    for i in range(warmup):
+        method, url, kwargs = scenario.request(i)
+        await client.request(method, url, **kwargs)
+
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            method, url, kwargs = scenario.request(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in scenario.expect:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stats = summarize(latencies)
+    return Result(
+        scenario=scenario.name, size=scenario.size, concurrency=concurrency, requests=requests, errors=errors,
+        throughput_rps=requests / elapsed, p50_ms=stats["p50_ms"], p95_ms=stats["p95_ms"], p99_ms=stats["p99_ms"],
+    )
+
+
+async def prepare(client: AsyncClient, database, sizes: List[int]):
+    async def create(url: str, body: dict):
+        response = await client.post(url, json=body)
+        assert response.status_code == 200, response.text
+
+    await create("/v1/assistants", {"id": ASSISTANT_ID, "name": "bench", "model": "stub"})
+    await create("/v1/threads", {"id": SMALL_THREAD, "assistant_id": ASSISTANT_ID, "messages": []})
+    seed_messages(database, SMALL_THREAD, 10, prefix=SMALL_THREAD)
+    # Batches go to their own thread so they don't grow the one runs read.
+    await create("/v1/threads", {"id": BATCH_THREAD, "assistant_id": ASSISTANT_ID, "messages": []})
+    await create("/v1/threads", {"id": IMPORT_THREAD, "assistant_id": ASSISTANT_ID, "messages": []})
+    await create(f"/v1/threads/{SMALL_THREAD}/runs", {
+        "id": RUN_ID, "thread_id": SMALL_THREAD, "assistant_id": ASSISTANT_ID, "status": "queued"})
+    for size in sizes:
+        await create("/v1/threads", {"id": thread_id(size), "assistant_id": ASSISTANT_ID, "messages": []})
+        seed_messages(database, thread_id(size), size, prefix=thread_id(size))
+
+
+async def run_suite(
+    sizes: List[int],
+    concurrency: List[int],
+    requests: int,
+    warmup: int = 10,
+    upstream_latency: float = 0.0,
+    only: Optional[List[str]] = None,
+    directory: Optional[str] = None,
+    log: Callable[[str], None] = print,
+) -> List[Result]:
+    with tempfile.TemporaryDirectory() as tmp, StubUpstream(latency=upstream_latency) as upstream:
+        database = create_database(directory or tmp)
+        connector = OpenAIAssistantConnector()
+        connector.initialize({"base_url": upstream.base_url, "http2": False})
+        registry.register("openaiassistantconnector", connector)
+        serverless_service.endpoint = f"{upstream.base_url}/serverless"
+        scheduler.configure({"queue_size": 10 ** 9})
+        await scheduler.start(connector)
+        results = []
+        try:
+            async with AsyncClient(app=app, base_url="http://bench", timeout=120) as client:
+                await prepare(client, database, sizes)
+                scenarios = fixed_scenarios() + [s for size in sizes for s in sized_scenarios(size)]
+                searches = search_scenarios()
+                for scenario in scenarios + searches:
+                    if only and scenario.name not in only:
+                        continue
+                    if scenario in searches and semantic_search.index is None:
+                        await start_search(os.path.join(directory or tmp, "search_index"))
+                    for level in concurrency:
+                        result = await drive(client, scenario, requests, level, warmup)
+                        results.append(result)
+                        log(format_result(result))
+        finally:
+            await stop_search()
+            await scheduler.stop()
+            await connector.disconnect()
+        return results
+
+
+def format_result(result: Result) -> str:
+    return (
+        f"{result.scenario:<22} {str(result.size or '-'):>7} {result.concurrency:>5} "
+        f"{result.throughput_rps:>9.1f} {result.p50_ms:>8.2f} {result.p95_ms:>8.2f} {result.p99_ms:>8.2f} {result.errors:>6}"
+    )
+
+
+HEADER = f"{'scenario':<22} {'size':>7} {'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}"
+
+
+def metadata(args: dict) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": args,
+    }
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float, noise_ms: float = 1.0) -> List[str]:
+    """Regressions of ``results`` against ``baseline`` (both as written to
+    JSON). Latency changes smaller than ``noise_ms`` are ignored."""
+    previous: Dict[Tuple, dict] = {(r["scenario"], r["size"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["size"], result["concurrency"]))
+        if before is None:
+            continue
+        label = f"{result['scenario']}[size={result['size']},c={result['concurrency']}]"
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance) and result["p95_ms"] - before["p95_ms"] > noise_ms:
+            regressions.append(f"{label}: p95 {before['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+        if result["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: throughput {before['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} req/s"
+            )
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{label}: errors {before['errors']} -> {result['errors']}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--upstream-latency", type=float, default=0.0, help="seconds the stub LLM waits per call")
+    parser.add_argument("--only", nargs="+", help="run only these scenarios")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    print(HEADER)
+    results = asyncio.run(run_suite(
+        args.sizes, args.concurrency, args.requests, args.warmup, args.upstream_latency, args.only
+    ))
+    report = {"meta": metadata(vars(args)), "results": [asdict(result) for result in results]}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = [r.key for r in results if r.errors]
+    for key in failed:
+        print(f"ERRORS: {key}", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(report["results"], baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
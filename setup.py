@@ -12,15 +12,20 @@ setup(
     install_requires=[
         "fastapi",
         "pydantic",
-        "httpx",
+        "httpx[http2]",
         "uvicorn",
+        "websockets",
         "liteLLM",
         "pydbantic",
         "databases[sqlite]",
         "pytest",
         "pytest-asyncio",
         "sqlalchemy",  # Add any other dependencies here
+        "numpy",
     ],
+    extras_require={
+        "fast": ["orjson"],
+    },
     entry_points={
         "console_scripts": ["pygentic=app.main:run"],
     },
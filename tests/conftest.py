@@ -0,0 +1,25 @@
+import pytest
+from app import config
+
+# The suite covers the instrumented app; metrics are opt-in in connectors.toml.
+config.setdefault("metrics", {})["enabled"] = True
+
+from app.services.cache import LRUCache, assistant_cache, thread_cache
+from app.services.database import create_pool, setup_models
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def db(tmp_path):
+    return setup_models(create_pool(f"sqlite:///{tmp_path}/test.db", {}))
+
+
+@pytest.fixture(autouse=True)
+def caches(monkeypatch):
+    for cache in (assistant_cache, thread_cache):
+        if cache.backend is not None:
+            monkeypatch.setattr(cache, "backend", LRUCache(cache.backend.max_size, cache.backend.ttl))
@@ -12,3 +12,14 @@ async def test_create_assistant():
         )
         assert response.status_code == 200
         assert response.json()["name"] == "Test Assistant"
+
+
+@pytest.mark.anyio
+async def test_create_assistant_with_a_taken_id_conflicts():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/assistants", json={"id": "1", "name": "First", "model": "gpt-4"})
+        response = await ac.post("/v1/assistants", json={"id": "1", "name": "Second", "model": "gpt-4"})
+        stored = await ac.get("/v1/assistants/1")
+
+    assert response.status_code == 409
+    assert stored.json()["name"] == "First"
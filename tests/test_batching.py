@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.batching import BatcherClosed, MicroBatcher
+from app.services.connector import LLMServiceConnector
+
+
+@pytest.mark.anyio
+async def test_concurrent_submits_are_batched_in_order():
+    calls = []
+
+    def upper(items):
+        calls.append(list(items))
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(upper, max_batch_size=4, max_wait_ms=50)
+    try:
+        results = await asyncio.gather(*(batcher.submit(f"p{i}") for i in range(10)))
+    finally:
+        await batcher.close()
+
+    assert results == [f"P{i}" for i in range(10)]
+    assert [len(batch) for batch in calls] == [4, 4, 2]
+
+
+@pytest.mark.anyio
+async def test_partial_batch_is_flushed_after_max_wait():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=100, max_wait_ms=20)
+    try:
+        start = time.perf_counter()
+        assert await batcher.submit("only") == "only"
+        elapsed = time.perf_counter() - start
+    finally:
+        await batcher.close()
+
+    assert 0.015 <= elapsed < 0.5
+    assert batcher.batches == 1
+
+
+@pytest.mark.anyio
+async def test_batches_run_off_the_event_loop():
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def blocking(items):
+        threads.append(threading.get_ident())
+        time.sleep(0.2)
+        return items
+
+    batcher = MicroBatcher(blocking, max_batch_size=2, max_wait_ms=1)
+    try:
+        task = asyncio.ensure_future(batcher.submit("slow"))
+        # The loop keeps ticking while the batch is running.
+        start = time.perf_counter()
+        await asyncio.sleep(0.05)
+        assert time.perf_counter() - start < 0.15
+        assert await task == "slow"
+    finally:
+        await batcher.close()
+
+    assert threads and threads[0] != loop_thread
+
+
+@pytest.mark.anyio
+async def test_batch_failure_reaches_every_caller():
+    def broken(items):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher(broken, max_batch_size=3, max_wait_ms=10)
+    try:
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        # The batcher keeps serving after a failed batch.
+        batcher.fn = lambda items: items
+        assert await batcher.submit("ok") == "ok"
+    finally:
+        await batcher.close()
+
+
+@pytest.mark.anyio
+async def test_close_fails_running_and_pending_items():
+    release = threading.Event()
+
+    def blocked(items):
+        release.wait(1)
+        return items
+
+    batcher = MicroBatcher(blocked, max_batch_size=1, max_wait_ms=1)
+    running = asyncio.ensure_future(batcher.submit("running"))
+    await asyncio.sleep(0.05)
+    pending = asyncio.ensure_future(batcher.submit("pending"))
+    await asyncio.sleep(0)
+
+    await batcher.close()
+    release.set()
+
+    results = await asyncio.wait_for(asyncio.gather(running, pending, return_exceptions=True), 1)
+    assert all(isinstance(result, BatcherClosed) for result in results)
+
+
+@pytest.mark.anyio
+async def test_short_result_list_fails_the_batch():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=3, max_wait_ms=10)
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True), 1
+        )
+    finally:
+        await batcher.close()
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.anyio
+async def test_llm_service_connector_batches_and_shuts_down():
+    calls = []
+
+    threads = []
+
+    def pipeline(prompts, max_length, batch_size):
+        calls.append(list(prompts))
+        threads.append(threading.current_thread().name)
+        return [[{"generated_text": f"{prompt}!"}] for prompt in prompts]
+
+    connector = LLMServiceConnector()
+    connector.initialize({"model": "tiny", "batch_size": 4, "batch_wait_ms": 20, "executor_workers": 1})
+    connector.generator = pipeline
+    await connector.connect()
+    try:
+        results = await asyncio.gather(*(connector.generate_text(f"p{i}") for i in range(4)))
+    finally:
+        await connector.close()
+
+    assert results == [f"p{i}!" for i in range(4)]
+    assert calls == [[f"p{i}" for i in range(4)]]
+    # The batch ran on the connector's executor, configured from its table.
+    assert threads[0].startswith("LLMServiceConnector")
+    assert connector.batcher is None and connector.executor is None
+
+
+@pytest.mark.anyio
+async def test_leftover_items_keep_their_arrival_time():
+    starts = []
+
+    def slow(items):
+        starts.append(time.perf_counter())
+        time.sleep(0.1)
+        return items
+
+    batcher = MicroBatcher(slow, max_batch_size=2, max_wait_ms=300)
+    try:
+        start = time.perf_counter()
+        first = asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+        await asyncio.sleep(0.01)
+        # Three items arrive while the first batch runs; one is left over
+        # after the next full batch, and waits from its arrival, not from then.
+        later = asyncio.gather(*(batcher.submit(item) for item in "cde"))
+        assert await asyncio.gather(first, later) == [["a", "b"], ["c", "d", "e"]]
+    finally:
+        await batcher.close()
+
+    assert len(starts) == 3
+    assert starts[2] - start < 0.36
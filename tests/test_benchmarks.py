@@ -0,0 +1,19 @@
+from benchmarks.suite import compare
+
+
+def result(p95_ms: float, throughput_rps: float, errors: int = 0) -> dict:
+    return {"scenario": "get_thread", "size": 10, "concurrency": 16,
+            "p95_ms": p95_ms, "throughput_rps": throughput_rps, "errors": errors}
+
+
+def test_compare_flags_latency_and_throughput_regressions():
+    baseline = [result(10.0, 1000.0)]
+
+    assert compare([result(11.0, 950.0)], baseline, tolerance=0.2) == []
+    regressions = compare([result(20.0, 500.0, errors=1)], baseline, tolerance=0.2)
+    assert len(regressions) == 3
+    assert regressions[0].startswith("get_thread[size=10,c=16]: p95")
+
+
+def test_compare_ignores_small_absolute_latency_changes():
+    assert compare([result(0.9, 1000.0)], [result(0.3, 1000.0)], tolerance=0.2) == []
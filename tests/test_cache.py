@@ -0,0 +1,73 @@
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models import AssistantDB
+from app.services.cache import LRUCache, ModelCache, assistant_cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.anyio
+async def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2, ttl=60)
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    assert await cache.get("a") == 1
+    await cache.set("c", 3)
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == 1
+    assert await cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+@pytest.mark.anyio
+async def test_lru_cache_expires_entries():
+    clock = Clock()
+    cache = LRUCache(max_size=2, ttl=10, clock=clock)
+    await cache.set("a", 1)
+    clock.now = 9.9
+    assert await cache.get("a") == 1
+    clock.now = 10.0
+    assert await cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+@pytest.mark.anyio
+async def test_model_cache_reads_and_writes_through():
+    cache = ModelCache(AssistantDB, LRUCache())
+    await cache.save(AssistantDB(id="a1", name="One", model="m"))
+    assert (await AssistantDB.get(id="a1")).name == "One"
+
+    await AssistantDB(id="a1", name="Changed behind the cache", model="m").save()
+    assert (await cache.get("a1")).name == "One"
+
+    await cache.save(AssistantDB(id="a1", name="Two", model="m"))
+    assert (await cache.get("a1")).name == "Two"
+
+    await cache.invalidate("a1")
+    assert (await cache.get("a1")).name == "Two"
+    assert await cache.get("missing") is None
+
+
+@pytest.mark.anyio
+async def test_assistant_route_uses_cache():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/assistants", json={"id": "a1", "name": "Cached", "model": "m"})
+        for _ in range(3):
+            response = await ac.get("/v1/assistants/a1")
+            assert response.json()["name"] == "Cached"
+        assert (await ac.get("/v1/assistants/missing")).status_code == 404
+
+        stats = (await ac.get("/cache/stats")).json()["assistants"]
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+    assert assistant_cache.backend.stats()["size"] == 1
@@ -0,0 +1,42 @@
+import httpx
+import pytest
+from app.services.default_connector import OpenAIAssistantConnector
+
+
+@pytest.mark.anyio
+async def test_connector_reuses_pooled_client():
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request)
+        return httpx.Response(200, json={"choices": [{"text": "hi"}]})
+
+    connector = OpenAIAssistantConnector()
+    connector.initialize({"api_key": "key", "base_url": "http://upstream/v1"})
+    connector.client = httpx.AsyncClient(
+        base_url=connector.base_url, transport=httpx.MockTransport(handler)
+    )
+    client = connector.client
+
+    assert await connector.generate_text("one") == "hi"
+    assert await connector.generate_text("two") == "hi"
+    assert connector.client is client
+    assert [str(r.url) for r in seen] == ["http://upstream/v1/completions"] * 2
+    assert seen[0].headers["Authorization"] == "Bearer key"
+
+    await connector.disconnect()
+    assert client.is_closed
+    assert connector.client is None
+
+
+@pytest.mark.anyio
+async def test_connector_lifecycle_uses_config():
+    connector = OpenAIAssistantConnector()
+    connector.initialize({"max_connections": 7, "http2": False})
+    await connector.connect()
+    client = connector.client
+    await connector.connect()
+    assert connector.client is client
+    assert connector.limits.max_connections == 7
+    await connector.disconnect()
+    assert client.is_closed
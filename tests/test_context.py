@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models import MessageDB, RunDB, ThreadSummaryDB
+from app.services.database import bulk_insert
+from app.services.interfaces import BaseConnector
+from app.services.prompts import ContextBuilder, TokenCounter, context_builder
+from app.services.run_scheduler import RunScheduler
+
+
+def words(text: str) -> int:
+    return len(text.split())
+
+
+async def seed(thread_id: str, count: int, words_per_message: int = 3):
+    # "user: m<i> x ..." is words_per_message words, plus one for the newline.
+    await bulk_insert(MessageDB, [
+        {"id": f"{thread_id}-{i:03d}", "thread_id": thread_id, "role": "user",
+         "content": " ".join([f"m{i}"] + ["x"] * (words_per_message - 2)), "created_at": 1000.0 + i}
+        for i in range(count)
+    ])
+
+
+def builder(**kwargs) -> ContextBuilder:
+    return ContextBuilder(counter=TokenCounter(count=words), **kwargs)
+
+
+class SummarizingConnector(BaseConnector):
+    def __init__(self):
+        self.prompts = []
+
+    def initialize(self, config: dict):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def generate_text(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return f"summary {len(self.prompts)}"
+
+
+@pytest.mark.anyio
+async def test_window_is_the_newest_messages_within_budget():
+    await seed("t", 10)
+    context = await builder(page_size=3).build("t", max_tokens=17)
+
+    # Four tokens per message: four messages fit in 17.
+    assert [m.id for m in context.messages] == ["t-006", "t-007", "t-008", "t-009"]
+    assert context.tokens == 16
+    assert context.dropped.id == "t-005"
+    assert context.prompt.splitlines()[0] == "user: m6 x"
+
+
+@pytest.mark.anyio
+async def test_whole_thread_when_it_fits():
+    await seed("t", 5)
+    context = await builder(page_size=2).build("t", max_tokens=100)
+
+    assert len(context.messages) == 5
+    assert context.dropped is None
+
+
+@pytest.mark.anyio
+async def test_latest_message_is_kept_even_over_budget():
+    await seed("t", 3, words_per_message=20)
+    context = await builder().build("t", max_tokens=5)
+
+    assert [m.id for m in context.messages] == ["t-002"]
+
+
+@pytest.mark.anyio
+async def test_token_lengths_are_counted_once():
+    await seed("t", 10)
+    counted = builder()
+    await counted.build("t", max_tokens=100)
+    await counted.build("t", max_tokens=100)
+
+    assert counted.counter.stats() == {"size": 10, "hits": 10, "misses": 10}
+
+
+@pytest.mark.anyio
+async def test_assistant_budget_overrides_default():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/assistants", json={"id": "small", "name": "a", "model": "m", "max_context_tokens": 8})
+    await seed("t", 10)
+    context = await builder(max_tokens=1000).for_run("t", "small")
+
+    assert len(context.messages) == 2
+    assert len((await builder(max_tokens=1000).for_run("t", None)).messages) == 10
+
+
+@pytest.mark.anyio
+async def test_summary_replaces_older_messages():
+    await seed("t", 10)
+    await ThreadSummaryDB(thread_id="t", content="earlier talk", message_id="t-004", created_at=1004.0).save()
+    context = await builder(summaries=True).build("t", max_tokens=100)
+
+    assert context.prompt.splitlines()[0] == "summary: earlier talk"
+    assert [m.id for m in context.messages][0] == "t-005"
+    assert context.dropped is None
+
+
+@pytest.mark.anyio
+async def test_summarize_folds_dropped_messages_and_rolls_forward():
+    await seed("t", 10)
+    rolling = builder(summaries=True, summary_tokens=8)
+    connector = SummarizingConnector()
+
+    context = await rolling.build("t", max_tokens=12)
+    summary = await rolling.summarize("t", context, connector)
+    # Two messages (eight tokens) are folded per update, oldest first.
+    assert (summary.content, summary.message_id) == ("summary 1", "t-001")
+    assert "user: m0 x\nuser: m1 x" in connector.prompts[0]
+
+    context = await rolling.build("t", max_tokens=12)
+    assert context.summary.content == "summary 1"
+    summary = await rolling.summarize("t", context, connector)
+    assert summary.message_id == "t-003"
+    assert "summary so far: summary 1\nuser: m2 x\nuser: m3 x" in connector.prompts[1]
+    assert (await ThreadSummaryDB.get(thread_id="t")).content == "summary 2"
+
+
+@pytest.mark.anyio
+async def test_queued_run_updates_summary(monkeypatch):
+    monkeypatch.setattr(context_builder, "summaries", True)
+    monkeypatch.setattr(context_builder, "max_tokens", 10)
+    await seed("t", 10)
+    await RunDB(id="r", thread_id="t", assistant_id="a", status="queued").save()
+    scheduler = RunScheduler(poll_interval=0.01)
+    await scheduler.start(SummarizingConnector())
+    scheduler.submit("r", "a")
+    try:
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if await ThreadSummaryDB.get(thread_id="t"):
+                break
+    finally:
+        await scheduler.stop()
+
+    assert (await RunDB.get(id="r")).status == "completed"
+    assert (await ThreadSummaryDB.get(thread_id="t")).content == "summary 2"
@@ -0,0 +1,78 @@
+import asyncio
+import pickle
+
+import pytest
+import sqlalchemy
+from httpx import AsyncClient
+from app.main import app
+from app.models import MessageDB, ThreadDB
+from app.services.database import backfill_thread_stats, bulk_insert, move_embedded_messages
+
+
+@pytest.mark.anyio
+async def test_sqlite_connections_are_tuned(db):
+    async with db as pool:
+        assert (await pool.fetch_val("PRAGMA journal_mode")) == "wal"
+        assert (await pool.fetch_val("PRAGMA synchronous")) == 1
+        assert (await pool.fetch_val("PRAGMA busy_timeout")) == 5000
+
+
+@pytest.mark.anyio
+async def test_200_concurrent_writers():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        responses = await asyncio.gather(*(
+            ac.post(
+                "/v1/threads/t1/messages",
+                json={"id": f"m{i}", "thread_id": "t1", "role": "user", "content": str(i)},
+            )
+            for i in range(200)
+        ))
+
+    assert [r.status_code for r in responses] == [200] * 200
+    assert await MessageDB.filter(thread_id="t1", count_rows=True) == 200
+
+
+def test_embedded_thread_messages_are_moved(tmp_path, db):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    metadata = sqlalchemy.MetaData()
+    legacy = sqlalchemy.Table(
+        ThreadDB.get_table().name, metadata,
+        sqlalchemy.Column("id", sqlalchemy.String, primary_key=True),
+        sqlalchemy.Column("assistant_id", sqlalchemy.String),
+        sqlalchemy.Column("messages", sqlalchemy.LargeBinary),
+    )
+    metadata.create_all(engine)
+    messages = MessageDB.get_table()
+    messages.create(engine)
+    with engine.begin() as connection:
+        connection.execute(legacy.insert(), [
+            {"id": "t1", "assistant_id": "a", "messages": pickle.dumps(["hi", "there"])},
+            {"id": "t2", "assistant_id": "a", "messages": pickle.dumps(["already stored"])},
+        ])
+        connection.execute(messages.insert(), [
+            {"id": "m", "thread_id": "t2", "role": "user", "content": "already stored", "created_at": 1.0},
+        ])
+
+    assert move_embedded_messages(engine)
+    assert not move_embedded_messages(db.engine)
+    with engine.connect() as connection:
+        rows = connection.execute(
+            sqlalchemy.select(messages.c.thread_id, messages.c.content).order_by(messages.c.created_at)
+        ).fetchall()
+    assert [tuple(row) for row in rows] == [("t2", "already stored"), ("t1", "hi"), ("t1", "there")]
+
+
+@pytest.mark.anyio
+async def test_thread_stats_are_backfilled(db):
+    await ThreadDB(id="t1", assistant_id="a").save()
+    await ThreadDB(id="t2", assistant_id="a").save()
+    await bulk_insert(MessageDB, [
+        {"id": f"m{i}", "thread_id": "t1", "role": "user", "content": str(i), "created_at": float(i)}
+        for i in range(3)
+    ])
+
+    backfill_thread_stats(db.engine)
+
+    t1, t2 = await ThreadDB.get(id="t1"), await ThreadDB.get(id="t2")
+    assert (t1.message_count, t1.last_message_id, t1.last_message_at) == (3, "m2", 2.0)
+    assert (t2.message_count, t2.last_message_id) == (0, None)
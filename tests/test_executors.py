@@ -0,0 +1,129 @@
+import asyncio
+import os
+import statistics
+import time
+
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.services.executors import cpu_bound
+from app.services.interfaces import BaseConnector
+
+
+class CPUHeavyConnector(BaseConnector):
+    def initialize(self, config: dict):
+        self.rounds = config.get("rounds", 100)
+        self.loaded_in = None
+
+    def warm_up(self):
+        self.loaded_in = os.getpid()
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    @cpu_bound
+    def generate_text(self, prompt: str) -> str:
+        total = 0
+        for i in range(self.rounds):
+            total += i * i
+        return f"{prompt}: {total}"
+
+    @cpu_bound
+    def worker_info(self):
+        return os.getpid(), self.loaded_in
+
+
+def make_connector(config: dict) -> CPUHeavyConnector:
+    connector = CPUHeavyConnector()
+    connector.initialize(config)
+    connector.configure_executor(config)
+    return connector
+
+
+class IOConnector(BaseConnector):
+    def initialize(self, config: dict):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def generate_text(self, prompt: str) -> str:
+        return prompt
+
+
+def test_executor_is_only_configured_for_cpu_bound_work():
+    io_connector = IOConnector()
+    io_connector.configure_executor({"executor": "thread"})
+
+    assert io_connector.executor is None
+    assert CPUHeavyConnector.cpu_bound_methods() == ["generate_text", "worker_info"]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("mode", ["inline", "thread"])
+async def test_cpu_bound_methods_run_in_local_modes(mode):
+    connector = make_connector({"executor": mode})
+    try:
+        await connector.start_executor()
+        assert await connector.worker_info() == (os.getpid(), os.getpid())
+        assert await connector.generate_text("sum") == f"sum: {sum(i * i for i in range(100))}"
+    finally:
+        connector.stop_executor()
+
+
+@pytest.mark.anyio
+async def test_process_workers_are_warmed_up():
+    connector = make_connector({"executor": "process", "executor_workers": 2, "executor_start_method": "spawn"})
+    try:
+        await connector.start_executor()
+        pid, loaded_in = await connector.worker_info()
+    finally:
+        connector.stop_executor()
+
+    assert pid != os.getpid()
+    assert loaded_in == pid
+
+
+def test_unknown_executor_is_rejected():
+    with pytest.raises(ValueError):
+        make_connector({"executor": "gpu"})
+
+
+@pytest.mark.anyio
+async def test_route_latency_stays_flat_during_cpu_heavy_generation():
+    connector = make_connector({
+        "executor": "process",
+        "executor_workers": 1,
+        "executor_start_method": "spawn",
+        "rounds": 20_000_000,
+    })
+    await connector.start_executor()
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            await ac.post("/v1/threads", json={"id": "busy", "assistant_id": "1", "messages": []})
+
+            async def get_thread():
+                start = time.perf_counter()
+                response = await ac.get("/v1/threads/busy")
+                assert response.status_code == 200
+                return time.perf_counter() - start
+
+            baseline = [await get_thread() for _ in range(10)]
+
+            generation = asyncio.ensure_future(connector.generate_text("heavy"))
+            await asyncio.sleep(0.05)
+            during = [await get_thread() for _ in range(10)]
+            assert not generation.done()
+            await generation
+    finally:
+        connector.stop_executor()
+
+    # A blocked event loop would add the whole generation time to a request.
+    assert max(during) < 0.1
+    assert statistics.median(during) < statistics.median(baseline) + 0.02
@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from httpx import AsyncClient
+from app.main import app
+from app.services import open_interpreter_service
+from app.services.fanout import FanOutError, fan_out
+
+stub = FastAPI()
+stub.state.in_flight = 0
+stub.state.peak = 0
+stub.state.calls = {}
+
+
+@stub.post("/endpoint")
+async def endpoint(body: dict):
+    # Each payload says how long to take and how many times to fail first.
+    key = body["id"]
+    stub.state.calls[key] = stub.state.calls.get(key, 0) + 1
+    stub.state.in_flight += 1
+    stub.state.peak = max(stub.state.peak, stub.state.in_flight)
+    try:
+        await asyncio.sleep(body.get("latency", 0))
+    finally:
+        stub.state.in_flight -= 1
+    if stub.state.calls[key] <= body.get("fail", 0):
+        return JSONResponse({"detail": "busy"}, status_code=body.get("status", 503))
+    return {"echo": key}
+
+
+@pytest.fixture
+def serverless(monkeypatch):
+    stub.state.in_flight = stub.state.peak = 0
+    stub.state.calls = {}
+    service = open_interpreter_service.serverless_service
+    monkeypatch.setattr(service, "endpoint", "http://stub/endpoint")
+    monkeypatch.setattr(service, "client", httpx.AsyncClient(transport=httpx.ASGITransport(app=stub)))
+    return service
+
+
+@pytest.mark.anyio
+async def test_results_stream_as_they_complete(serverless):
+    payloads = [{"id": "slow", "latency": 0.2}] + [{"id": f"fast-{i}", "latency": 0.01} for i in range(5)]
+
+    results = [result async for result in fan_out(serverless.call_endpoint, payloads, concurrency=3)]
+
+    assert results[-1].index == 0 and results[-1].result == {"echo": "slow"}
+    assert sorted(result.index for result in results) == list(range(6))
+    assert all(result.error is None for result in results)
+    assert stub.state.peak == 3
+
+
+@pytest.mark.anyio
+async def test_transient_failures_are_retried(serverless):
+    payloads = [
+        {"id": "flaky", "fail": 2},
+        {"id": "broken", "fail": 5},
+        {"id": "invalid", "fail": 1, "status": 400},
+        {"id": "hung", "latency": 1},
+    ]
+
+    results = {
+        result.index: result
+        async for result in fan_out(serverless.call_endpoint, payloads, timeout=0.1, retries=2, backoff_base=0.01)
+    }
+
+    assert (results[0].result, results[0].attempts) == ({"echo": "flaky"}, 3)
+    assert results[1].attempts == 3 and "503" in results[1].error
+    assert results[2].attempts == 1 and "400" in results[2].error
+    assert (results[3].error, results[3].attempts) == ("Timed out", 3)
+
+
+@pytest.mark.anyio
+async def test_closing_early_cancels_calls_in_flight(serverless):
+    payloads = [{"id": "fast"}] + [{"id": f"slow-{i}", "latency": 10} for i in range(3)]
+
+    results = fan_out(serverless.call_endpoint, payloads, concurrency=4)
+    assert (await results.__anext__()).result == {"echo": "fast"}
+    await results.aclose()
+
+    assert stub.state.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_fanout_route_streams_results(serverless):
+    payloads = [{"id": "slow", "latency": 0.1}, {"id": "fast"}]
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/v1/fanout", json={"payloads": payloads, "concurrency": 2})
+
+    events = [line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    results = [json.loads(event) for event in events[:-1]]
+    assert [result["index"] for result in results] == [1, 0]
+    assert results[0]["result"] == {"echo": "fast"}
+
+
+@pytest.mark.anyio
+async def test_main_raises_when_a_call_fails(serverless):
+    assert await open_interpreter_service.main({"id": "ok"}, copies=3) == [{"echo": "ok"}] * 3
+
+    with pytest.raises(FanOutError, match="400"):
+        await open_interpreter_service.main({"id": "bad", "fail": 10, "status": 400}, copies=3)
@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models import AssistantDB, IdempotencyDB, MessageDB, RunDB
+from app.services.cache import LRUCache
+from app.services.idempotency import idempotency
+from app.services.run_scheduler import scheduler
+
+
+@pytest.fixture(autouse=True)
+def fresh_idempotency(monkeypatch):
+    monkeypatch.setattr(idempotency, "cache", LRUCache(idempotency.cache.max_size, idempotency.ttl))
+    monkeypatch.setattr(idempotency, "executed", 0)
+    monkeypatch.setattr(idempotency, "poll_interval", 0.01)
+
+
+def key(value):
+    return {"Idempotency-Key": value}
+
+
+@pytest.mark.anyio
+async def test_concurrent_retries_create_once_and_get_the_same_response():
+    thread = {"id": "t1", "assistant_id": "a1", "messages": ["hello"]}
+    message = {"id": "m1", "thread_id": "t1", "role": "user", "content": "again"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        threads = await asyncio.gather(*(ac.post("/v1/threads", json=thread, headers=key("k-thread")) for _ in range(20)))
+        messages = await asyncio.gather(*(
+            ac.post("/v1/threads/t1/messages", json=message, headers=key("k-message")) for _ in range(20)
+        ))
+        later = await ac.post("/v1/threads", json=thread, headers=key("k-thread"))
+        stored = (await ac.get("/v1/threads/t1")).json()
+
+    assert {r.status_code for r in threads + messages} == {200}
+    assert len({r.content for r in threads}) == 1 and len({r.content for r in messages}) == 1
+    assert later.content == threads[0].content and later.headers["Idempotent-Replayed"] == "true"
+    assert idempotency.executed == 2
+    # The retried thread did not store its first message twice, nor the
+    # retried message count twice.
+    assert await MessageDB.filter(thread_id="t1", count_rows=True) == 2
+    assert stored["message_count"] == 2
+
+
+@pytest.mark.anyio
+async def test_retried_run_is_queued_once(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(scheduler, "submit", lambda run_id, assistant_id: submitted.append(run_id))
+    run = {"id": "r1", "thread_id": "t1", "assistant_id": "a1", "status": "queued"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        responses = await asyncio.gather(*(
+            ac.post("/v1/threads/t1/runs", json=run, headers=key("k-run")) for _ in range(10)
+        ))
+        # The run finishes; a late retry still gets the original response.
+        await (await RunDB.get(id="r1")).update(status="completed")
+        late = await ac.post("/v1/threads/t1/runs", json=run, headers=key("k-run"))
+
+    assert {r.status_code for r in responses} == {200}
+    assert submitted == ["r1"]
+    assert late.json()["status"] == "queued"
+    assert (await RunDB.get(id="r1")).status == "completed"
+
+
+@pytest.mark.anyio
+async def test_failed_requests_release_the_key_and_reuse_is_rejected():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        invalid = await ac.post("/v1/assistants", json={"id": "a1"}, headers=key("k-assistant"))
+        created = await ac.post("/v1/assistants", json={"id": "a1", "name": "A", "model": "m"}, headers=key("k-assistant"))
+        reused = await ac.post("/v1/assistants", json={"id": "a2", "name": "B", "model": "m"}, headers=key("k-assistant"))
+        too_long = await ac.post("/v1/assistants", json={"id": "a3", "name": "C", "model": "m"}, headers=key("k" * 300))
+
+    assert invalid.status_code == 422
+    assert created.status_code == 200 and "Idempotent-Replayed" not in created.headers
+    assert reused.status_code == 422
+    assert too_long.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_duplicates_wait_for_a_request_running_in_another_process(monkeypatch):
+    assistant = {"id": "a1", "name": "A", "model": "m"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        # Learn the request's fingerprint, then pretend another worker holds the key.
+        first = await ac.post("/v1/assistants", json=assistant, headers=key("probe"))
+        record = await IdempotencyDB.get(key="probe")
+        await IdempotencyDB(key="k-other", fingerprint=record.fingerprint, expires_at=time.time() + 60).save()
+
+        async def finish():
+            await asyncio.sleep(0.05)
+            await (await IdempotencyDB.get(key="k-other")).update(
+                status_code=200, media_type="application/json", body='{"from": "other worker"}',
+            )
+
+        waited, _ = await asyncio.gather(ac.post("/v1/assistants", json=assistant, headers=key("k-other")), finish())
+
+        await IdempotencyDB(key="k-stuck", fingerprint=record.fingerprint, expires_at=time.time() + 60).save()
+        monkeypatch.setattr(idempotency, "wait_timeout", 0.05)
+        stuck = await ac.post("/v1/assistants", json=assistant, headers=key("k-stuck"))
+
+        # A worker that died while holding a key gives it up after its lease.
+        await (await IdempotencyDB.get(key="k-stuck")).update(expires_at=time.time() - 1)
+        await (await AssistantDB.get(id="a1")).delete()
+        reclaimed = await ac.post("/v1/assistants", json=assistant, headers=key("k-stuck"))
+
+    assert first.status_code == 200
+    assert waited.json() == {"from": "other worker"}
+    assert stuck.status_code == 409
+    assert reclaimed.status_code == 200 and reclaimed.json()["id"] == "a1"
+    assert (await IdempotencyDB.get(key="k-stuck")).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_duplicates_of_a_failing_request_share_its_failure(monkeypatch):
+    checks = []
+
+    async def full_queue():
+        checks.append(1)
+        await asyncio.sleep(0.05)
+        return scheduler.queue_size
+
+    monkeypatch.setattr(scheduler, "pending", full_queue)
+    run = {"id": "r1", "thread_id": "t1", "assistant_id": "a1", "status": "queued"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        responses = await asyncio.gather(*(
+            ac.post("/v1/threads/t1/runs", json=run, headers=key("k-run")) for _ in range(5)
+        ))
+        assert checks == [1]
+        # The failure released the key, so a later retry runs again.
+        await ac.post("/v1/threads/t1/runs", json=run, headers=key("k-run"))
+
+    assert {r.status_code for r in responses} == {429}
+    assert checks == [1, 1]
+
+
+@pytest.mark.anyio
+async def test_streamed_runs_reject_a_key():
+    run = {"id": "r1", "thread_id": "t1", "assistant_id": "a1", "status": "queued"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/v1/threads/t1/runs", params={"stream": "true"}, json=run, headers=key("k-stream"))
+
+    assert response.status_code == 400
+    assert await RunDB.get(id="r1") is None
+    assert await IdempotencyDB.get(key="k-stream") is None
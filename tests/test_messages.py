@@ -1,6 +1,9 @@
 import pytest
 from httpx import AsyncClient
 from app.main import app
+from app.models import MessageDB
+from app.routes import messages
+from app.services.responses import response_settings
 
 
 @pytest.mark.anyio
@@ -12,3 +15,124 @@ async def test_add_message():
         )
         assert response.status_code == 200
         assert response.json()["content"] == "Hello"
+
+
+async def seed_messages(count: int, thread_id: str = "t1"):
+    for i in range(count):
+        await MessageDB(
+            id=f"{thread_id}-{i:02d}", thread_id=thread_id, role="user", content=str(i), created_at=1000.0 + i
+        ).save()
+
+
+@pytest.mark.anyio
+async def test_get_messages_paginates_in_order():
+    await seed_messages(5)
+    await seed_messages(2, thread_id="other")
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        page = (await ac.get("/v1/threads/t1/messages", params={"limit": 2})).json()
+        assert [m["id"] for m in page["data"]] == ["t1-04", "t1-03"]
+        assert page["object"] == "list"
+        assert page["has_more"] is True
+
+        page = (await ac.get("/v1/threads/t1/messages", params={"limit": 2, "after": page["last_id"]})).json()
+        assert [m["id"] for m in page["data"]] == ["t1-02", "t1-01"]
+
+        page = (await ac.get("/v1/threads/t1/messages", params={"limit": 2, "after": page["last_id"]})).json()
+        assert [m["id"] for m in page["data"]] == ["t1-00"]
+        assert page["has_more"] is False
+
+        page = (await ac.get("/v1/threads/t1/messages", params={"order": "asc", "limit": 3})).json()
+        assert [m["id"] for m in page["data"]] == ["t1-00", "t1-01", "t1-02"]
+
+        page = (await ac.get("/v1/threads/t1/messages", params={"order": "asc", "limit": 2, "before": "t1-03"})).json()
+        assert [m["id"] for m in page["data"]] == ["t1-01", "t1-02"]
+        assert page["has_more"] is True
+
+
+@pytest.mark.anyio
+async def test_get_messages_returns_only_requested_fields():
+    await seed_messages(3)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        page = (await ac.get("/v1/threads/t1/messages", params={"limit": 2, "fields": "role,content"})).json()
+        unknown = await ac.get("/v1/threads/t1/messages", params={"fields": "id,secret"})
+
+    assert page["data"] == [{"role": "user", "content": "2"}, {"role": "user", "content": "1"}]
+    assert page["last_id"] == "t1-01" and page["has_more"] is True
+    assert unknown.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_fast_responses_match_validated_responses(monkeypatch):
+    await seed_messages(3)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/assistants", json={"id": "a1", "name": "A", "model": "gpt-4", "tools": ["x"]})
+        await ac.post("/v1/threads", json={"id": "t2", "assistant_id": "a1", "messages": ["hi"]})
+        paths = ["/v1/threads/t1/messages", "/v1/assistants/a1", "/v1/threads/t2"]
+        validated = [(await ac.get(path)).json() for path in paths]
+        monkeypatch.setattr(response_settings, "fast", True)
+        fast = [await ac.get(path) for path in paths]
+
+    assert [response.json() for response in fast] == validated
+    # orjson writes compact JSON.
+    assert b'"object":"list"' in fast[0].content
+
+
+@pytest.mark.anyio
+async def test_get_messages_rejects_unknown_cursor():
+    await seed_messages(1, thread_id="other")
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get("/v1/threads/t1/messages", params={"after": "other-00"})
+        assert response.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_add_messages_batch():
+    await MessageDB(id="existing", thread_id="t1", role="user", content="old", created_at=1.0).save()
+    batch = [
+        {"id": "b0", "role": "user", "content": "first"},
+        {"id": "b1", "role": "assistant", "content": "second"},
+        {"id": "b0", "role": "user", "content": "duplicate"},
+        {"id": "existing", "role": "user", "content": "again"},
+        {"id": "b2", "role": "user"},
+        {"id": "b3", "thread_id": "t2", "role": "user", "content": "elsewhere"},
+    ]
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/v1/threads/t1/messages/batch", json={"messages": batch})
+        assert response.status_code == 200
+        result = response.json()
+        assert (result["created"], result["failed"]) == (2, 4)
+        assert [item["status"] for item in result["data"]] == [
+            "created", "created", "failed", "failed", "failed", "failed"
+        ]
+        assert result["data"][4]["error"] == "content: field required"
+
+        page = (await ac.get("/v1/threads/t1/messages", params={"order": "asc"})).json()
+        assert [m["id"] for m in page["data"]] == ["existing", "b0", "b1"]
+        assert page["data"][1]["content"] == "first"
+
+
+@pytest.mark.anyio
+async def test_batch_reports_messages_stored_concurrently(monkeypatch):
+    check = messages.existing_keys
+
+    async def racing_check(model, keys):
+        # Another request stores b1 right after the first check.
+        found = await check(model, keys)
+        if await MessageDB.get(id="b1") is None:
+            await MessageDB(id="b1", thread_id="t1", role="user", content="racer", created_at=1.0).insert()
+        return found
+
+    monkeypatch.setattr(messages, "existing_keys", racing_check)
+    batch = [{"id": "b0", "role": "user", "content": "first"}, {"id": "b1", "role": "user", "content": "second"}]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/v1/threads/t1/messages/batch", json={"messages": batch})
+
+    assert response.status_code == 200
+    assert [(item["status"], item["error"]) for item in response.json()["data"]] == [
+        ("created", None), ("failed", "Message already exists"),
+    ]
+    assert (await MessageDB.get(id="b1")).content == "racer"
@@ -0,0 +1,92 @@
+import httpx
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.services.default_connector import OpenAIAssistantConnector
+from app.services.metrics import (
+    MetricsRegistry,
+    db_query_seconds,
+    metrics,
+    stats_families,
+    upstream_request_seconds,
+    upstream_response_bytes,
+)
+
+
+def count(histogram, labels) -> int:
+    entry = histogram.values.get(labels)
+    return sum(entry[0]) if entry else 0
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry(enabled=True)
+    histogram = registry.histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value, ('/a"b',))
+    registry.collector(lambda: [("queue_depth", "gauge", "Depth.", [({}, 3)])])
+    registry.collector(lambda: stats_families("jobs", "pool", {"a": {"done": 5, "busy": 2}}, "Jobs", counters=("done",)))
+
+    text = registry.render()
+
+    assert 'latency_seconds_bucket{route="/a\\"b",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a\\"b",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{route="/a\\"b"} 4' in text
+    assert "# TYPE queue_depth gauge\nqueue_depth 3" in text
+    assert '# TYPE jobs_done_total counter\njobs_done_total{pool="a"} 5' in text
+    assert '# TYPE jobs_busy gauge\njobs_busy{pool="a"} 2' in text
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint_reports_routes_and_db_models():
+    assert metrics.enabled
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/threads", json={"id": "metrics", "assistant_id": "1", "messages": []})
+        await ac.get("/v1/threads/metrics/messages")
+        response = await ac.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'pygentic_http_request_duration_seconds_count{method="POST",route="/v1/threads",status="200"}' in text
+    assert 'route="/v1/threads/{thread_id}/messages"' in text
+    assert 'pygentic_db_query_duration_seconds_count{model="ThreadDB",operation="insert"}' in text
+    assert 'pygentic_db_query_duration_seconds_count{model="MessageDB",operation="select"}' in text
+    assert "pygentic_run_queue_depth 0" in text
+    assert 'pygentic_cache_size{cache="threads"}' in text
+    # Stats that only grow are counters.
+    assert "# TYPE pygentic_cache_hits_total counter" in text
+    assert 'pygentic_cache_hits_total{cache="threads"}' in text
+    assert "# TYPE pygentic_idempotency_executed_total counter" in text
+
+
+@pytest.mark.anyio
+async def test_upstream_calls_are_timed_by_operation():
+    connector = OpenAIAssistantConnector()
+    connector.initialize({"base_url": "http://upstream/v1"})
+    connector.client = httpx.AsyncClient(
+        base_url=connector.base_url,
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"id": "t", "choices": [{"text": "hi"}]})),
+    )
+    labels = ("OpenAIAssistantConnector", "threads/messages", "200")
+    before = count(upstream_request_seconds, labels)
+
+    await connector.get_messages("abc")
+    await connector.generate_text("hi")
+
+    assert count(upstream_request_seconds, labels) == before + 1
+    assert count(upstream_request_seconds, ("OpenAIAssistantConnector", "completions", "200")) >= 1
+    assert count(upstream_response_bytes, ("OpenAIAssistantConnector", "completions")) >= 1
+
+
+@pytest.mark.anyio
+async def test_nothing_is_recorded_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+    labels = ("AssistantDB", "insert")
+    before = count(db_query_seconds, labels)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/v1/assistants", json={"id": "quiet", "name": "a", "model": "m"})
+
+    assert response.status_code == 200
+    assert count(db_query_seconds, labels) == before
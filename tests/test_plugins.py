@@ -0,0 +1,191 @@
+import os
+
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.services import plugin_loader
+from app.services.database import schema_fingerprint, store_fingerprint, stored_fingerprint
+from app.services.plugin_loader import LazyConnector, PluginSpec, connector_classes, discover_plugins
+from app.services.registry import registry
+
+PLUGIN = '''
+from app.services.interfaces import BaseConnector
+from app.services.default_connector import OpenAIAssistantConnector
+
+IMPORTS.append(__name__)
+
+
+class Base(BaseConnector):
+    def initialize(self, config):
+        self.config = config
+
+    async def connect(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+
+class EchoConnector(Base):
+    async def generate_text(self, prompt):
+        return f"{self.config.get('prefix', '')}{prompt}"
+
+    async def shout(self, text):
+        return text.upper()
+'''
+
+
+@pytest.fixture
+def imports(monkeypatch):
+    # Plugin modules record their import here.
+    imports = []
+    monkeypatch.setattr("builtins.IMPORTS", imports, raising=False)
+    monkeypatch.setattr(plugin_loader, "_modules", {})
+    return imports
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(plugin_loader, "CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+def write_plugin(directory, name="echo.py", source=PLUGIN):
+    path = directory / name
+    path.write_text(source)
+    return path
+
+
+def test_connector_classes_are_found_without_importing():
+    assert connector_classes(PLUGIN) == ["Base", "EchoConnector"]
+
+
+def test_discovery_does_not_import_plugins(tmp_path, imports):
+    write_plugin(tmp_path)
+    (tmp_path / "helpers.py").write_text("raise RuntimeError('never imported')\n")
+
+    plugins = discover_plugins(str(tmp_path))
+
+    assert [plugin.name for plugin in plugins] == ["Base", "EchoConnector"]
+    assert imports == []
+    assert plugins[1].load().__name__ == "EchoConnector"
+    assert imports == ["echo"]
+
+
+def test_scan_results_are_cached_by_mtime(tmp_path, imports, monkeypatch, cache_dir):
+    path = write_plugin(tmp_path)
+    discover_plugins(str(tmp_path))
+    assert os.path.exists(plugin_loader.cache_path(str(tmp_path), str(cache_dir)))
+
+    parsed = []
+    monkeypatch.setattr(plugin_loader, "connector_classes", lambda source: parsed.append(source) or [])
+    discover_plugins(str(tmp_path))
+    assert parsed == []
+
+    path.write_text(PLUGIN + "\n# changed\n")
+    assert discover_plugins(str(tmp_path)) == []
+    assert len(parsed) == 1
+
+
+def test_aliased_and_imported_bases_are_found(tmp_path, imports):
+    plugins_dir = tmp_path / "plugins"
+    plugins_dir.mkdir()
+    write_plugin(plugins_dir, "aliased.py", (
+        "from app.services.interfaces import BaseConnector as Base\n"
+        "class AliasedConnector(Base):\n    pass\n"
+    ))
+    # Subclassed through a class from another module: found by importing.
+    write_plugin(plugins_dir, "derived.py", (
+        "IMPORTS.append(__name__)\n"
+        "from app.services.default_connector import OpenAIAssistantConnector as Upstream\n"
+        "class Helper:\n    pass\n"
+        "class DerivedConnector(Upstream):\n    pass\n"
+    ))
+
+    plugins = discover_plugins(str(plugins_dir))
+
+    assert [plugin.name for plugin in plugins] == ["AliasedConnector", "DerivedConnector"]
+    assert imports == ["derived"]
+    assert connector_classes("import abc\nclass Thing(abc.ABC):\n    pass\n") is None
+
+
+def test_read_only_plugin_directory_is_left_alone(tmp_path, imports, cache_dir):
+    plugins_dir = tmp_path / "plugins"
+    plugins_dir.mkdir()
+    write_plugin(plugins_dir)
+    plugins_dir.chmod(0o555)
+    try:
+        assert [plugin.name for plugin in discover_plugins(str(plugins_dir))] == ["Base", "EchoConnector"]
+    finally:
+        plugins_dir.chmod(0o755)
+
+    assert os.listdir(plugins_dir) == ["echo.py"]
+    assert os.path.exists(plugin_loader.cache_path(str(plugins_dir), str(cache_dir)))
+
+
+def test_manifest_lists_connectors(tmp_path, imports):
+    write_plugin(tmp_path)
+    (tmp_path / plugin_loader.MANIFEST).write_text('[connectors]\nMyEcho = "echo:EchoConnector"\n')
+
+    plugins = discover_plugins(str(tmp_path))
+
+    assert [plugin.name for plugin in plugins] == ["MyEcho"]
+    assert plugins[0].load().__name__ == "EchoConnector"
+
+
+@pytest.mark.parametrize("by_group", [True, False], ids=["selectable", "dict"])
+def test_entry_points_are_found_on_every_python(tmp_path, monkeypatch, by_group):
+    class EntryPoint:
+        name = "Installed"
+
+        def load(self):
+            return LazyConnector
+
+    class Selectable(list):
+        def select(self, group):
+            return list(self) if group == plugin_loader.ENTRY_POINT_GROUP else []
+
+    # Python 3.10+ returns entries to select from; 3.8 and 3.9 a dict of groups.
+    found = Selectable([EntryPoint()]) if by_group else {plugin_loader.ENTRY_POINT_GROUP: [EntryPoint()]}
+    monkeypatch.setattr(plugin_loader, "entry_points", lambda: found)
+
+    assert [plugin.name for plugin in discover_plugins(str(tmp_path / "missing"))] == ["Installed"]
+
+
+@pytest.mark.anyio
+async def test_lazy_connector_is_created_and_connected_on_first_use(tmp_path, imports):
+    write_plugin(tmp_path)
+    plugin = discover_plugins(str(tmp_path))[1]
+    connector = LazyConnector(plugin, {"prefix": "> "})
+
+    await connector.connect()
+    await connector.start_executor()
+    assert imports == [] and connector.instance is None
+
+    assert await connector.generate_text("hi") == "> hi"
+    assert connector.instance.connected
+    assert await connector.shout("hey") == "HEY"
+
+    await connector.disconnect()
+    connector.stop_executor()
+    assert not connector.instance.connected
+
+
+@pytest.mark.anyio
+async def test_lazy_connector_serves_routes(tmp_path, imports, monkeypatch):
+    write_plugin(tmp_path)
+    plugin = PluginSpec("openaiassistantconnector", discover_plugins(str(tmp_path))[1].load)
+    monkeypatch.setitem(registry.connectors, "openaiassistantconnector", LazyConnector(plugin, {}))
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get("/generate_text", params={"prompt": "hi"})
+
+    assert response.json() == {"generated_text": "hi"}
+
+
+def test_schema_fingerprint_is_stored(db):
+    fingerprint = schema_fingerprint(db.engine)
+    assert stored_fingerprint(db.engine) is None
+
+    store_fingerprint(db.engine, fingerprint)
+    assert stored_fingerprint(db.engine) == fingerprint
@@ -0,0 +1,196 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from httpx import AsyncClient
+from app.main import app
+from app.services.default_connector import OpenAIAssistantConnector
+from app.services.interfaces import BaseConnector
+from app.services.rate_limit import (
+    RateLimitExceeded,
+    RateLimitedConnector,
+    RateLimiter,
+    TokenBucket,
+    current_assistant,
+)
+from app.services.registry import registry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class EchoConnector(BaseConnector):
+    def initialize(self, config: dict):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def generate_text(self, prompt: str) -> str:
+        return prompt
+
+
+def throttling_upstream(throttled: int, retry_after: str = "0.1"):
+    """An OpenAI-compatible stub that answers the first ``throttled`` calls with 429."""
+    stub = FastAPI()
+    stub.state.calls = 0
+
+    def throttle():
+        stub.state.calls += 1
+        if stub.state.calls <= throttled:
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": retry_after})
+        return None
+
+    @stub.post("/v1/completions")
+    async def completions(body: dict):
+        throttled_response = throttle()
+        if throttled_response is not None:
+            return throttled_response
+        if body.get("stream"):
+            async def events():
+                yield 'data: {"choices": [{"text": "ok"}]}\n\n'
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        return {"choices": [{"text": "ok"}]}
+
+    return stub
+
+
+def rate_limited(stub: FastAPI, **config) -> RateLimitedConnector:
+    upstream = OpenAIAssistantConnector()
+    upstream.initialize({"base_url": "http://upstream/v1"})
+    upstream.client = httpx.AsyncClient(base_url=upstream.base_url, transport=httpx.ASGITransport(app=stub))
+    connector = RateLimitedConnector(upstream)
+    connector.initialize({"backoff_base": 0.01, **config})
+    return connector
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(60, capacity=2, clock=clock)
+
+    assert bucket.wait_time(2) == 0
+    bucket.reserve(2)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+
+
+@pytest.mark.anyio
+async def test_requests_queue_instead_of_failing():
+    limiter = RateLimiter({"requests_per_minute": 600, "burst_window": 0.1})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limiter.acquire() for _ in range(5)))
+    elapsed = time.perf_counter() - start
+
+    # One request fits the burst; the other four are paced at 10/s.
+    assert elapsed >= 0.35
+    assert limiter.stats()["throttled_requests"] == 4
+
+
+@pytest.mark.anyio
+async def test_wait_beyond_max_wait_is_rejected():
+    limiter = RateLimiter({"tokens_per_minute": 600, "burst_window": 1, "max_wait": 0.5})
+
+    await limiter.acquire(tokens=10)
+    with pytest.raises(RateLimitExceeded) as error:
+        await limiter.acquire(tokens=10)
+    assert error.value.retry_after == pytest.approx(1.0, abs=0.05)
+    assert limiter.stats()["rejected"] == 1
+
+
+@pytest.mark.anyio
+async def test_assistants_have_separate_buckets():
+    limiter = RateLimiter({"assistant_requests_per_minute": 60, "burst_window": 1, "max_wait": 0})
+
+    await limiter.acquire(assistant_id="a")
+    await limiter.acquire(assistant_id="b")
+    with pytest.raises(RateLimitExceeded):
+        await limiter.acquire(assistant_id="a")
+
+
+@pytest.mark.anyio
+async def test_upstream_429_is_retried_after_retry_after():
+    stub = throttling_upstream(throttled=2, retry_after="0.1")
+    connector = rate_limited(stub)
+
+    start = time.perf_counter()
+    assert await connector.generate_text("hi") == "ok"
+
+    assert time.perf_counter() - start >= 0.2
+    assert stub.state.calls == 3
+    stats = connector.stats()
+    assert stats["retries"] == 2
+    assert stats["upstream_throttled"] == 2
+    assert stats["backoff_seconds"] >= 0.2
+
+
+@pytest.mark.anyio
+async def test_retries_are_bounded():
+    stub = throttling_upstream(throttled=10, retry_after="0")
+    connector = rate_limited(stub, max_retries=2)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await connector.generate_text("hi")
+    assert stub.state.calls == 3
+
+
+@pytest.mark.anyio
+async def test_retry_after_longer_than_max_wait_is_not_waited_for():
+    stub = throttling_upstream(throttled=1, retry_after="120")
+    connector = rate_limited(stub, max_wait=1.0)
+
+    with pytest.raises(RateLimitExceeded):
+        await connector.generate_text("hi")
+    assert stub.state.calls == 1
+
+
+@pytest.mark.anyio
+async def test_stream_is_reopened_after_429():
+    stub = throttling_upstream(throttled=1, retry_after="0")
+    connector = rate_limited(stub)
+
+    assert [chunk async for chunk in connector.stream_text("hi")] == ["ok"]
+    assert stub.state.calls == 2
+
+
+@pytest.mark.anyio
+async def test_per_assistant_limit_uses_current_assistant():
+    connector = RateLimitedConnector(EchoConnector())
+    connector.initialize({"assistant_requests_per_minute": 60, "burst_window": 1, "max_wait": 0})
+
+    token = current_assistant.set("a")
+    try:
+        await connector.generate_text("one")
+        with pytest.raises(RateLimitExceeded):
+            await connector.generate_text("two")
+        current_assistant.set("b")
+        assert await connector.generate_text("three") == "three"
+    finally:
+        current_assistant.reset(token)
+
+
+@pytest.mark.anyio
+async def test_exhausted_quota_returns_429(monkeypatch):
+    connector = RateLimitedConnector(EchoConnector())
+    connector.initialize({"requests_per_minute": 1, "burst_window": 60, "max_wait": 0})
+    monkeypatch.setitem(registry.connectors, "openaiassistantconnector", connector)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        assert (await ac.get("/generate_text", params={"prompt": "a"})).status_code == 200
+        response = await ac.get("/generate_text", params={"prompt": "b"})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 59
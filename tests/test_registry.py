@@ -0,0 +1,55 @@
+import pytest
+from fastapi import HTTPException
+from starlette.middleware.base import BaseHTTPMiddleware
+from httpx import AsyncClient
+from app.main import app
+from app.services.interfaces import BaseConnector
+from app.services.registry import ConnectorRegistry, registry
+
+
+class EchoConnector(BaseConnector):
+    def initialize(self, config: dict):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def generate_text(self, prompt: str) -> str:
+        return f"echo: {prompt}"
+
+
+def test_registry_lookup_is_case_insensitive():
+    connectors = ConnectorRegistry()
+    echo = EchoConnector()
+    connectors.register("EchoConnector", echo)
+
+    assert connectors.get("echoconnector") is echo
+    assert "ECHOCONNECTOR" in connectors
+    assert connectors.get("missing") is None
+    with pytest.raises(HTTPException) as error:
+        connectors.require("missing")
+    assert error.value.status_code == 503
+
+
+def test_app_has_no_per_request_http_middleware():
+    assert all(middleware.cls is not BaseHTTPMiddleware for middleware in app.user_middleware)
+
+
+@pytest.mark.anyio
+async def test_generate_text_uses_registered_connector(monkeypatch):
+    monkeypatch.setitem(registry.connectors, "openaiassistantconnector", EchoConnector())
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get("/generate_text", params={"prompt": "hi"})
+    assert response.status_code == 200
+    assert response.json() == {"generated_text": "echo: hi"}
+
+
+@pytest.mark.anyio
+async def test_generate_text_without_connector_is_unavailable(monkeypatch):
+    monkeypatch.delitem(registry.connectors, "openaiassistantconnector")
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get("/generate_text", params={"prompt": "hi"})
+    assert response.status_code == 503
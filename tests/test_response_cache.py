@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from app.services.interfaces import BaseConnector
+from app.services.response_cache import CachingConnector
+
+
+class CountingConnector(BaseConnector):
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def initialize(self, config: dict):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def generate_text(self, prompt: str, **params) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream failed")
+        return f"echo: {prompt} {params}"
+
+
+@pytest.mark.anyio
+async def test_repeated_prompt_is_served_from_cache():
+    upstream = CountingConnector()
+    connector = CachingConnector(upstream)
+    connector.initialize({"max_entries": 10})
+
+    first = await connector.generate_text("hello")
+    second = await connector.generate_text("  hello \n")
+    other = await connector.generate_text("hello", temperature=0.5)
+
+    assert first == second
+    assert other != first
+    assert upstream.calls == 2
+    stats = connector.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+@pytest.mark.anyio
+async def test_concurrent_identical_prompts_call_upstream_once():
+    upstream = CountingConnector(delay=0.05)
+    connector = CachingConnector(upstream)
+    connector.initialize({})
+
+    results = await asyncio.gather(*(connector.generate_text("same") for _ in range(20)))
+
+    assert len(set(results)) == 1
+    assert upstream.calls == 1
+    assert connector.stats()["coalesced"] == 19
+
+
+@pytest.mark.anyio
+async def test_failures_are_shared_but_not_cached():
+    upstream = CountingConnector(delay=0.01, fail=True)
+    connector = CachingConnector(upstream)
+    connector.initialize({})
+
+    results = await asyncio.gather(
+        *(connector.generate_text("boom") for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert upstream.calls == 1
+
+    upstream.fail = False
+    assert await connector.generate_text("boom")
+    assert upstream.calls == 2
+
+
+@pytest.mark.anyio
+async def test_lru_eviction():
+    upstream = CountingConnector()
+    connector = CachingConnector(upstream)
+    connector.initialize({"max_entries": 2})
+
+    for prompt in ["a", "b", "c"]:
+        await connector.generate_text(prompt)
+    await connector.generate_text("a")
+
+    assert upstream.calls == 4
+
+
+@pytest.mark.anyio
+async def test_disk_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "responses.db")
+    upstream = CountingConnector()
+
+    connector = CachingConnector(upstream)
+    connector.initialize({"path": path})
+    await connector.connect()
+    await connector.generate_text("persist me")
+    await connector.disconnect()
+
+    restarted = CachingConnector(upstream)
+    restarted.initialize({"path": path})
+    await restarted.connect()
+    try:
+        assert await restarted.generate_text("persist me") == "echo: persist me {}"
+    finally:
+        await restarted.disconnect()
+
+    assert upstream.calls == 1
+    assert restarted.stats()["disk_hits"] == 1
+
+
+@pytest.mark.anyio
+async def test_cancelled_caller_does_not_fail_the_others():
+    upstream = CountingConnector(delay=0.05)
+    connector = CachingConnector(upstream)
+    connector.initialize({})
+
+    leader = asyncio.create_task(connector.generate_text("same"))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(connector.generate_text("same")) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await asyncio.gather(*followers) == ["echo: same {}"] * 3
+    assert leader.cancelled()
+    assert upstream.calls == 1
+
+    # Once every caller is gone, the upstream call is cancelled too.
+    lone = asyncio.create_task(connector.generate_text("alone"))
+    await asyncio.sleep(0.01)
+    lone.cancel()
+    await asyncio.sleep(0.1)
+    assert connector.in_flight == {} and connector.waiters == {}
+    assert await connector.memory.get(connector.cache_key("alone", {})) is None
+
+
+@pytest.mark.anyio
+async def test_registered_name_is_part_of_the_key():
+    upstream = CountingConnector()
+    first, second = CachingConnector(upstream, "openai_a"), CachingConnector(upstream, "openai_b")
+
+    assert first.cache_key("hello", {}) != second.cache_key("hello", {})
+    assert first.cache_key("hello", {}) == CachingConnector(upstream, "openai_a").cache_key("hello", {})
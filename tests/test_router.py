@@ -0,0 +1,195 @@
+import asyncio
+import random
+import time
+from collections import Counter
+
+import httpx
+import pytest
+import toml
+
+from app.services.default_connector import named_connectors
+from app.services.interfaces import BaseConnector
+from app.services.router import NoBackendAvailableError, RoutingConnector, create_router
+
+
+class FakeBackend(BaseConnector):
+    def __init__(self, name: str, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def initialize(self, config: dict):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def generate_text(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.random.random() < self.error_rate:
+            raise RuntimeError(f"{self.name} failed")
+        return self.name
+
+    async def stream_text(self, prompt: str):
+        yield await self.generate_text(prompt)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_router(backends, clock=None, **config):
+    router = RoutingConnector({backend.name: backend for backend in backends}, clock=clock or time.monotonic)
+    router.initialize(config)
+    return router
+
+
+@pytest.mark.anyio
+async def test_ewma_prefers_the_faster_backend():
+    fast, slow = FakeBackend("fast", latency=0.001), FakeBackend("slow", latency=0.03)
+    router = make_router([fast, slow], strategy="ewma")
+
+    served = Counter([await router.generate_text("hi") for _ in range(40)])
+
+    assert served["fast"] >= 36
+    assert router.stats()["fast"]["ewma_ms"] < router.stats()["slow"]["ewma_ms"]
+
+
+@pytest.mark.anyio
+async def test_least_outstanding_spreads_concurrent_calls():
+    backends = [FakeBackend(f"b{i}", latency=0.02) for i in range(3)]
+    router = make_router(backends, strategy="least_outstanding")
+
+    served = Counter(await asyncio.gather(*(router.generate_text("hi") for _ in range(30))))
+
+    assert sorted(served.values()) == [10, 10, 10]
+    assert all(stats["outstanding"] == 0 for stats in router.stats().values())
+
+
+@pytest.mark.anyio
+async def test_failover_and_circuit_breaking():
+    healthy = FakeBackend("healthy", latency=0.005)
+    broken = FakeBackend("broken", error_rate=1.0)
+    router = make_router([broken, healthy], failure_threshold=3, reset_timeout=60.0)
+
+    results = [await router.generate_text("hi") for _ in range(20)]
+
+    assert results == ["healthy"] * 20
+    assert broken.calls == 3
+    assert router.stats()["broken"]["state"] == "open"
+
+
+@pytest.mark.anyio
+async def test_flaky_backend_calls_all_succeed_through_failover():
+    flaky = FakeBackend("flaky", error_rate=0.3, seed=1)
+    steady = FakeBackend("steady", latency=0.001)
+    router = make_router([flaky, steady], failure_threshold=100)
+
+    results = await asyncio.gather(*(router.generate_text("hi") for _ in range(50)))
+
+    assert set(results) <= {"flaky", "steady"}
+    assert router.stats()["flaky"]["errors"] > 0
+
+
+@pytest.mark.anyio
+async def test_half_open_probe_closes_the_circuit():
+    clock = FakeClock()
+    backend = FakeBackend("only", error_rate=1.0)
+    router = make_router([backend], clock=clock, failure_threshold=2, reset_timeout=10.0)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await router.generate_text("hi")
+    with pytest.raises(NoBackendAvailableError):
+        await router.generate_text("hi")
+    assert backend.calls == 2
+
+    clock.now += 10.0
+    backend.error_rate = 0.0
+    assert router.stats()["only"]["state"] == "half_open"
+    assert await router.generate_text("hi") == "only"
+    assert router.stats()["only"]["state"] == "closed"
+
+
+@pytest.mark.anyio
+async def test_failed_half_open_probe_reopens_the_circuit():
+    clock = FakeClock()
+    backend = FakeBackend("only", error_rate=1.0)
+    router = make_router([backend], clock=clock, failure_threshold=1, reset_timeout=10.0)
+
+    with pytest.raises(RuntimeError):
+        await router.generate_text("hi")
+    clock.now += 10.0
+    with pytest.raises(RuntimeError):
+        await router.generate_text("hi")
+
+    assert router.stats()["only"]["state"] == "open"
+
+
+@pytest.mark.anyio
+async def test_stream_fails_over_before_the_first_chunk():
+    router = make_router([FakeBackend("broken", error_rate=1.0), FakeBackend("healthy")])
+
+    chunks = [chunk async for chunk in router.stream_text("hi")]
+
+    assert chunks == ["healthy"]
+
+
+def test_create_router_resolves_registered_connectors():
+    connectors = {"a": FakeBackend("a"), "b": FakeBackend("b")}
+
+    router = create_router({"backends": ["A", "b"], "strategy": "ewma", "max_attempts": 1}, connectors)
+
+    assert [backend.connector for backend in router.backends] == [connectors["a"], connectors["b"]]
+    assert router.max_attempts == 1
+    with pytest.raises(ValueError):
+        create_router({"backends": ["missing"]}, connectors)
+
+
+@pytest.mark.anyio
+async def test_router_spreads_calls_over_named_endpoints_of_one_provider():
+    config = toml.loads("""
+        [connectors.openai_assistant]
+        api_key = "shared-key"
+        timeout = 5.0
+
+        [connectors.openai_assistant.primary]
+        base_url = "http://primary/v1"
+
+        [connectors.openai_assistant.backup]
+        base_url = "http://backup/v1"
+        api_key = "backup-key"
+
+        [routers.pool]
+        backends = ["primary", "backup"]
+        strategy = "least_outstanding"
+    """)
+    seen = Counter()
+
+    async def handler(request: httpx.Request):
+        seen[(request.url.host, request.headers["Authorization"])] += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"choices": [{"text": request.url.host}]})
+
+    connectors = named_connectors(config["connectors"]["openai_assistant"])
+    for connector in connectors.values():
+        connector.client = httpx.AsyncClient(base_url=connector.base_url, transport=httpx.MockTransport(handler))
+    router = create_router(config["routers"]["pool"], connectors)
+    try:
+        results = await asyncio.gather(*(router.generate_text("hi") for _ in range(10)))
+    finally:
+        await router.disconnect()
+
+    assert Counter(results) == {"primary": 5, "backup": 5}
+    assert seen == {("primary", "Bearer shared-key"): 5, ("backup", "Bearer backup-key"): 5}
+    assert connectors["backup"].timeout.read == 5.0
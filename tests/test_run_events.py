@@ -0,0 +1,177 @@
+import asyncio
+import json
+import time
+
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models import Run, RunDB
+from app.services.run_events import RunEvents, next_change, run_events
+from app.services.run_scheduler import scheduler
+from app.services.shared_state import SharedState
+
+
+@pytest.fixture(autouse=True)
+def no_scheduler(monkeypatch):
+    monkeypatch.setattr(scheduler, "submit", lambda run_id, assistant_id: None)
+
+
+async def set_status(run_id, status, result=None, delay=0.0):
+    """Stores a new status the way the scheduler does, then publishes it."""
+    await asyncio.sleep(delay)
+    run = await RunDB.get(id=run_id)
+    await run.update(status=status, result=result)
+    run_events.publish(run, status=status, result=result)
+
+
+class WebSocketSession:
+    """Drives a WebSocket route of the app over ASGI, in the test's loop."""
+
+    def __init__(self, path: str):
+        self.scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": path,
+            "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+            "server": ("test", 80), "client": ("test", 50000), "subprotocols": [],
+        }
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(app(self.scope, self.incoming.get, self.outgoing.put))
+        await self.incoming.put({"type": "websocket.connect"})
+        assert (await self.receive())["type"] == "websocket.accept"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 1)
+
+    async def receive(self, timeout: float = 1.0) -> dict:
+        return await asyncio.wait_for(self.outgoing.get(), timeout)
+
+    async def receive_json(self) -> dict:
+        return json.loads((await self.receive())["text"])
+
+
+@pytest.mark.anyio
+async def test_long_poll_returns_on_the_next_status_change():
+    run = {"id": "r1", "thread_id": "t1", "assistant_id": "a1", "status": "queued"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/threads/t1/runs", json=run)
+
+        began = time.perf_counter()
+        started, _ = await asyncio.gather(
+            ac.get("/v1/threads/t1/runs/r1", params={"wait": 10}), set_status("r1", "in_progress", delay=0.05),
+        )
+        finished, _ = await asyncio.gather(
+            ac.get("/v1/threads/t1/runs/r1", params={"wait": 10}), set_status("r1", "completed", "done", delay=0.05),
+        )
+        elapsed = time.perf_counter() - began
+
+        # Finished runs, and waits that time out, return the run as stored.
+        began = time.perf_counter()
+        again = await ac.get("/v1/threads/t1/runs/r1", params={"wait": 30})
+        immediate = time.perf_counter() - began
+        await ac.post("/v1/threads/t1/runs", json={**run, "id": "r2"})
+        unchanged = await ac.get("/v1/threads/t1/runs/r2", params={"wait": 0.05})
+        missing = await ac.get("/v1/threads/t1/runs/nope", params={"wait": 1})
+        other_thread = [await ac.get("/v1/threads/t2/runs/r2", params=params) for params in ({}, {"wait": 1})]
+        too_long = await ac.get("/v1/threads/t1/runs/r2", params={"wait": 61})
+
+    assert started.json()["status"] == "in_progress"
+    assert finished.json() == {**run, "status": "completed", "result": "done"}
+    assert elapsed < 1
+    assert again.json()["status"] == "completed" and immediate < 1
+    assert unchanged.json()["status"] == "queued"
+    assert missing.status_code == 404
+    assert [response.status_code for response in other_thread] == [404, 404]
+    assert too_long.status_code == 422
+    assert run_events.stats()["waiters"] == 0 and run_events.stats()["threads"] == 0
+
+
+@pytest.mark.anyio
+async def test_websocket_streams_status_changes_of_the_thread():
+    run = {"id": "r1", "thread_id": "t1", "assistant_id": "a1", "status": "queued"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        async with WebSocketSession("/v1/threads/t1/runs/events") as feed:
+            await ac.post("/v1/threads/t1/runs", json=run)
+            await ac.post("/v1/threads/t2/runs", json={**run, "id": "other", "thread_id": "t2"})
+            await set_status("r1", "in_progress")
+            # Publishing a status already delivered sends nothing.
+            await set_status("r1", "in_progress")
+            await set_status("r1", "completed", "done")
+
+            changes = [await feed.receive_json() for _ in range(3)]
+            with pytest.raises(asyncio.TimeoutError):
+                await feed.receive(timeout=0.05)
+            assert run_events.stats()["subscribers"] == 1
+
+    assert [(change["id"], change["status"]) for change in changes] == [
+        ("r1", "queued"), ("r1", "in_progress"), ("r1", "completed"),
+    ]
+    assert changes[-1]["result"] == "done"
+    assert run_events.stats()["subscribers"] == 0
+
+
+@pytest.mark.anyio
+async def test_changes_published_by_another_process_are_delivered():
+    state = SharedState.create()
+    publisher = RunEvents(state=state)
+    waiter = RunEvents(poll_interval=0.01, state=state)
+    try:
+        await RunDB(id="r1", thread_id="t1", assistant_id="a1", status="queued").save()
+        async with waiter.watching("r1", "t1") as changes:
+            run = await RunDB.get(id="r1")
+            await run.update(status="completed", result="done")
+            publisher.publish(run, status="completed", result="done")
+            change = await next_change(changes, "queued", 1)
+    finally:
+        await waiter.stop()
+        state.close(unlink=True)
+
+    assert change["status"] == "completed" and change["result"] == "done"
+
+
+@pytest.mark.anyio
+async def test_five_thousand_waiters_are_notified_without_polling(db, monkeypatch):
+    threads, per_thread = 50, 100
+    table = RunDB.get_table()
+    with db.engine.begin() as conn:
+        conn.execute(table.insert(), [
+            {"id": f"run-{t}-{i}", "thread_id": f"thread-{t}", "assistant_id": "a1", "status": "in_progress",
+             "created_at": 1_700_000_000.0}
+            for t in range(threads) for i in range(per_thread)
+        ])
+    reads = []
+    get = RunDB.get
+
+    async def counted_get(**kwargs):
+        reads.append(kwargs["id"])
+        return await get(**kwargs)
+
+    monkeypatch.setattr(RunDB, "get", counted_get)
+
+    async with AsyncClient(app=app, base_url="http://test", timeout=60) as ac:
+        waiters = [
+            asyncio.create_task(ac.get(f"/v1/threads/thread-{t}/runs/run-{t}-{i}", params={"wait": 30}))
+            for t in range(threads) for i in range(per_thread)
+        ]
+        deadline = time.monotonic() + 30
+        while run_events.stats()["waiters"] < threads * per_thread:
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.05)
+
+        began = time.perf_counter()
+        await RunDB.__metadata__.database.execute(table.update().values(status="completed", result="done"))
+        for t in range(threads):
+            for i in range(per_thread):
+                run_events.publish(Run(id=f"run-{t}-{i}", thread_id=f"thread-{t}", assistant_id="a1",
+                                       status="completed", result="done"))
+        responses = await asyncio.gather(*waiters)
+        elapsed = time.perf_counter() - began
+
+    assert {response.json()["status"] for response in responses} == {"completed"}
+    # Each waiter read its run once, when it arrived, and never again.
+    assert len(reads) == threads * per_thread
+    assert run_events.stats()["waiters"] == 0
+    assert elapsed < 10
@@ -0,0 +1,176 @@
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models import MessageDB, RunDB
+from app.routes import runs
+from app.services.interfaces import BaseConnector
+from app.services.run_scheduler import RunScheduler
+
+
+class FakeConnector(BaseConnector):
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.running = {}
+        self.peak = {}
+
+    def initialize(self, config: dict):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def generate_text(self, prompt: str) -> str:
+        assistant = prompt.split(":")[0]
+        self.running[assistant] = self.running.get(assistant, 0) + 1
+        self.peak[assistant] = max(self.peak.get(assistant, 0), self.running[assistant])
+        await asyncio.sleep(self.delay)
+        self.running[assistant] -= 1
+        if self.fail:
+            raise RuntimeError("upstream error")
+        return f"reply to {prompt}"
+
+
+async def post_run(ac, run_id, thread_id="t1", assistant_id="a1"):
+    return await ac.post(
+        f"/v1/threads/{thread_id}/runs",
+        json={"id": run_id, "thread_id": thread_id, "assistant_id": assistant_id, "status": "queued"},
+    )
+
+
+async def wait_for(ac, run_id, thread_id="t1"):
+    for _ in range(200):
+        response = await ac.get(f"/v1/threads/{thread_id}/runs/{run_id}")
+        if response.json()["status"] in ("completed", "failed"):
+            return response.json()
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"run {run_id} did not finish")
+
+
+@pytest.fixture
+async def scheduler(monkeypatch):
+    scheduler = RunScheduler(workers=4, queue_size=10, max_concurrent_per_assistant=1)
+    monkeypatch.setattr(runs, "scheduler", scheduler)
+    yield scheduler
+    await scheduler.stop()
+
+
+@pytest.mark.anyio
+async def test_run_is_queued_then_completed(scheduler):
+    await MessageDB(id="m1", thread_id="t1", role="user", content="Hi").save()
+    await scheduler.start(FakeConnector(delay=0.05))
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await post_run(ac, "r1")
+        assert response.json()["status"] == "queued"
+        run = await wait_for(ac, "r1")
+
+    assert run["status"] == "completed"
+    assert run["result"] == "reply to user: Hi"
+
+
+@pytest.mark.anyio
+async def test_failed_run(scheduler):
+    await scheduler.start(FakeConnector(fail=True))
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await post_run(ac, "r1")
+        run = await wait_for(ac, "r1")
+
+    assert run["status"] == "failed"
+    assert run["result"] == "upstream error"
+
+
+@pytest.mark.anyio
+async def test_full_queue_returns_429(scheduler):
+    scheduler.queue_size = 2
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        assert (await post_run(ac, "r1")).status_code == 200
+        assert (await post_run(ac, "r2")).status_code == 200
+        response = await post_run(ac, "r3")
+        assert response.status_code == 429
+        assert (await ac.get("/v1/threads/t1/runs/r3")).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_per_assistant_concurrency_cap(scheduler):
+    await MessageDB(id="m1", thread_id="t1", role="a1", content="Hi").save()
+    await MessageDB(id="m2", thread_id="t2", role="a2", content="Hi").save()
+    connector = FakeConnector(delay=0.05)
+    await scheduler.start(connector)
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for i in range(3):
+            await post_run(ac, f"a1-{i}", thread_id="t1", assistant_id="a1")
+            await post_run(ac, f"a2-{i}", thread_id="t2", assistant_id="a2")
+        for i in range(3):
+            assert (await wait_for(ac, f"a1-{i}", thread_id="t1"))["status"] == "completed"
+            assert (await wait_for(ac, f"a2-{i}", thread_id="t2"))["status"] == "completed"
+
+    assert connector.peak == {"a1": 1, "a2": 1}
+
+
+@pytest.mark.anyio
+async def test_schedulers_share_the_queue(scheduler):
+    # Two schedulers stand in for two server processes.
+    await MessageDB(id="m1", thread_id="t1", role="user", content="Hi").save()
+    other = RunScheduler(workers=2, max_concurrent_per_assistant=1, poll_interval=0.01)
+    scheduler.workers = 2
+    connector = FakeConnector(delay=0.05)
+    await scheduler.start(connector)
+    await other.start(connector)
+
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            for i in range(8):
+                await post_run(ac, f"r{i}", assistant_id=f"a{i}")
+            for i in range(8):
+                assert (await wait_for(ac, f"r{i}"))["status"] == "completed"
+    finally:
+        await other.stop()
+
+    workers = {(await RunDB.get(id=f"r{i}")).worker.split("/")[0] for i in range(8)}
+    assert workers == {scheduler.worker_id, other.worker_id}
+
+
+@pytest.mark.anyio
+async def test_run_with_expired_lease_is_claimed_again(scheduler):
+    await MessageDB(id="m1", thread_id="t1", role="user", content="Hi").save()
+    await RunDB(id="r1", thread_id="t1", assistant_id="a1", status="in_progress",
+                worker="gone/0", lease_until=time.time() - 1).save()
+    await RunDB(id="r2", thread_id="t1", assistant_id="a2", status="in_progress",
+                worker="alive/0", lease_until=time.time() + 60).save()
+    await scheduler.start(FakeConnector())
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        assert (await wait_for(ac, "r1"))["status"] == "completed"
+
+    assert (await RunDB.get(id="r2")).status == "in_progress"
+
+
+@pytest.mark.anyio
+async def test_stop_drains_then_requeues_runs(scheduler):
+    scheduler.drain_timeout = 0.2
+    await scheduler.start(FakeConnector(delay=0.1))
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await post_run(ac, "quick", assistant_id="a1")
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        assert (await wait_for(ac, "quick"))["status"] == "completed"
+
+    scheduler.drain_timeout = 0.05
+    await scheduler.start(FakeConnector(delay=10))
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await post_run(ac, "slow", assistant_id="a1")
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+    run = await RunDB.get(id="slow")
+    assert (run.status, run.worker, run.lease_until) == ("queued", None, None)
@@ -1,6 +1,8 @@
 import pytest
 from httpx import AsyncClient
 from app.main import app
+from app.models import RunDB
+from app.services.run_scheduler import scheduler
 
 
 @pytest.mark.anyio
@@ -16,4 +18,21 @@ async def test_run_thread():
             },
         )
         assert response.status_code == 200
-        assert response.json()["status"] == "running"
+        assert response.json()["status"] == "queued"
+
+
+@pytest.mark.anyio
+async def test_run_with_a_taken_id_conflicts(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(scheduler, "submit", lambda run_id, assistant_id: submitted.append(run_id))
+    run = {"id": "r1", "thread_id": "t1", "assistant_id": "a1", "status": "queued"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/threads/t1/runs", json=run)
+        await (await RunDB.get(id="r1")).update(status="completed", result="done")
+        retried = await ac.post("/v1/threads/t1/runs", json=run)
+        streamed = await ac.post("/v1/threads/t1/runs", params={"stream": "true"}, json=run)
+
+    assert retried.status_code == 409 and streamed.status_code == 409
+    assert submitted == ["r1"]
+    stored = await RunDB.get(id="r1")
+    assert (stored.status, stored.result) == ("completed", "done")
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models import MessageDB
+from app.services.embeddings import HashEmbedder, create_embedder, normalize
+from app.services.search import semantic_search
+from app.services.vector_index import VectorIndex
+
+
+def random_vectors(count, dimensions=16, seed=0):
+    return normalize(np.random.default_rng(seed).normal(size=(count, dimensions)))
+
+
+@pytest.fixture
+async def search(tmp_path, monkeypatch):
+    embedder = HashEmbedder()
+    embedder.initialize({"dimensions": 64})
+    monkeypatch.setattr(semantic_search, "enabled", True)
+    monkeypatch.setattr(semantic_search, "path", str(tmp_path / "index"))
+    monkeypatch.setattr(semantic_search, "embedder", embedder)
+    # Each test runs on its own event loop.
+    monkeypatch.setattr(semantic_search, "queue", asyncio.Queue())
+    yield semantic_search
+    await semantic_search.stop()
+    semantic_search.index = None
+
+
+@pytest.mark.anyio
+async def test_hash_embeddings_are_deterministic_unit_vectors():
+    embedder = create_embedder({"embedder": "hash", "dimensions": 64})
+    first, again, related, unrelated = await embedder.embed(
+        ["the cat sat on the mat", "the cat sat on the mat", "a cat on a mat", "quarterly revenue report"]
+    )
+
+    assert np.array_equal(first, again)
+    assert np.linalg.norm(first) == pytest.approx(1.0)
+    assert first @ related > first @ unrelated
+
+
+def test_index_finds_nearest_vectors_in_chunks(tmp_path):
+    vectors = random_vectors(2500)
+    index = VectorIndex(str(tmp_path), 16, chunk_rows=100)
+    index.add([f"m{i}" for i in range(2500)], [f"t{i % 3}" for i in range(2500)], vectors)
+
+    queries = vectors[[7, 2001]]
+    results = index.search(queries, 5)
+    expected = np.argsort(-(vectors @ queries.T), axis=0)[:5].T
+    assert [[message_id for message_id, _ in hits] for hits in results] == [
+        [f"m{i}" for i in row] for row in expected
+    ]
+    assert results[0][0][1] == pytest.approx(1.0)
+
+    in_thread = index.search(queries[0], 5, thread_id="t1")[0]
+    assert all(int(message_id[1:]) % 3 == 1 for message_id, _ in in_thread)
+    assert index.search(queries[0], 5, thread_id="missing") == [[]]
+
+
+def test_index_is_shared_through_its_files(tmp_path):
+    writer = VectorIndex(str(tmp_path), 16)
+    reader = VectorIndex(str(tmp_path), 16)
+    vectors = random_vectors(3000)
+    writer.add(["first"], ["t"], vectors[:1])
+    assert reader.search(vectors[0], 1) == [[("first", pytest.approx(1.0))]]
+
+    # Appends past the mapped capacity grow the files; the reader remaps.
+    writer.add([f"m{i}" for i in range(1, 3000)], ["t"] * 2999, vectors[1:])
+    assert len(reader) == 3000
+    assert reader.search(vectors[2999], 1)[0][0][0] == "m2999"
+
+    with pytest.raises(ValueError):
+        VectorIndex(str(tmp_path), 32)
+
+
+@pytest.mark.anyio
+async def test_messages_are_indexed_and_searched(search):
+    await MessageDB(id="old", thread_id="t1", role="user", content="stored before indexing").save()
+    await search.start()
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/threads/t1/messages", json={
+            "id": "m1", "thread_id": "t1", "role": "user", "content": "How do I reset my password?",
+        })
+        await ac.post("/v1/threads/t2/messages/batch", json={"messages": [
+            {"id": "m2", "role": "user", "content": "password reset link expired"},
+            {"id": "m3", "role": "user", "content": "what is the weather tomorrow"},
+        ]})
+        await search.flush()
+
+        everywhere = (await ac.get("/v1/messages/search", params={"q": "reset password", "limit": 2})).json()
+        in_thread = (await ac.get("/v1/threads/t1/messages/search", params={"q": "reset password"})).json()
+        backfilled = (await ac.get("/v1/threads/t1/messages/search", params={"q": "stored before", "limit": 1})).json()
+
+    assert {hit["message"]["id"] for hit in everywhere["data"]} == {"m1", "m2"}
+    assert everywhere["data"][0]["score"] >= everywhere["data"][1]["score"]
+    assert [hit["message"]["id"] for hit in in_thread["data"]][0] == "m1"
+    assert {hit["message"]["thread_id"] for hit in in_thread["data"]} == {"t1"}
+    assert backfilled["data"][0]["message"]["id"] == "old"
+    assert search.stats()["vectors"] == 4
+
+
+@pytest.mark.anyio
+async def test_search_routes_need_search_enabled():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get("/v1/messages/search", params={"q": "anything"})
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_backdated_message_is_indexed_once(search):
+    await search.start()
+    await search.tasks[-1]
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/threads/t1/messages", json={
+            "id": "m1", "thread_id": "t1", "role": "user", "content": "imported", "created_at": 1_000.0,
+        })
+    await search.flush()
+    # A later backfill finds the message by its created_at, but it is indexed already.
+    await search.backfill(before=2_000.0)
+
+    assert search.index.ids() == ["m1"]
+
+
+@pytest.mark.anyio
+async def test_backfill_resumes_after_the_last_saved_page(search, tmp_path):
+    for i in range(5):
+        await MessageDB(id=f"m{i}", thread_id="t1", role="user", content=f"message {i}", created_at=1_000.0).save()
+    (tmp_path / "index").mkdir()
+    (tmp_path / "index" / "backfill.json").write_text('{"before": 2000.0, "last": "m2", "done": false}')
+
+    await search.start()
+    await search.tasks[-1]
+
+    assert search.index.ids() == ["m3", "m4"]
+    assert json.loads((tmp_path / "index" / "backfill.json").read_text())["done"]
+
+
+def test_app_import_does_not_load_the_index_with_search_disabled():
+    # The shipped connectors.toml leaves search disabled.
+    code = "import sys, app.main; print('numpy' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "False"
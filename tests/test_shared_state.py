@@ -0,0 +1,107 @@
+import multiprocessing
+
+import pytest
+from app.models import AssistantDB
+from app.services.cache import LRUCache, ModelCache
+from app.services.rate_limit import RateLimitExceeded, RateLimiter
+from app.services.shared_state import ENV_VAR, SharedState
+
+
+@pytest.fixture
+def state():
+    state = SharedState.create()
+    yield state
+    state.close(unlink=True)
+
+
+def reserve_in_child(name, lock_path, count):
+    state = SharedState(name, lock_path)
+    with state.locked():
+        tokens, updated = state.get("bucket") or (0.0, 0.0)
+        state.set("bucket", tokens - count, updated)
+    state.bump("assistant")
+    state.close()
+
+
+def test_records_and_versions_are_seen_by_other_processes(state, monkeypatch):
+    monkeypatch.setenv(ENV_VAR, "")
+    assert SharedState.attach() is None
+
+    state.set("bucket", 10.0, 1.0)
+    version = state.version("assistant")
+    child = multiprocessing.get_context("spawn").Process(
+        target=reserve_in_child, args=(state.memory.name, state.lock_path, 3)
+    )
+    child.start()
+    child.join()
+
+    assert child.exitcode == 0
+    assert state.get("bucket") == (7.0, 1.0)
+    assert state.get("missing") is None
+    assert state.version("assistant") != version
+
+
+@pytest.mark.anyio
+async def test_processes_share_rate_limit_buckets(state):
+    config = {"requests_per_minute": 60, "burst_window": 2, "max_wait": 0}
+    # One limiter per server process, each built from the same config.
+    first = RateLimiter(config, state=state, name="upstream")
+    second = RateLimiter(config, state=state, name="upstream")
+    other = RateLimiter(config, state=state, name="other")
+
+    await first.acquire()
+    await second.acquire()
+    with pytest.raises(RateLimitExceeded):
+        await first.acquire()
+    await other.acquire()
+
+    second.pause(30)
+    assert first.paused_until == second.paused_until > 0
+    assert other.paused_until == 0
+
+
+@pytest.mark.anyio
+async def test_model_cache_sees_writes_from_other_processes(state):
+    first = ModelCache(AssistantDB, LRUCache(), state)
+    second = ModelCache(AssistantDB, LRUCache(), state)
+    await first.save(AssistantDB(id="a1", name="One", model="m"))
+    assert (await second.get("a1")).name == "One"
+
+    await first.save(AssistantDB(id="a1", name="Two", model="m"))
+    assert (await second.get("a1")).name == "Two"
+    assert (await first.get("a1")).name == "Two"
+
+    await AssistantDB(id="a1", name="Three", model="m").save()
+    assert (await second.get("a1")).name == "Two"
+    await first.invalidate("a1")
+    assert (await second.get("a1")).name == "Three"
+
+
+def test_workers_flag_serves_with_shared_state(monkeypatch):
+    from app import main
+
+    calls = []
+
+    def fake_run(app, **options):
+        calls.append((app, options))
+        state = SharedState.attach()
+        assert state is not None
+        state.close()
+
+    async def fake_connect():
+        calls.append("migrate")
+
+    async def fake_disconnect():
+        pass
+
+    monkeypatch.setattr("uvicorn.run", fake_run)
+    monkeypatch.setattr(main, "connect_db", fake_connect)
+    monkeypatch.setattr(main, "disconnect_db", fake_disconnect)
+    monkeypatch.delenv(ENV_VAR, raising=False)
+
+    main.run(["--workers", "3", "--port", "9000"])
+
+    assert calls[0] == "migrate"
+    app, options = calls[1]
+    assert app == "app.main:app"
+    assert options["workers"] == 3 and options["port"] == 9000 and "reload" not in options
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models import MessageDB, RunDB
+from app.services.default_connector import OpenAIAssistantConnector
+from app.services.interfaces import BaseConnector
+from app.services.registry import registry
+
+DELAY = 0.5
+
+
+class SlowUpstream(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        for text in ("Hel", "lo"):
+            chunk = {"choices": [{"text": text}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+            await asyncio.sleep(DELAY)
+        yield b"data: [DONE]\n\n"
+
+
+class SlowConnector(BaseConnector):
+    def initialize(self, config: dict):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def generate_text(self, prompt: str) -> str:
+        return "Hello"
+
+    async def stream_text(self, prompt: str):
+        yield "Hel"
+        await asyncio.sleep(DELAY)
+        yield "lo"
+
+
+async def time_to_first_body(path: str):
+    start = time.perf_counter()
+    first_body = None
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"prompt=hi", "headers": [], "server": ("test", 80),
+        "client": ("test", 1234), "root_path": "",
+    }
+
+    async def receive():
+        await asyncio.sleep(DELAY * 10)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first_body
+        if message["type"] == "http.response.body" and message.get("body") and first_body is None:
+            first_body = time.perf_counter() - start
+
+    await app(scope, receive, send)
+    return first_body, time.perf_counter() - start
+
+
+@pytest.mark.anyio
+async def test_connector_streams_before_upstream_finishes():
+    connector = OpenAIAssistantConnector()
+    connector.initialize({"base_url": "http://upstream/v1"})
+    connector.client = httpx.AsyncClient(
+        base_url=connector.base_url,
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, stream=SlowUpstream())),
+    )
+
+    start = time.perf_counter()
+    chunks = []
+    async for chunk in connector.stream_text("hi"):
+        if not chunks:
+            first_chunk = time.perf_counter() - start
+        chunks.append(chunk)
+
+    assert chunks == ["Hel", "lo"]
+    assert first_chunk < DELAY / 2
+    assert time.perf_counter() - start >= DELAY * 2
+    await connector.disconnect()
+
+
+@pytest.mark.anyio
+async def test_generate_text_stream_endpoint(monkeypatch):
+    monkeypatch.setitem(registry.connectors, "openaiassistantconnector", SlowConnector())
+
+    ttfb, total = await time_to_first_body("/generate_text/stream")
+    assert ttfb < DELAY / 2
+    assert total >= DELAY
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get("/generate_text/stream", params={"prompt": "hi"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == (
+        'data: {"text": "Hel"}\n\n'
+        'data: {"text": "lo"}\n\n'
+        'data: [DONE]\n\n'
+    )
+
+
+@pytest.mark.anyio
+async def test_streamed_run_is_saved(monkeypatch):
+    monkeypatch.setitem(registry.connectors, "openaiassistantconnector", SlowConnector())
+    await MessageDB(id="m1", thread_id="t1", role="user", content="Hi").save()
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post(
+            "/v1/threads/t1/runs",
+            params={"stream": "true"},
+            json={"id": "r1", "thread_id": "other", "assistant_id": "a1", "status": "queued"},
+        )
+    assert response.status_code == 200
+    assert response.text.endswith("data: [DONE]\n\n")
+
+    run = await RunDB.get(id="r1")
+    # Saved under the thread in the path, whose prompt was built.
+    assert run.thread_id == "t1"
+    assert run.status == "completed"
+    assert run.result == "Hello"
+
+
+@pytest.mark.anyio
+async def test_streamed_run_is_cancelled_when_the_client_disconnects(monkeypatch):
+    monkeypatch.setitem(registry.connectors, "openaiassistantconnector", SlowConnector())
+    body = json.dumps({"id": "r1", "thread_id": "t1", "assistant_id": "a1", "status": "queued"}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/v1/threads/t1/runs", "raw_path": b"/v1/threads/t1/runs",
+        "query_string": b"stream=true", "headers": [(b"content-type", b"application/json")],
+        "server": ("test", 80), "client": ("test", 1234), "root_path": "",
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Disconnect after the first chunk, while the second is generated.
+        await asyncio.sleep(DELAY / 2)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+    await asyncio.sleep(0.05)
+
+    run = await RunDB.get(id="r1")
+    assert run.status == "cancelled"
+    assert run.result is None
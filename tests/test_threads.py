@@ -11,3 +11,54 @@ async def test_create_thread():
         )
         assert response.status_code == 200
         assert response.json()["assistant_id"] == "1"
+
+
+@pytest.mark.anyio
+async def test_initial_messages_are_stored_as_messages():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        created = await ac.post("/v1/threads", json={"id": "t", "assistant_id": "a", "messages": ["hi", "there"]})
+        thread = (await ac.get("/v1/threads/t")).json()
+        messages = (await ac.get("/v1/threads/t/messages", params={"order": "asc"})).json()["data"]
+
+    assert created.json() == thread
+    assert "messages" not in thread
+    assert [m["content"] for m in messages] == ["hi", "there"]
+    assert thread["message_count"] == 2
+    assert thread["last_message_id"] == messages[-1]["id"]
+
+
+@pytest.mark.anyio
+async def test_appends_update_count_and_last_message():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/threads", json={"id": "t", "assistant_id": "a"})
+        await ac.get("/v1/threads/t")
+        await ac.post("/v1/threads/t/messages", json={
+            "id": "m1", "thread_id": "t", "role": "user", "content": "one", "created_at": 10.0})
+        await ac.post("/v1/threads/t/messages/batch", json={"messages": [
+            {"id": "m3", "role": "user", "content": "three", "created_at": 30.0},
+            {"id": "m2", "role": "user", "content": "two", "created_at": 20.0},
+        ]})
+        # An older message counts, but does not become the last one.
+        await ac.post("/v1/threads/t/messages", json={
+            "id": "m0", "thread_id": "t", "role": "user", "content": "zero", "created_at": 0.0})
+        thread = (await ac.get("/v1/threads/t")).json()
+
+    assert thread["message_count"] == 4
+    assert (thread["last_message_id"], thread["last_message_at"]) == ("m3", 30.0)
+
+
+@pytest.mark.anyio
+async def test_repeated_creates_conflict_and_leave_counts_alone():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.post("/v1/threads", json={"id": "t", "assistant_id": "a", "messages": ["hi", "there"]})
+        thread_again = await ac.post("/v1/threads", json={"id": "t", "assistant_id": "a", "messages": ["hi", "there"]})
+        message = {"id": "m1", "thread_id": "t", "role": "user", "content": "one"}
+        await ac.post("/v1/threads/t/messages", json=message)
+        message_again = await ac.post("/v1/threads/t/messages", json=message)
+        elsewhere = await ac.post("/v1/threads/other/messages", json={**message, "id": "m2"})
+        thread = (await ac.get("/v1/threads/t")).json()
+        messages = (await ac.get("/v1/threads/t/messages")).json()["data"]
+
+    assert thread_again.status_code == 409 and message_again.status_code == 409
+    assert elsewhere.status_code == 400
+    assert thread["message_count"] == len(messages) == 3
@@ -0,0 +1,125 @@
+import gzip
+import json
+
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.models import AssistantDB, MessageDB, RunDB, ThreadDB
+from app.services.database import create_pool, setup_models
+from benchmarks.common import seed_messages
+
+
+async def seed(ac):
+    await ac.post("/v1/assistants", json={
+        "id": "a1", "name": "Helper", "model": "gpt-4", "tools": ["code_interpreter", "retrieval"],
+    })
+    for thread_id in ("t1", "t2"):
+        await ac.post("/v1/threads", json={
+            "id": thread_id, "assistant_id": "a1", "messages": [f"{thread_id} first", f"{thread_id} second"],
+        })
+    await RunDB(id="r1", thread_id="t1", assistant_id="a1", status="completed", result="done").save()
+
+
+def lines(data: bytes):
+    return [json.loads(line) for line in gzip.decompress(data).splitlines()]
+
+
+@pytest.mark.anyio
+async def test_export_and_import_round_trip(tmp_path):
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await seed(ac)
+        response = await ac.get("/v1/export", params={"chunk_size": 2})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    exported = lines(response.content)
+    assert [line["table"] for line in exported] == ["AssistantDB", "ThreadDB", "ThreadDB"] + ["MessageDB"] * 4 + ["RunDB"]
+    assert exported[0]["data"]["tools"] == ["code_interpreter", "retrieval"]
+
+    setup_models(create_pool(f"sqlite:///{tmp_path}/restored.db", {}))
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        imported = (await ac.post("/v1/import", content=response.content)).json()
+        again = (await ac.post("/v1/import", content=response.content)).json()
+        thread = (await ac.get("/v1/threads/t1")).json()
+
+    assert imported["tables"]["MessageDB"] == {"created": 4, "skipped": 0}
+    assert again["tables"]["MessageDB"] == {"created": 0, "skipped": 4}
+    assert (await AssistantDB.get(id="a1")).tools == ["code_interpreter", "retrieval"]
+    assert (await RunDB.get(id="r1")).result == "done"
+    assert thread["message_count"] == 2
+    assert [m.content for m in await MessageDB.filter(thread_id="t1")] == ["t1 first", "t1 second"]
+
+
+@pytest.mark.anyio
+async def test_export_resumes_after_a_cursor():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await seed(ac)
+        thread = lines((await ac.get("/v1/export", params={"thread_id": "t2"})).content)
+        full = lines((await ac.get("/v1/export")).content)
+        rest = lines((await ac.get("/v1/export", params={"after": "ThreadDB:t2"})).content)
+        bad = await ac.get("/v1/export", params={"after": "Nope:1"})
+    assert [line["table"] for line in thread] == ["AssistantDB", "ThreadDB", "MessageDB", "MessageDB"]
+    assert [line["data"]["content"] for line in thread[2:]] == ["t2 first", "t2 second"]
+    assert full[:3] + rest == full
+    assert bad.status_code == 400
+
+
+def test_cli_export_resumes_a_cut_file(db, tmp_path, monkeypatch):
+    from app import main
+
+    async def connected():
+        pass
+
+    monkeypatch.setattr(main, "connect_db", connected)
+    monkeypatch.setattr(main, "disconnect_db", connected)
+    seed_messages(db, "t1", 10)
+    path = tmp_path / "export.jsonl.gz"
+    main.run(["export", str(path), "--chunk-size", "3"])
+    full = path.read_bytes()
+
+    # Cut inside the second chunk: the first is kept and the rest written again.
+    path.write_bytes(full[:len(full) // 3])
+    main.run(["export", str(path), "--resume", "--chunk-size", "3"])
+    assert path.read_bytes() == full
+    assert [line["data"]["id"] for line in lines(full)] == [f"msg-{i:07d}" for i in range(10)]
+
+
+@pytest.mark.anyio
+async def test_import_rejects_what_is_not_an_export():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        not_gzip = await ac.post("/v1/import", content=b"{}\n")
+        unknown = await ac.post("/v1/import", content=gzip.compress(b'{"table": "Nope", "data": {}}\n'))
+        cut = await ac.post("/v1/import", content=gzip.compress(b'{"table": "ThreadDB", "data": {"id": "t"}}\n')[:-4])
+    assert [r.status_code for r in (not_gzip, unknown, cut)] == [400, 400, 400]
+
+
+@pytest.mark.anyio
+async def test_import_accepts_a_last_line_without_newline():
+    line = b'{"table": "MessageDB", "data": {"id": "m1", "thread_id": "t1", "role": "user", "content": "hi"}}'
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/v1/import", content=gzip.compress(line))
+    assert response.status_code == 200
+    assert response.json()["tables"]["MessageDB"]["created"] == 1
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096
+
+
+@pytest.mark.anyio
+async def test_exporting_a_million_messages_keeps_memory_flat(db):
+    from app.services.transfer import export_jsonl_gz
+
+    seed_messages(db, "big", 1_000_000)
+    baseline = peak = rss_bytes()
+    exported = 0
+    last = b""
+    async for chunk in export_jsonl_gz(tables=["MessageDB"], chunk_size=1000):
+        exported += gzip.decompress(chunk).count(b"\n")
+        last = chunk
+        peak = max(peak, rss_bytes())
+
+    assert exported == 1_000_000
+    assert json.loads(gzip.decompress(last).splitlines()[-1])["data"]["id"] == "msg-0999999"
+    # Holding the rows, or the output, would take hundreds of megabytes.
+    assert peak - baseline < 50 * 2 ** 20